@@ -0,0 +1,62 @@
+"""
+Compares the duration of resolving the date range of a movements message:
+new dateparser parsers for each message (as DateProcessor used to do), pooled parsers,
+and pooled parsers with the fast path for the common forms.
+
+Run from the project root:
+    python -m benchmarks.bench_dates [messages]
+"""
+import os
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prometeo_chatbot.settings")
+django.setup()
+
+from chatbot.utils import DateProcessor, cached_date_parser  # noqa: E402
+
+
+DATES = {
+    'en': ["july 2022", "from 01/01/2022 to 03/31/2022", "march 2022 to may 2022", "2021", "from july to september",
+           "last week"],
+    'es': ["julio 2022", "del 01/01/2022 al 31/03/2022", "marzo de 2022", "2021", "desde julio hasta septiembre",
+           "la semana pasada"],
+}
+
+
+def new_parsers(language, string):
+    cached_date_parser.cache_clear()
+    return DateProcessor(language, fast_path=False).get_date_range(string)
+
+
+def pooled(language, string):
+    return DateProcessor(language, fast_path=False).get_date_range(string)
+
+
+def fast_path(language, string):
+    return DateProcessor(language).get_date_range(string)
+
+
+def run(label, language, call, n):
+    strings = DATES[language]
+    call(language, strings[0])
+
+    start = time.perf_counter()
+    for i in range(n):
+        call(language, strings[i % len(strings)])
+    elapsed = time.perf_counter() - start
+
+    print(f"{label:<12} {language}  {n} messages  {elapsed * 1000 / n:8.3f} ms/message")
+
+
+def main(n=600):
+    for language in DATES:
+        run("new parsers", language, new_parsers, n)
+        run("pooled", language, pooled, n)
+        run("fast path", language, fast_path, n)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,57 @@
+"""
+Compares the latency of the approximate provider lookup over a catalog of thousands of providers:
+brute force similarity against every name (difflib) vs. the trigram index of ProviderIndex.
+
+Run from the project root:
+    python -m benchmarks.bench_providers [providers...]
+"""
+import difflib
+import random
+import sys
+import time
+
+from chatbot.providers import ProviderIndex
+from chatbot.utils import normalize_string
+
+
+WORDS = ["banco", "bank", "credito", "nacion", "provincia", "santander", "itau", "galicia", "hipotecario",
+         "ahorro", "cooperativa", "comercial", "popular", "internacional", "federal", "digital", "rural"]
+
+QUERIES = ["banco santader", "itau", "banco galcia", "hipotecaro", "cooperativa rurl", "hi", "my accounts"]
+
+
+def catalog(n):
+    rng = random.Random(n)
+    return [{'code': f"p{i}", 'name': " ".join(rng.sample(WORDS, rng.randint(1, 3)) + [str(i)])}
+            for i in range(n)]
+
+
+def brute_force(names, query, limit=5, cutoff=0.6):
+    return difflib.get_close_matches(query, names, n=limit, cutoff=cutoff)
+
+
+def run(label, call, n, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            call(normalize_string(query))
+    elapsed = time.perf_counter() - start
+
+    print(f"{label:<12} {n:>6} providers  {elapsed * 1000 / (repeat * len(QUERIES)):8.3f} ms/lookup")
+
+
+def main(*sizes):
+    for n in sizes or (100, 1000, 5000):
+        providers = catalog(n)
+
+        start = time.perf_counter()
+        index = ProviderIndex(providers)
+        print(f"{'index build':<12} {n:>6} providers  {(time.perf_counter() - start) * 1000:8.3f} ms")
+
+        names = [normalize_string(provider['name']) for provider in providers]
+        run("brute force", lambda query: brute_force(names, query), n, repeat=2)
+        run("trigrams", index.similar, n)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
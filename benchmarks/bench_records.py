@@ -0,0 +1,147 @@
+"""
+Measures the memory (tracemalloc) and pickle size of the provider session of a user with a year of movements
+of an account, keeping the accounts, cards and movements as the dicts of the responses vs. as records
+(with the movement store packed), and the time to pickle it, after adding movements and without changes,
+and to load it, with and without using the movements.
+
+Run from the project root:
+    python -m benchmarks.bench_records [movements per day...]
+"""
+import json
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prometeo_chatbot.settings")
+django.setup()
+
+from chatbot.api.movement_store import MovementStore, movement_words  # noqa: E402
+from chatbot.api.records import Items  # noqa: E402
+
+
+DETAILS = ["Rent payment", "UBER Trip", "Supermarket", "Salary", "Transfer to savings", "Netflix", "Pharmacy"]
+
+
+def responses(per_day):
+    """
+    @return
+    the JSON of the accounts, cards and monthly movements, as the bank sends them
+    """
+    rng = random.Random(per_day)
+    accounts = [{'id': f"a{i}", 'name': f"Account {i}", 'number': f"{i}23", 'branch': "Main", 'currency': "UYU",
+                 'balance': round(rng.random() * 10000, 2)} for i in range(3)]
+    cards = [{'id': f"c{i}", 'name': f"Card {i}", 'number': f"{i}444", 'close_date': "28/01/2022",
+              'due_date': "10/02/2022", 'balance_local': 1000.0, 'balance_dollar': 10.0} for i in range(2)]
+
+    months = []
+    for month in range(1, 13):
+        start = datetime(2021, month, 1)
+        end = datetime.fromordinal(date(2021 + month // 12, month % 12 + 1, 1).toordinal() - 1)
+        movements = [{'id': f"{day}-{i}", 'reference': f"REF {rng.randrange(10 ** 6)}",
+                      'date': date.fromordinal(day).strftime("%d/%m/%Y"), 'detail': rng.choice(DETAILS),
+                      'debit': round(rng.random() * 1000, 2) if i % 2 else "",
+                      'credit': "" if i % 2 else round(rng.random() * 1000, 2), 'extra_data': None}
+                     for day in range(start.toordinal(), end.toordinal() + 1) for i in range(per_day)]
+        months.append((start, end, json.dumps(movements)))
+
+    return json.dumps(accounts), json.dumps(cards), months
+
+
+class DictMovementStore:
+    """
+    Movement store as it was stored before records: the dicts of the responses, a set of the movement ids,
+    and an index of dicts of lists per word
+    """
+
+    def __init__(self, store: MovementStore):
+        self.intervals = store.intervals
+        self.days = {day: [movement.dict() for movement in movements] for day, movements in store.days.items()}
+        self.ids = set(store.ids)
+        self.postings = {}
+
+        for day, movements in self.days.items():
+            for position, movement in enumerate(movements):
+                for word in movement_words(movement):
+                    self.postings.setdefault(word, {}).setdefault(day, []).append(position)
+
+
+def provider_session(accounts, cards, months, records: bool) -> dict:
+    store = MovementStore()
+    for start, end, movements in months:
+        store.add(start, end, json.loads(movements))
+
+    if not records:
+        store = DictMovementStore(store)
+
+    return {'accounts': Items(json.loads(accounts)) if records else json.loads(accounts),
+            'credit_cards': Items(json.loads(cards)) if records else json.loads(cards),
+            'movements': {('AccountMovement', ('account_number', "123"), ('currency', "UYU")): store}}
+
+
+def used(session) -> dict:
+    """
+    Uses the movements of the session, as a request about them does
+    """
+    for store in session['movements'].values():
+        assert store.days
+
+    return session
+
+
+def loaded_memory(data: bytes) -> int:
+    """
+    @return
+    the bytes allocated by loading the pickled session and using its movements,
+    which stay allocated while the request is processed
+    """
+    tracemalloc.start()
+    session = used(pickle.loads(data))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del session
+    return size
+
+
+def best(call, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings) * 1000
+
+
+def dumps_changed(session) -> bytes:
+    for store in session['movements'].values():
+        store.changed = True
+
+    return pickle.dumps(session, pickle.HIGHEST_PROTOCOL)
+
+
+def main(*per_day):
+    for n in per_day or (5, 20, 50):
+        accounts, cards, months = responses(int(n))
+
+        for name, records in (("dicts", False), ("records", True)):
+            session = provider_session(accounts, cards, months, records)
+            data = dumps_changed(session)
+            loaded = used(pickle.loads(data))
+
+            print(f"{int(n) * 365:>6} movements  {name:<8} memory {loaded_memory(data) / 2 ** 20:6.2f} MiB  "
+                  f"pickle {len(data) / 2 ** 20:6.2f} MiB  "
+                  f"dumps: changed {best(lambda: dumps_changed(session)):6.2f} ms, "
+                  f"unchanged {best(lambda: pickle.dumps(loaded, pickle.HIGHEST_PROTOCOL)):6.2f} ms  "
+                  f"loads: {best(lambda: pickle.loads(data)):6.2f} ms, "
+                  f"with movements {best(lambda: used(pickle.loads(data))):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
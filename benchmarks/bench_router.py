@@ -0,0 +1,93 @@
+"""
+Compares the message routing throughput of rebuilding the cascade of ActionSelectors for each message
+(gettext of every regex, and searching them one by one, as MessageProcessor used to do)
+against the compiled per-language IntentRouter.
+
+Run from the project root:
+    python -m benchmarks.bench_router [messages]
+"""
+import os
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prometeo_chatbot.settings")
+django.setup()
+
+from django.utils import translation  # noqa: E402
+from django.utils.translation import gettext as _  # noqa: E402
+
+from chatbot.models import MessageProcessor  # noqa: E402
+from chatbot.utils import ActionSelector  # noqa: E402
+
+
+MESSAGES = {
+    'en': ["hello", "my info", "banks", "accounts", "account 123 movements july 2022", "cards",
+           "card 1234 movements currency uyu from june to july", "logout", "what can you do?"],
+    'es': ["hola", "mis datos", "bancos", "cuentas", "cuenta 123 movimientos julio 2022", "tarjetas",
+           "tarjeta 1234 movimientos moneda uyu de junio a julio", "salir", "que puedes hacer?"],
+}
+
+
+def action(**kwargs):
+    return True
+
+
+def selectors():
+    """
+    The cascade built for each message before the router
+    """
+    return (
+        ActionSelector(_("_regex_logout"), action),
+        ActionSelector(_("_regex_customer"), action),
+        ActionSelector(_("_regex_bank"), action),
+        ActionSelector(_("_regex_account") + " +(?P<account_number>.*?) +" + _("_regex_movement")
+                       + " *(?P<dates>.*)", action),
+        ActionSelector(_("_regex_account"), action),
+        ActionSelector(_("_regex_card") + " *(?P<card_number>.*?) *" + _("_regex_movement")
+                       + " *(" + _("_regex_currency") + ")? *(?P<currency>[A-Za-z]{3}?)" + " *(?P<dates>.*)",
+                       action),
+        ActionSelector(_("_regex_card"), action),
+        ActionSelector(_("_regex_info"), action),
+        ActionSelector(_("_regex_greeting"), action),
+    )
+
+
+def cascade(message):
+    for selector in selectors():
+        if selector.act_on(message):
+            return True
+
+    return False
+
+
+def router(message):
+    for _intent in MessageProcessor.router()[0].matches(message):
+        return True
+
+    return False
+
+
+def run(label, language, route, n):
+    messages = MESSAGES[language]
+
+    with translation.override(language):
+        route(messages[0])
+
+        start = time.perf_counter()
+        for i in range(n):
+            route(messages[i % len(messages)])
+        elapsed = time.perf_counter() - start
+
+    print(f"{label:<10} {language}  {n} messages  {n / elapsed:12,.0f} messages/s  {elapsed * 1e6 / n:7.2f} us/message")
+
+
+def main(n=100000):
+    for language in MESSAGES:
+        run("cascade", language, cascade, n)
+        run("router", language, router, n)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,83 @@
+"""
+Compares searching the words of the movements of a year (detail and reference) already in the session:
+looking at every movement vs. the inverted index of the movement store, kept up to date as movements are added.
+
+Run from the project root:
+    python -m benchmarks.bench_search [movements per day...]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prometeo_chatbot.settings")
+django.setup()
+
+from chatbot.api.movement_store import MovementIndex, MovementStore, movement_words, words  # noqa: E402
+
+
+DETAILS = ["Rent payment", "UBER Trip", "Supermarket", "Salary", "Transfer to savings", "Netflix", "Pharmacy",
+           "Restaurant", "Gas station", "Electricity bill", "Phone bill", "ATM withdrawal"]
+SEARCHES = ["uber", "rent", "netflix", "phone bill", "ref 42", "nothing"]
+
+
+def year_store(per_day) -> MovementStore:
+    rng = random.Random(per_day)
+    store = MovementStore()
+
+    for month in range(1, 13):
+        start = datetime(2021, month, 1)
+        end = datetime.fromordinal(date(2021 + month // 12, month % 12 + 1, 1).toordinal() - 1)
+        movements = [{'id': f"{day}-{i}", 'date': date.fromordinal(day).strftime("%d/%m/%Y"),
+                      'detail': rng.choice(DETAILS), 'reference': f"REF {rng.randrange(1000)}"}
+                     for day in range(start.toordinal(), end.toordinal() + 1) for i in range(per_day)]
+        store.add(start, end, movements)
+
+    return store
+
+
+def scanned(store, terms):
+    search_words = words(terms)
+    return [movement for movements in store.days.values() for movement in movements
+            if search_words <= movement_words(movement)]
+
+
+def indexed(store, terms):
+    return list(store.search(words(terms)))
+
+
+def best(call, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings) * 1000
+
+
+def indexing(store):
+    index = MovementIndex()
+    for day, movements in store.days.items():
+        for position, movement in enumerate(movements):
+            index.add(day, position, movement)
+
+
+def main(*per_day):
+    for n in per_day or (10, 50, 150):
+        store = year_store(int(n))
+        count = sum(len(movements) for movements in store.days.values())
+
+        for terms in SEARCHES:
+            assert indexed(store, terms) == scanned(store, terms), terms
+
+        print(f"{count:>7} movements  scan {best(lambda: [scanned(store, t) for t in SEARCHES]):8.2f} ms  "
+              f"index {best(lambda: [indexed(store, t) for t in SEARCHES]):8.2f} ms  "
+              f"({len(SEARCHES)} searches), indexing {best(lambda: indexing(store)):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
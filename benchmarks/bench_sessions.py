@@ -0,0 +1,90 @@
+"""
+Measures the read-modify-write cycles per second of the shared session store (load a session, update
+session['cache'] and the message history, save it) with N worker processes on the same database,
+and checks that every worker sees the updates of the others, which per-process LocMem sessions can't do.
+
+Run from the project root:
+    python -m benchmarks.bench_sessions [seconds] [workers...]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prometeo_chatbot.settings")
+django.setup()
+
+from chatbot.models import BotMessage, MessageHistory, UserMessage  # noqa: E402
+from chatbot.sessions import SessionDatabase, SessionStore  # noqa: E402
+
+
+SESSIONS = 200
+
+
+def new_session(store_class) -> str:
+    history = MessageHistory()
+    for i in range(20):
+        history.add(UserMessage(f"account {i} movements july"))
+        history.add(BotMessage(f'<div class="item link" name="{i}">Movement {i}</div>' * 10))
+
+    session = store_class()
+    session['cache'] = {'api-key': "key", 'providers': [{'code': f"p{i}", 'name': f"Bank {i}"} for i in range(100)],
+                        'provider_session': {'provider': {'code': "test", 'name': "Test Bank"}, 'key': "k"},
+                        'updates': 0}
+    session['message_history'] = history
+    session.save()
+
+    return session.session_key
+
+
+def worker(path, keys, seconds, results):
+    store_class = type("BenchStore", (SessionStore,), {'database': SessionDatabase(path)})
+    rng = random.Random(os.getpid())
+    cycles = 0
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        session = store_class(rng.choice(keys))
+        session['cache']['updates'] += 1
+        session['message_history'].add(UserMessage("accounts"))
+        session.save()
+        cycles += 1
+
+    results.put(cycles)
+
+
+def run(workers, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.sqlite3")
+        store_class = type("BenchStore", (SessionStore,), {'database': SessionDatabase(path)})
+        keys = [new_session(store_class) for _ in range(SESSIONS)]
+
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(path, keys, seconds, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+
+        cycles = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+
+        # Concurrent updates of the same session may overwrite each other (last write wins, as with any
+        # Django session backend), so the updates seen are at most the cycles, and close to them
+        seen = sum(store_class(key)['cache']['updates'] for key in keys)
+
+    print(f"{workers:>3} workers  {cycles / seconds:10.0f} cycles/s  "
+          f"updates seen by the other processes {seen}/{cycles}")
+
+
+def main(seconds=3.0, *workers):
+    for n in workers or (1, 2, 4, 8):
+        run(int(n), float(seconds))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
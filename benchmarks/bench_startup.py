@@ -0,0 +1,57 @@
+"""
+Compares the boot time of a worker and the latency of its first message with dates
+(one that dateparser has to resolve), in fresh processes:
+dateparser imported at boot (as chatbot.utils used to do), imported lazily, and warmed up at boot.
+
+Run from the project root:
+    python -m benchmarks.bench_startup [runs]
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+WORKER = """
+import json, os, sys, time
+
+started = time.perf_counter()
+
+import django
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prometeo_chatbot.settings")
+django.setup()
+
+from chatbot import views
+from chatbot.utils import DateProcessor, warm_up_dates
+
+if sys.argv[1] == "eager":
+    import dateparser.date, dateparser.search
+elif sys.argv[1] == "warm-up":
+    warm_up_dates(["en", "es"])
+
+booted = time.perf_counter()
+DateProcessor("en").get_valid_date_range("last month")
+first = time.perf_counter()
+
+print(json.dumps({"boot": booted - started, "first": first - booted}))
+"""
+
+MODES = ("eager", "lazy", "warm-up")
+
+
+def run(mode) -> dict:
+    output = subprocess.run([sys.executable, "-c", WORKER, mode], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(runs=5):
+    for mode in MODES:
+        timings = [run(mode) for _ in range(runs)]
+        boot = statistics.median(timing["boot"] for timing in timings)
+        first = statistics.median(timing["first"] for timing in timings)
+
+        print(f"{mode:<8} boot {boot * 1000:8.1f} ms  first message {first * 1000:8.1f} ms  "
+              f"(median of {runs} processes)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,58 @@
+"""
+Compares the peak memory of decoding a movements response at once (successful_json)
+against decoding it incrementally (successful_items), using a local stub server.
+
+Run from the project root:
+    python -m benchmarks.bench_streaming [movements...]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.stub_server import StubHandler, StubServer
+from chatbot.api.transactional import AccountMovement
+from chatbot.api.transport import transport
+
+
+def movements_body(n) -> bytes:
+    movements = [{"id": i, "reference": f"REF{i:08d}", "date": "01/07/2022",
+                  "detail": "Compra en comercio de prueba", "debit": 123.45, "credit": "", "extra_data": None}
+                 for i in range(n)]
+
+    return json.dumps({"status": "success", "movements": movements}).encode()
+
+
+def movement_api(server):
+    AccountMovement.base_url = server.url
+    return AccountMovement("key", "session", "123", "UYU", datetime(2022, 7, 1), datetime(2022, 7, 31))
+
+
+def run(label, n, call):
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    count = call()
+
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"{label:<18} {n:>7} movements  {count:>7} decoded  {peak / 2 ** 20:8.2f} MiB peak  {elapsed * 1000:8.1f} ms")
+
+
+def main(*sizes):
+    for n in sizes or (1000, 10000, 100000):
+        class Handler(StubHandler):
+            body = movements_body(n)
+
+        with StubServer(Handler) as server:
+            run("successful_json", n, lambda: len(movement_api(server).successful_json()['movements']))
+            run("successful_items", n, lambda: sum(1 for _ in movement_api(server).successful_items()))
+
+        transport.close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,102 @@
+"""
+Compares summarizing a year of movements (totals per month, net flow and largest movements):
+a Python loop over the movement dicts vs. the columns of MovementColumns, built once per range.
+Then the whole summary message of the movements stored in the session (as Records),
+building the columns vs. taking them from the cache of the movement store.
+
+Run from the project root:
+    python -m benchmarks.bench_summary [movements per day...]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prometeo_chatbot.settings")
+django.setup()
+
+from django.utils import translation  # noqa: E402
+
+from chatbot.api.movement_store import MovementStore  # noqa: E402
+from chatbot.models import MessageProcessor  # noqa: E402
+from chatbot.summary import MovementColumns, amount  # noqa: E402
+
+
+def year_of_movements(per_day):
+    rng = random.Random(per_day)
+    first = date(2021, 1, 1).toordinal()
+
+    return [(day, [{'id': f"{day}-{i}", 'date': date.fromordinal(day).strftime("%d/%m/%Y"), 'detail': "Movement",
+                    'debit': round(rng.random() * 1000, 2) if i % 2 else "",
+                    'credit': "" if i % 2 else round(rng.random() * 1000, 2)} for i in range(per_day)])
+            for day in range(first, first + 365)]
+
+
+def dict_summary(days_movements, largest=5):
+    months = {}
+    movements = []
+
+    for day, day_movements in days_movements:
+        day_date = date.fromordinal(day)
+        month = months.setdefault((day_date.year, day_date.month), [0.0, 0.0])
+
+        for movement in day_movements:
+            month[0] += amount(movement.get('debit'))
+            month[1] += amount(movement.get('credit'))
+            movements.append(movement)
+
+    net_flow = sum(credit - debit for debit, credit in months.values())
+    top = sorted(movements, key=lambda movement: amount(movement.get('debit')) + amount(movement.get('credit')),
+                 reverse=True)[:largest]
+
+    return months, net_flow, top
+
+
+def columns_summary(columns, largest=5):
+    return columns.monthly(), columns.net_flow, columns.largest(largest)
+
+
+def summary_message(store, date_start, date_end, cached):
+    if not cached:
+        store.columns_cache.clear()
+
+    return MessageProcessor.summary_message(store, date_start, date_end)
+
+
+def best(call, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings) * 1000
+
+
+def main(*per_day):
+    for n in per_day or (10, 50, 150):
+        days_movements = year_of_movements(int(n))
+        count = sum(len(movements) for _, movements in days_movements)
+
+        columns = MovementColumns(days_movements)
+
+        print(f"{count:>7} movements  dicts {best(lambda: dict_summary(days_movements)):8.2f} ms  "
+              f"columns: build {best(lambda: MovementColumns(days_movements)):8.2f} ms, "
+              f"summary {best(lambda: columns_summary(columns)):6.2f} ms")
+
+        store = MovementStore()
+        date_start, date_end = datetime.fromordinal(days_movements[0][0]), datetime.fromordinal(days_movements[-1][0])
+        store.add(date_start, date_end, [movement for _, movements in days_movements for movement in movements])
+
+        with translation.override("en"):
+            built = best(lambda: summary_message(store, date_start, date_end, cached=False))
+            cached = best(lambda: summary_message(store, date_start, date_end, cached=True))
+
+        print(f"{'':>17} summary message with Records: columns built {built:8.2f} ms, cached {cached:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,48 @@
+"""
+Compares one connection per call (module level requests.get, as Api used to do)
+against the pooled keep-alive transport, using a local stub server.
+
+Run from the project root:
+    python -m benchmarks.bench_transport [requests]
+"""
+import contextlib
+import io
+import sys
+import time
+
+import requests
+
+from benchmarks.stub_server import StubServer
+from chatbot.api.meta import Provider
+from chatbot.api.transport import transport
+
+
+def run(label, server, call, n):
+    server.reset()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(n):
+            call()
+        elapsed = time.perf_counter() - start
+
+    print(f"{label:<24} {n} requests  {server.connections:>5} connections  "
+          f"{elapsed * 1000 / n:7.3f} ms/request")
+
+
+def main(n=500):
+    with StubServer() as server:
+        Provider.base_url = server.url
+
+        run("requests.get", server, lambda: requests.get(server.url, headers={'X-API-Key': "key"}), n)
+
+        run("transport.session.get", server,
+            lambda: transport.session(server.url).get(server.url, headers={'X-API-Key': "key"}), n)
+
+        run("Api (pooled)", server, lambda: Provider("key").response_json, n)
+
+        transport.close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -1,11 +1,26 @@
 from abc import abstractmethod
+import asyncio
+import codecs
+import copy
 from django.utils.translation import gettext as _
 from enum import Enum
+import hashlib
+import httpx
+import logging
 import requests
 from requests import Response
+import threading
+import time
 from urllib.parse import urljoin
 
-from chatbot import settings
+from chatbot import metrics, settings
+from .jsonstream import JsonArrayStream
+from .resilience import CircuitBreaker, breakers, retry_policy, timeouts
+from .singleflight import singleflight, async_singleflight
+from .transport import transport, async_transport
+
+
+logger = logging.getLogger(__name__)
 
 
 class Method(Enum):
@@ -26,13 +41,25 @@ class Api:
     method = None
     parameters = ""
 
-    def __init__(self, api_key, path_params=None, query_params=None, data=None):
+    # Response cache shared by all the requests to the endpoint, None to not cache responses
+    cache = None
+    cache_per_api_key = True
+    # Identical concurrent GET requests share a single upstream request, and are retried if they fail.
+    # Disabled for non idempotent endpoints
+    idempotent = True
+    # Member of the response with a large array, that can be decoded incrementally with successful_items()
+    stream_key = None
+    stream_chunk_size = 16384
+
+    def __init__(self, api_key, path_params=None, query_params=None, data=None, provider=None):
         self.headers = {
             'X-API-Key': api_key
         }
         self.path_params = {} if path_params is None else path_params
         self.query_params = {} if query_params is None else query_params
         self.data = data
+        # Provider the request is for, to isolate the failures of each bank
+        self.provider = provider
 
         self._url = None
         self._response = None
@@ -41,39 +68,224 @@ class Api:
     @property
     def url(self):
         if not self._url:
-            print(self.parameters)
-            print(self.path_params)
             self._url = urljoin(self.base_url, self.parameters.format(**self.path_params))
 
-        print("url:", self._url)
-
         return self._url
 
     @property
-    def response(self) -> Response:
-        if not self._response:
-            print()
-            print("data:", self.data)
-            print("query:", self.query_params)
-
-            if self.method == Method.GET:
-                self._response = requests.get(self.url, params=self.query_params, headers=self.headers)
-            elif self.method == Method.POST:
-                self._response = requests.post(self.url, params=self.query_params, data=self.data, headers=self.headers)
+    def endpoint(self) -> str:
+        """
+        Name of the endpoint, the same for the sync and async classes
+        """
+        return type(self).__name__.removeprefix("Async")
+
+    @property
+    def is_idempotent(self) -> bool:
+        return self.idempotent and self.method == Method.GET
+
+    def _send(self, stream=False) -> Response:
+        """
+        Sends the request through the pooled transport
+        @param stream: if True, only the headers of the response are read
+        """
+        session = transport.session(self.url)
+        timeout = timeouts.get(self.endpoint)
+
+        if self.method == Method.GET:
+            return session.get(self.url, params=self.query_params, headers=self.headers, timeout=timeout,
+                               stream=stream)
+        elif self.method == Method.POST:
+            return session.post(self.url, params=self.query_params, data=self.data, headers=self.headers,
+                                timeout=timeout, stream=stream)
+
+        raise NameError(f"Unsupported method: '{self.method}'")
+
+    def _retry_delays(self) -> list:
+        """
+        @return
+        the delay before each retry, with a last None for the final attempt
+        """
+        return [*retry_policy.delays(), None] if self.is_idempotent else [None]
+
+    def _send_with_retries(self, stream=False) -> Response:
+        """
+        Sends the request, retrying idempotent requests that fail because of the network or the upstream
+        """
+        for delay in self._retry_delays():
+            try:
+                response = self._send(stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if delay is None:
+                    raise
             else:
-                raise NameError(f"Unsupported method: '{self.method}'")
+                if delay is None or response.status_code not in retry_policy.retry_status:
+                    return response
+
+                if stream:
+                    response.close()
+
+            logger.warning("Retrying %s in %.2f seconds", self.endpoint, delay,
+                           extra={'fields': {'provider': self.provider}})
+            time.sleep(delay)
+
+    def _breaker(self) -> CircuitBreaker:
+        """
+        @return
+        the circuit breaker of the provider and endpoint,
+        raises ApiException if the breaker is open
+        """
+        breaker = breakers.get(self.provider, self.endpoint)
+
+        if not breaker.allow():
+            metrics.api_responses.inc(self.endpoint, "rejected")
+            raise ApiException(_("This bank is having trouble at the moment... "
+                                 "Please try again in a few minutes..."), status=503)
+
+        return breaker
+
+    def _record_response(self, breaker, response, started, streamed=False):
+        """
+        @param streamed: if True, the content is not read, its size is observed when the stream ends
+        """
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        metrics.api_request_duration.observe(time.perf_counter() - started, self.endpoint)
+        metrics.api_responses.inc(self.endpoint, str(response.status_code))
+
+        if not streamed:
+            metrics.api_response_size.observe(len(response.content), self.endpoint)
+
+    def _unreachable(self, breaker, error, started) -> ApiException:
+        breaker.record_failure()
 
-            self._log_response()
+        metrics.api_request_duration.observe(time.perf_counter() - started, self.endpoint)
+        metrics.api_responses.inc(self.endpoint, "unreachable")
+        logger.warning("%s request failed: %r", self.endpoint, error, extra={'fields': {'provider': self.provider}})
+
+        return ApiException(_("The bank is not responding at the moment... Please try again later..."),
+                            status=504)
+
+    @property
+    def response(self) -> Response:
+        if self._response is None:
+            if not self._load_cached():
+                self._response, self._response_json = self._fetch()
+                self._store_cached()
 
         return self._response
 
+    def _fetch(self):
+        """
+        Sends the request, identical concurrent GET requests are sent only once
+        @return
+        the response and its json
+        """
+        if self.is_idempotent:
+            return singleflight.do(self.request_key(), self._fetch_once)
+
+        return self._fetch_once()
+
+    def _fetch_once(self):
+        breaker = self._breaker()
+        started = time.perf_counter()
+
+        try:
+            response = self._send_with_retries()
+        except requests.RequestException as e:
+            raise self._unreachable(breaker, e, started) from e
+        except BaseException:
+            # Cancelled or unexpected, there's no response to record
+            breaker.release()
+            raise
+
+        self._record_response(breaker, response, started)
+        self._log_response(response)
+
+        return response, self._parse_json(response)
+
+    @staticmethod
+    def _parse_json(response):
+        """
+        @return
+        the json of the response, None if the response is not JSON (response_json will raise the error)
+        """
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
     @property
     def response_json(self):
-        if not self._response_json:
+        if self._response_json is None:
             self._response_json = self.response.json()
 
         return self._response_json
 
+    def request_key(self) -> tuple:
+        """
+        Identifies identical requests: same method, url, query and API key (hashed)
+        """
+        return (self.method.value, self.url, tuple(sorted(self.query_params.items())),
+                hashlib.sha256(self.headers['X-API-Key'].encode()).hexdigest())
+
+    def cache_key(self) -> tuple:
+        """
+        Identifies the request in the response cache.
+        Includes the API key, unless responses are the same for every API key
+        """
+        key = self.request_key()
+
+        return key if self.cache_per_api_key else key[:-1]
+
+    def _load_cached(self) -> bool:
+        """
+        Loads the response from the cache, starting its revalidation if it's stale
+        @return
+        True if there was a cached response
+        """
+        if self.cache is None:
+            return False
+
+        cached, revalidate = self.cache.get(self.cache_key())
+        if cached is None:
+            return False
+
+        self._response, self._response_json = cached
+
+        if revalidate:
+            self._revalidate()
+
+        return True
+
+    def _store_cached(self):
+        if self.cache is not None and self.response_json and self.is_ok():
+            self.cache.set(self.cache_key(), self._response, self.response_json)
+
+    def _fresh_copy(self):
+        fresh = copy.copy(self)
+        fresh._response = None
+        fresh._response_json = None
+
+        return fresh
+
+    def _revalidate(self):
+        """
+        Refreshes the cached response in a background thread
+        """
+        threading.Thread(target=self._fresh_copy()._refresh_cached, daemon=True).start()
+
+    def _refresh_cached(self):
+        try:
+            self._response, self._response_json = self._fetch()
+            self._store_cached()
+        except Exception as e:
+            logger.warning("Revalidation of %s failed: %r", self.endpoint, e)
+        finally:
+            self.cache.release(self.cache_key())
+
     @abstractmethod
     def is_ok(self) -> bool:
         """
@@ -99,12 +311,252 @@ class Api:
 
         return self.response_json
 
-    def _log_response(self):
-        print()
-        print("URL:", self.url)
-        print("headers:", self.headers)
-        print()
-        print("response status code:", self._response.status_code)
-        print("response headers:", self._response.headers)
-        print("response content:", self._response.content)
-        print()
+    def successful_items(self):
+        """
+        Streams the response, decoding the items of the stream_key array incrementally,
+        so they are never all in memory at the same time.
+        The rest of the response is checked as in successful_json, before the first item if it comes first,
+        and always after the last one, raising ApiException if it's not successful.
+        The request is not cached nor coalesced, and it's sent when the iteration starts.
+        @return
+        iterator of the items
+        """
+        breaker = self._breaker()
+        started = time.perf_counter()
+
+        try:
+            response = self._send_with_retries(stream=True)
+        except requests.RequestException as e:
+            raise self._unreachable(breaker, e, started) from e
+        except BaseException:
+            # Cancelled or unexpected, there's no response to record
+            breaker.release()
+            raise
+
+        self._record_response(breaker, response, started, streamed=True)
+        self._log_response(response, streamed=True)
+
+        with response:
+            if response.status_code != 200:
+                self._response, self._response_json = response, self._parse_json(response)
+                self.successful_json()
+
+            stream = JsonArrayStream(self.stream_key)
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            size = 0
+            checked = False
+
+            try:
+                for chunk in response.iter_content(self.stream_chunk_size):
+                    size += len(chunk)
+
+                    for item in stream.feed(decoder.decode(chunk)):
+                        if not checked and stream.members:
+                            self._check_streamed(response, stream)
+
+                        checked = True
+                        yield item
+
+                stream.feed(decoder.decode(b"", final=True))
+                stream.close()
+            except requests.RequestException as e:
+                raise self._unreachable(breaker, e, started) from e
+            except ValueError as e:
+                raise ApiException(_("Something went wrong!")) from e
+            finally:
+                metrics.api_response_size.observe(size, self.endpoint)
+
+            self._check_streamed(response, stream)
+
+    def _check_streamed(self, response, stream: JsonArrayStream):
+        """
+        Checks the streamed response with successful_json. The streamed items are not kept,
+        the stream_key member is an empty list if it was in the response.
+        """
+        self._response = response
+        self._response_json = {**stream.members, **({self.stream_key: []} if stream.found else {})}
+
+        # Not self.successful_json, that fetches the response in AsyncApi
+        Api.successful_json(self)
+
+    def _log_response(self, response, streamed=False):
+        """
+        Traces the request and its response at DEBUG level, secrets are redacted by the log formatter
+        """
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+
+        logger.debug("%s %s: %s", self.method.value, self.endpoint, response.status_code, extra={'fields': {
+            'url': self.url,
+            'provider': self.provider,
+            'headers': self.headers,
+            'query': self.query_params,
+            'data': self.data,
+            'status': response.status_code,
+            'response_headers': dict(response.headers),
+            'content': "<streamed>" if streamed else response.content,
+        }})
+
+
+class AsyncApi(Api):
+    """
+    asyncio twin of Api. The request is sent with `await fetch()` (or `await successful_json()`),
+    after that, response, response_json and is_ok behave as in Api.
+    Async endpoints are declared as `class AsyncEndpoint(AsyncApi, Endpoint)`.
+    """
+
+    @property
+    def response(self):
+        if self._response is None:
+            raise RuntimeError(f"{type(self).__name__} response not fetched yet, use 'await fetch()'")
+
+        return self._response
+
+    async def _send(self, stream=False):
+        client = async_transport.client(self.url)
+        connect_timeout, read_timeout = timeouts.get(self.endpoint)
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+        if stream:
+            request = client.build_request(self.method.value, self.url, params=self.query_params, data=self.data,
+                                           headers=self.headers, timeout=timeout)
+            return await client.send(request, stream=True)
+
+        if self.method == Method.GET:
+            return await client.get(self.url, params=self.query_params, headers=self.headers, timeout=timeout)
+        elif self.method == Method.POST:
+            return await client.post(self.url, params=self.query_params, data=self.data, headers=self.headers,
+                                     timeout=timeout)
+
+        raise NameError(f"Unsupported method: '{self.method}'")
+
+    async def _send_with_retries(self, stream=False):
+        for delay in self._retry_delays():
+            try:
+                response = await self._send(stream)
+            except httpx.TransportError:
+                if delay is None:
+                    raise
+            else:
+                if delay is None or response.status_code not in retry_policy.retry_status:
+                    return response
+
+                if stream:
+                    await response.aclose()
+
+            logger.warning("Retrying %s in %.2f seconds", self.endpoint, delay,
+                           extra={'fields': {'provider': self.provider}})
+            await asyncio.sleep(delay)
+
+    async def fetch(self):
+        if self._response is None:
+            if not self._load_cached():
+                self._response, self._response_json = await self._fetch()
+                self._store_cached()
+
+        return self._response
+
+    async def _fetch(self):
+        if self.is_idempotent:
+            return await async_singleflight.do(self.request_key(), self._fetch_once)
+
+        return await self._fetch_once()
+
+    async def _fetch_once(self):
+        breaker = self._breaker()
+        started = time.perf_counter()
+
+        try:
+            response = await self._send_with_retries()
+        except httpx.HTTPError as e:
+            raise self._unreachable(breaker, e, started) from e
+        except BaseException:
+            # Cancelled or unexpected, there's no response to record
+            breaker.release()
+            raise
+
+        self._record_response(breaker, response, started)
+        self._log_response(response)
+
+        return response, self._parse_json(response)
+
+    async def successful_json(self):
+        await self.fetch()
+
+        return super().successful_json()
+
+    async def successful_items(self):
+        """
+        Same as Api.successful_items, as an async iterator
+        """
+        breaker = self._breaker()
+        started = time.perf_counter()
+
+        try:
+            response = await self._send_with_retries(stream=True)
+        except httpx.HTTPError as e:
+            raise self._unreachable(breaker, e, started) from e
+        except BaseException:
+            # Cancelled or unexpected, there's no response to record
+            breaker.release()
+            raise
+
+        self._record_response(breaker, response, started, streamed=True)
+        self._log_response(response, streamed=True)
+
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                self._response, self._response_json = response, self._parse_json(response)
+                Api.successful_json(self)
+
+            stream = JsonArrayStream(self.stream_key)
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            size = 0
+            checked = False
+
+            try:
+                async for chunk in response.aiter_bytes(self.stream_chunk_size):
+                    size += len(chunk)
+
+                    for item in stream.feed(decoder.decode(chunk)):
+                        if not checked and stream.members:
+                            self._check_streamed(response, stream)
+
+                        checked = True
+                        yield item
+
+                stream.feed(decoder.decode(b"", final=True))
+                stream.close()
+            except httpx.HTTPError as e:
+                raise self._unreachable(breaker, e, started) from e
+            except ValueError as e:
+                raise ApiException(_("Something went wrong!")) from e
+            finally:
+                metrics.api_response_size.observe(size, self.endpoint)
+
+            self._check_streamed(response, stream)
+        finally:
+            await response.aclose()
+
+    def _revalidate(self):
+        """
+        Refreshes the cached response in a background task
+        """
+        task = asyncio.get_running_loop().create_task(self._fresh_copy()._refresh_cached())
+
+        # Keep a reference to the task until it's done, so it's not garbage collected
+        _revalidation_tasks.add(task)
+        task.add_done_callback(_revalidation_tasks.discard)
+
+    async def _refresh_cached(self):
+        try:
+            self._response, self._response_json = await self._fetch()
+            self._store_cached()
+        except Exception as e:
+            logger.warning("Revalidation of %s failed: %r", self.endpoint, e)
+        finally:
+            self.cache.release(self.cache_key())
+
+
+_revalidation_tasks = set()
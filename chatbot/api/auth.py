@@ -1,12 +1,13 @@
-from .api import Api, Method
+from .api import Api, AsyncApi, Method
 
 
 class Login(Api):
     parameters = "login/"
     method = Method.POST
 
-    def __init__(self, api_key, key=None, data=None):
-        super().__init__(api_key, query_params={'key': key}, data=data)
+    def __init__(self, api_key, key=None, data=None, **kwargs):
+        kwargs.setdefault('provider', (data or {}).get('provider'))
+        super().__init__(api_key, query_params={'key': key}, data=data, **kwargs)
         self.headers["accept"] = "application/json"
         self.headers["content-type"] = "application/x-www-form-urlencoded"
 
@@ -22,9 +23,10 @@ class Login(Api):
 class Logout(Api):
     parameters = "logout/"
     method = Method.GET
+    idempotent = False
 
-    def __init__(self, api_key, key):
-        super().__init__(api_key, query_params={'key': key})
+    def __init__(self, api_key, key, **kwargs):
+        super().__init__(api_key, query_params={'key': key}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -38,8 +40,8 @@ class Client(Api):
     parameters = "client/"
     method = Method.GET
 
-    def __init__(self, api_key, key):
-        super().__init__(api_key, query_params={'key': key})
+    def __init__(self, api_key, key, **kwargs):
+        super().__init__(api_key, query_params={'key': key}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -54,8 +56,8 @@ class ClientSelect(Api):
     parameters = "client/{client_id}/"
     method = Method.GET
 
-    def __init__(self, api_key, key, client_id):
-        super().__init__(api_key, path_params={'client_id': client_id}, query_params={'key': key})
+    def __init__(self, api_key, key, client_id, **kwargs):
+        super().__init__(api_key, path_params={'client_id': client_id}, query_params={'key': key}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -63,3 +65,19 @@ class ClientSelect(Api):
         """
         return (self.response.status_code == 200
                 and self.response_json.get('status') == "success")
+
+
+class AsyncLogin(AsyncApi, Login):
+    pass
+
+
+class AsyncLogout(AsyncApi, Logout):
+    pass
+
+
+class AsyncClient(AsyncApi, Client):
+    pass
+
+
+class AsyncClientSelect(AsyncApi, ClientSelect):
+    pass
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+from chatbot import metrics, settings
+
+
+class ResponseCache:
+    """
+    Process-wide cache of successful API responses, shared between all sessions,
+    with time to live, LRU eviction when full and optional stale-while-revalidate.
+    Cached json is shared by every request that gets it, so it must be treated as read only.
+    """
+
+    def __init__(self, ttl=600, max_size=512, stale_while_revalidate=0):
+        """
+        @param ttl: seconds a response is fresh
+        @param max_size: maximum number of responses, the least recently used is evicted when full
+        @param stale_while_revalidate: seconds after the ttl in which a stale response is still served,
+         while it's refreshed in the background
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_while_revalidate = stale_while_revalidate
+
+        self._entries = OrderedDict()
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        @return
+        the cached (response, json) and whether the caller has to revalidate it,
+        or (None, False) if there is no usable response for the key.
+        Only the first caller getting a stale response is asked to revalidate it.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            stored_at, value = entry
+            age = now - stored_at
+
+            if age > self.ttl + self.stale_while_revalidate:
+                del self._entries[key]
+                self.misses += 1
+                return None, False
+
+            self._entries.move_to_end(key)
+
+            if age <= self.ttl:
+                self.hits += 1
+                return value, False
+
+            self.stale_hits += 1
+            revalidate = key not in self._revalidating
+            self._revalidating.add(key)
+
+            return value, revalidate
+
+    def set(self, key, response, json):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), (response, json))
+            self._entries.move_to_end(key)
+            self._revalidating.discard(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def release(self, key):
+        """
+        Allows a new revalidation of the key, after a failed one
+        """
+        with self._lock:
+            self._revalidating.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._revalidating.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.stale_hits + self.misses
+
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': (self.hits + self.stale_hits) / requests if requests else 0.0,
+            }
+
+
+meta_cache = ResponseCache(**getattr(settings, "CONFIG").get('meta_cache', {}))
+
+metrics.registry.register_collector("chatbot_meta_cache", "Stats of the provider metadata cache",
+                                    lambda: [((stat,), value) for stat, value in meta_cache.stats().items()],
+                                    labels=("stat",))
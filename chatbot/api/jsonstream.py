@@ -0,0 +1,141 @@
+import json
+import re
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonArrayStream:
+    """
+    Incremental parser of a JSON object, yielding the items of one of its array members as soon as
+    they are complete, so the whole array is never in memory at the same time.
+    The rest of the members of the object are kept in `members`.
+    """
+    _START, _KEY, _VALUE, _ITEM, _END = range(5)
+
+    def __init__(self, key):
+        """
+        @param key: name of the array member to stream
+        """
+        self.key = key
+        self.members = {}
+        self.found = False
+
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._state = self._START
+        self._member = None
+
+    def feed(self, text):
+        """
+        Adds the next chunk of the document
+        @return
+        iterator of the array items completed with this chunk
+        """
+        self._buffer = self._buffer[self._position:] + text
+        self._position = 0
+
+        while True:
+            item = self._next()
+            if item is self:
+                return
+
+            yield item
+
+    def close(self):
+        """
+        Checks that the whole document was parsed, raising ValueError if not
+        """
+        if self._state != self._END or self._buffer[self._skip_whitespace():]:
+            raise ValueError("Incomplete or invalid JSON document")
+
+    def _skip_whitespace(self) -> int:
+        self._position = _WHITESPACE.match(self._buffer, self._position).end()
+        return self._position
+
+    def _decode(self):
+        """
+        @return
+        the value starting at the current position, or self if it's not complete yet.
+        A value must be followed by another character, so numbers split between chunks are not cut.
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._position)
+        except json.JSONDecodeError:
+            return self
+
+        if end >= len(self._buffer):
+            return self
+
+        self._position = end
+        return value
+
+    def _next(self):
+        """
+        Advances the parser until an item is complete, or there's nothing more to parse in the buffer
+        @return
+        the item, or self if more data is needed
+        """
+        while True:
+            position = self._skip_whitespace()
+            if position >= len(self._buffer):
+                return self
+
+            char = self._buffer[position]
+
+            if self._state == self._START:
+                if char != "{":
+                    raise ValueError(f"Expected a JSON object, found {char!r}")
+
+                self._position += 1
+                self._state = self._KEY
+
+            elif self._state == self._KEY:
+                if char == ",":
+                    self._position += 1
+                elif char == "}":
+                    self._position += 1
+                    self._state = self._END
+                else:
+                    key = self._decode()
+                    if key is self:
+                        return self
+
+                    colon = self._skip_whitespace()
+                    if colon >= len(self._buffer):
+                        # Parse the key again with the next chunk
+                        self._position = position
+                        return self
+
+                    if self._buffer[colon] != ":" or not isinstance(key, str):
+                        raise ValueError(f"Invalid JSON object member at {key!r}")
+
+                    self._position += 1
+                    self._member = key
+                    self._state = self._VALUE
+
+            elif self._state == self._VALUE:
+                if self._member == self.key and char == "[":
+                    self._position += 1
+                    self.found = True
+                    self._state = self._ITEM
+                else:
+                    value = self._decode()
+                    if value is self:
+                        return self
+
+                    self.members[self._member] = value
+                    self._state = self._KEY
+
+            elif self._state == self._ITEM:
+                if char == ",":
+                    self._position += 1
+                elif char == "]":
+                    self._position += 1
+                    self._state = self._KEY
+                else:
+                    return self._decode()
+
+            else:
+                raise ValueError(f"Unexpected {char!r} after the end of the JSON document")
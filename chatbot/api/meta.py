@@ -1,9 +1,12 @@
-from .api import Api, Method
+from .api import Api, AsyncApi, Method
+from .cache import meta_cache
 
 
 class Provider(Api):
     parameters = "provider/"
     method = Method.GET
+    # The providers available may depend on the API key
+    cache = meta_cache
 
     def is_ok(self):
         """
@@ -17,9 +20,12 @@ class Provider(Api):
 class ProviderDetail(Api):
     parameters = "provider/{provider_code}/"
     method = Method.GET
+    cache = meta_cache
+    cache_per_api_key = False
 
-    def __init__(self, api_key, provider_code):
-        super().__init__(api_key, path_params={'provider_code': provider_code})
+    def __init__(self, api_key, provider_code, **kwargs):
+        kwargs.setdefault('provider', provider_code)
+        super().__init__(api_key, path_params={'provider_code': provider_code}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -34,8 +40,8 @@ class ProviderBranches(Api):
     parameters = "provider/{provider_code}/branches"
     method = Method.GET
 
-    def __init__(self, api_key, provider_code, zip_code):
-        super().__init__(api_key, path_params={'code': provider_code}, query_params={'zip': zip_code})
+    def __init__(self, api_key, provider_code, zip_code, **kwargs):
+        super().__init__(api_key, path_params={'code': provider_code}, query_params={'zip': zip_code}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -50,8 +56,8 @@ class ProviderAtm(Api):
     parameters = "provider/{provider_code}/atms"
     method = Method.GET
 
-    def __init__(self, api_key, provider_code, zip_code):
-        super().__init__(api_key, path_params={'code': provider_code}, query_params={'zip': zip_code})
+    def __init__(self, api_key, provider_code, zip_code, **kwargs):
+        super().__init__(api_key, path_params={'code': provider_code}, query_params={'zip': zip_code}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -60,3 +66,19 @@ class ProviderAtm(Api):
         return (self.response.status_code == 200
                 and self.response_json.get('status') == "success"
                 and "branches" in self.response_json)
+
+
+class AsyncProvider(AsyncApi, Provider):
+    pass
+
+
+class AsyncProviderDetail(AsyncApi, ProviderDetail):
+    pass
+
+
+class AsyncProviderBranches(AsyncApi, ProviderBranches):
+    pass
+
+
+class AsyncProviderAtm(AsyncApi, ProviderAtm):
+    pass
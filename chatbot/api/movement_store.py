@@ -0,0 +1,357 @@
+import pickle
+import re
+import time
+import zlib
+from array import array
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+from chatbot import settings
+from chatbot.summary import MovementColumns
+from chatbot.utils import normalize_string
+from .records import Record
+from .windows import date_format
+
+
+store_settings = getattr(settings, "CONFIG").get('movement_store', {})
+
+
+def movement_day(movement):
+    """
+    @return
+    the ordinal of the date of the movement, None if it has no valid date
+    """
+    try:
+        return datetime.strptime(movement.get('date', ""), date_format).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def movement_words(movement) -> set:
+    """
+    @return
+    the normalized words of the searchable fields of the movement (detail and reference)
+    """
+    return words(" ".join(str(movement.get(field) or "") for field in MovementIndex.fields))
+
+
+def words(string) -> set:
+    return set(re.findall(r"[a-z0-9]+", normalize_string(string)))
+
+
+class MovementIndex:
+    """
+    Inverted index of the words of the searchable fields of the movements of a MovementStore,
+    updated as movements are added and replaced, so a search goes straight to the movements with every word.
+    The movements of each word are an array of keys, (day ordinal << 16) | position of the movement in its day,
+    instead of a dict and lists per word, which would take more memory than the movements themselves.
+    """
+    fields = ('detail', 'reference')
+
+    def __init__(self):
+        # Word -> keys of the movements with the word
+        self.postings = {}
+
+    def __getstate__(self):
+        if 'packed' in self.__dict__:
+            return self.packed
+
+        # The keys of every word in a single array, pickled as a single bytes object
+        keys = array('q')
+        for word_keys in self.postings.values():
+            keys.extend(word_keys)
+
+        return list(self.postings), array('l', map(len, self.postings.values())), keys
+
+    def __setstate__(self, state):
+        # Split by word the first time the postings are used, listing movements doesn't use them
+        self.packed = state
+
+    def __getattr__(self, name):
+        # Only called for the postings of an index loaded and not used yet
+        if name != 'postings' or 'packed' not in self.__dict__:
+            raise AttributeError(name)
+
+        words, lengths, keys = self.__dict__.pop('packed')
+        self.postings = {}
+
+        start = 0
+        for word, length in zip(words, lengths):
+            self.postings[word] = keys[start:start + length]
+            start += length
+
+        return self.postings
+
+    def add(self, day, position, movement):
+        key = day << 16 | position
+        for word in movement_words(movement):
+            keys = self.postings.get(word)
+            if keys is None:
+                self.postings[word] = array('q', (key,))
+            else:
+                keys.append(key)
+
+    def remove(self, first, last, movements):
+        """
+        Removes the movements of the days from first to last
+        @param movements: the movements of those days
+        """
+        low, high = first << 16, (last + 1) << 16
+        for word in set().union(*map(movement_words, movements)):
+            keys = array('q', (key for key in self.postings.get(word, ()) if not low <= key < high))
+            if keys:
+                self.postings[word] = keys
+            else:
+                self.postings.pop(word, None)
+
+    def matches(self, search_words: set, first, last):
+        """
+        @return
+        the (day ordinal, position in the movements of the day) of the movements with every word,
+        from first to last day, in date order
+        """
+        postings = sorted((self.postings.get(word, ()) for word in search_words), key=len)
+        if not postings:
+            return []
+
+        keys = set(postings[0])
+        for other in postings[1:]:
+            keys.intersection_update(other)
+
+        return [(key >> 16, key & 0xFFFF) for key in sorted(keys) if first <= key >> 16 <= last]
+
+
+class MovementStore:
+    """
+    Movements of an account or card already fetched in the session, with the date intervals they cover,
+    so a query fetches only the gaps that are not covered yet.
+    Movements are stored as records, indexed by id, sharing the strings of their dates and details.
+    In the session, the store is packed (pickled and compressed) once per change, and unpacked only by the requests
+    using its movements.
+    The recent edge of the covered intervals (the last recent_days up to today) may still change,
+    so it's considered covered only for recent_ttl seconds after it was fetched.
+    """
+    recent_days = store_settings.get('recent_days', 2)
+    recent_ttl = store_settings.get('recent_ttl', 300)
+    interned = ('date', 'detail')
+    packed_attributes = ('intervals', 'days', 'ids', 'index')
+
+    def __init__(self):
+        # Disjoint (first day, last day, fetched at) of the covered dates, sorted, days as ordinals
+        self.intervals = []
+        # Day ordinal -> movements of the day, in date order
+        self.days = {}
+        # Movement id -> day ordinal of the movement
+        self.ids = {}
+        self.index = MovementIndex()
+        # The store as it was last packed, while it's not changed
+        self.packed = None
+        # Whether movements were added since it was loaded from the session, so the session has to be saved
+        self.changed = False
+        # (first day, last day) -> MovementColumns of the range, until movements are added (not kept in the session)
+        self.columns_cache = {}
+
+    def __getstate__(self):
+        if self.changed or self.packed is None:
+            self.packed = self.pack()
+
+        return {'packed': self.packed}
+
+    def __setstate__(self, state):
+        self.changed = False
+        self.columns_cache = {}
+
+        # Unpacked the first time its movements are used
+        self.packed = state['packed']
+
+    def __getattr__(self, name):
+        # Only called for the attributes not set, those of a store loaded from the session and not unpacked yet
+        if name in self.packed_attributes and self.__dict__.get('packed') is not None:
+            self.unpack()
+            return getattr(self, name)
+
+        raise AttributeError(name)
+
+    def pack(self) -> bytes:
+        """
+        @return
+        the covered intervals, movements (as plain tuples) and index, pickled and compressed
+        """
+        days = {day: [(movement.fields, movement.values) for movement in movements]
+                for day, movements in self.days.items()}
+
+        return zlib.compress(pickle.dumps((self.intervals, days, self.index), pickle.HIGHEST_PROTOCOL), 1)
+
+    def unpack(self):
+        self.intervals, days, self.index = pickle.loads(zlib.decompress(self.packed))
+        self.days = {day: [Record(fields, values) for fields, values in movements] for day, movements in days.items()}
+        self.ids = {movement.get('id'): day for day, movements in self.days.items() for movement in movements
+                    if movement.get('id') is not None}
+
+    def gaps(self, date_start: datetime, date_end: datetime, now=None) -> List[Tuple[datetime, datetime]]:
+        """
+        @return
+        the (start, end) of the parts of the date range that are not covered, in date order
+        """
+        now = time.time() if now is None else now
+        recent_start = date.today().toordinal() - self.recent_days + 1
+
+        gaps = []
+        cursor, end = date_start.toordinal(), date_end.toordinal()
+
+        for first, last, fetched_at in self.intervals:
+            if last >= recent_start and now - fetched_at > self.recent_ttl:
+                last = min(last, recent_start - 1)
+
+            if last < cursor or first > last:
+                continue
+            if first > end:
+                break
+
+            if first > cursor:
+                gaps.append((cursor, first - 1))
+            cursor = last + 1
+
+            if cursor > end:
+                break
+
+        if cursor <= end:
+            gaps.append((cursor, end))
+
+        return [(datetime.fromordinal(first), datetime.fromordinal(last)) for first, last in gaps]
+
+    def add(self, date_start: datetime, date_end: datetime, movements: Iterable[dict], now=None):
+        """
+        Stores the movements of the date range, replacing the ones stored before for those dates,
+        and marks the range as covered
+        """
+        first, last = date_start.toordinal(), date_end.toordinal()
+
+        replaced = []
+        for day in range(first, last + 1):
+            replaced += self.days.pop(day, ())
+
+        for movement in replaced:
+            self.ids.pop(movement.get('id'), None)
+        self.index.remove(first, last, replaced)
+
+        for movement in movements:
+            movement_id = movement.get('id')
+            if movement_id is not None and movement_id in self.ids:
+                continue
+
+            # Movements without a valid date are kept on the first day of the range they were fetched with
+            day = movement_day(movement)
+            day = first if day is None else day
+
+            if movement_id is not None:
+                self.ids[movement_id] = day
+
+            movement = Record.of(movement, self.interned)
+            movements_of_day = self.days.setdefault(day, [])
+            self.index.add(day, len(movements_of_day), movement)
+            movements_of_day.append(movement)
+
+        self.cover(first, last, time.time() if now is None else now)
+        self.changed = True
+        self.columns_cache.clear()
+
+    def add_windows(self, windows: List[Tuple[datetime, datetime]], movements: Iterable[dict], now=None):
+        """
+        Stores the movements fetched for the windows, leaving uncovered the windows that failed
+        @param windows: (start, end) of the windows fetched successfully, in date order
+        """
+        if not windows:
+            return
+
+        windows_movements = [[] for _ in windows]
+        first_days = [start.toordinal() for start, _ in windows]
+        last_days = [end.toordinal() for _, end in windows]
+
+        for movement in movements:
+            day = movement_day(movement)
+            day = first_days[0] if day is None else day
+
+            for i, (first, last) in enumerate(zip(first_days, last_days)):
+                if first <= day <= last:
+                    windows_movements[i].append(movement)
+                    break
+
+        for (start, end), window_movements in zip(windows, windows_movements):
+            self.add(start, end, window_movements, now)
+
+    def cover(self, first, last, fetched_at):
+        intervals = []
+
+        for interval_first, interval_last, interval_fetched_at in self.intervals:
+            if interval_last < first or interval_first > last:
+                intervals.append((interval_first, interval_last, interval_fetched_at))
+                continue
+
+            # Keep the parts of the interval outside the new one
+            if interval_first < first:
+                intervals.append((interval_first, first - 1, interval_fetched_at))
+            if interval_last > last:
+                intervals.append((last + 1, interval_last, interval_fetched_at))
+
+        intervals.append((first, last, fetched_at))
+        self.intervals = sorted(intervals)
+
+    def movement(self, movement_id) -> Optional[Record]:
+        """
+        @return
+        the stored movement with the id, None if it's not stored
+        """
+        day = self.ids.get(movement_id)
+        if day is None:
+            return None
+
+        for movement in self.days[day]:
+            if movement.get('id') == movement_id:
+                return movement
+
+        return None
+
+    def movements(self, date_start: datetime, date_end: datetime):
+        """
+        @return
+        iterator of the stored movements of the date range, in date order
+        """
+        for day in range(date_start.toordinal(), date_end.toordinal() + 1):
+            yield from self.days.get(day, ())
+
+    def days_movements(self, date_start: datetime, date_end: datetime):
+        """
+        @return
+        iterator of the (day ordinal, stored movements of the day) of the days of the range with movements,
+        in date order
+        """
+        for day in range(date_start.toordinal(), date_end.toordinal() + 1):
+            movements = self.days.get(day)
+            if movements:
+                yield day, movements
+
+    def columns(self, date_start: datetime, date_end: datetime) -> MovementColumns:
+        """
+        @return
+        the stored movements of the date range as columns, built once per range while no movements are added
+        """
+        key = (date_start.toordinal(), date_end.toordinal())
+
+        columns = self.columns_cache.get(key)
+        if columns is None:
+            columns = self.columns_cache[key] = MovementColumns(self.days_movements(date_start, date_end))
+
+        return columns
+
+    def search(self, search_words: set, date_start: Optional[datetime] = None, date_end: Optional[datetime] = None):
+        """
+        @param search_words: normalized words, as returned by `words`
+        @return
+        iterator of the stored movements containing every word, in date order, in the date range if given
+        """
+        first = date.min.toordinal() if date_start is None else date_start.toordinal()
+        last = date.max.toordinal() if date_end is None else date_end.toordinal()
+
+        for day, position in self.index.matches(search_words, first, last):
+            yield self.days[day][position]
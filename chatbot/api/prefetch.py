@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot import metrics, settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Runs requests in background threads as soon as their responses are likely to be needed,
+    keyed by the provider session key, so the following messages of the user get them without waiting.
+    Results not taken within ttl seconds are dropped.
+    The results are kept in the memory of the process, not in the session: with several worker processes
+    the following messages may be served by another one, so prefetching is disabled.
+    """
+
+    def __init__(self, enabled=False, ttl=120, max_workers=4, processes=1):
+        """
+        @param processes: worker processes serving the app
+        """
+        if enabled and processes > 1:
+            logger.warning("Prefetching disabled, the results are not shared by the %s worker processes", processes)
+
+        self.enabled = enabled and processes <= 1
+        self.ttl = ttl
+        self.max_workers = max_workers
+
+        # session key -> (started at, {name: Future})
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self.started = 0
+        self.used = 0
+        self.discarded = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+
+        return self._executor
+
+    def start(self, session_key, functions: dict):
+        """
+        Starts calling each function in background, if prefetching is enabled
+        @param functions: name -> function without arguments, returning the result to prefetch
+        """
+        if not self.enabled or not session_key:
+            return
+
+        futures = {name: self.executor.submit(function) for name, function in functions.items()}
+
+        with self._lock:
+            self._expire()
+            self._discard(self._entries.pop(session_key, None))
+            self._entries[session_key] = (time.monotonic(), futures)
+            self.started += len(futures)
+
+    def _pop(self, session_key, name):
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+
+            started_at, futures = entry
+            future = futures.pop(name, None)
+            if not futures:
+                del self._entries[session_key]
+
+            if future is None or time.monotonic() - started_at > self.ttl:
+                return None
+
+            self.used += 1
+            return future
+
+    def take(self, session_key, name):
+        """
+        Takes a prefetched result, waiting for it if it's still running
+        @return
+        the result, or None if it wasn't prefetched or failed (the caller fetches it as usual)
+        """
+        future = self._pop(session_key, name)
+        if future is None:
+            return None
+
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    async def atake(self, session_key, name):
+        """
+        Same as take, without blocking the event loop
+        """
+        future = self._pop(session_key, name)
+        if future is None:
+            return None
+
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception:
+            return None
+
+    def cancel(self, session_key):
+        """
+        Cancels the prefetching of the session, results of running requests are discarded
+        """
+        with self._lock:
+            self._discard(self._entries.pop(session_key, None))
+
+    def _discard(self, entry):
+        if entry is None:
+            return
+
+        for future in entry[1].values():
+            future.cancel()
+            self.discarded += 1
+
+    def _expire(self):
+        now = time.monotonic()
+
+        for session_key in [key for key, (started_at, _) in self._entries.items() if now - started_at > self.ttl]:
+            self._discard(self._entries.pop(session_key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'sessions': len(self._entries), 'started': self.started,
+                    'used': self.used, 'discarded': self.discarded}
+
+
+# WEB_CONCURRENCY is the number of worker processes used by gunicorn and most hosting platforms
+prefetcher = Prefetcher(**getattr(settings, "CONFIG").get('prefetch', {}),
+                        processes=int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+metrics.registry.register_collector("chatbot_prefetch", "Requests prefetched after the provider login",
+                                    lambda: [((stat,), value) for stat, value in prefetcher.stats().items()],
+                                    labels=("stat",))
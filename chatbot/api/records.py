@@ -0,0 +1,109 @@
+import sys
+from typing import Iterable, Iterator, Optional
+
+
+# Field names of the records, one tuple per set of fields shared by every record with them
+_fields = {}
+
+
+def shared_fields(fields: tuple) -> tuple:
+    return _fields.setdefault(fields, fields)
+
+
+class Record:
+    """
+    Item of the API (account, card or movement) as the tuple of its values, with the tuple of its field names
+    shared by the records with the same fields, so it takes a fraction of the memory and pickle size of its dict.
+    It's read like the dict it was made from (get, [], items, keys, in).
+    """
+    __slots__ = ('fields', 'values')
+
+    def __init__(self, fields: tuple, values: tuple):
+        self.fields = fields
+        self.values = values
+
+    @classmethod
+    def of(cls, item: dict, interned=()) -> 'Record':
+        """
+        @param interned: fields whose string values repeat between items (like the date or detail of movements),
+        interned so the items share them, also once pickled
+        """
+        if isinstance(item, Record):
+            return item
+
+        values = tuple(sys.intern(value) if key in interned and type(value) is str else value
+                       for key, value in item.items())
+
+        return cls(shared_fields(tuple(item)), values)
+
+    def __reduce__(self):
+        # The fields are pickled once, and shared again once loaded
+        return Record, (self.fields, self.values)
+
+    def __getitem__(self, key):
+        try:
+            return self.values[self.fields.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self.values[self.fields.index(key)]
+        except ValueError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def keys(self):
+        return self.fields
+
+    def items(self):
+        return zip(self.fields, self.values)
+
+    def dict(self) -> dict:
+        return dict(zip(self.fields, self.values))
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self.fields == other.fields and self.values == other.values
+        if isinstance(other, dict):
+            return self.dict() == other
+
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Record({self.dict()!r})"
+
+
+class Items:
+    """
+    Accounts or cards of the provider session, as records indexed by number
+    """
+    __slots__ = ('records', 'numbers')
+
+    def __init__(self, items: Iterable[dict]):
+        self.records = [Record.of(item) for item in items]
+        self.numbers = {}
+        for record in self.records:
+            self.numbers.setdefault(record.get('number'), record)
+
+    def __reduce__(self):
+        return Items, (self.records,)
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def by_number(self, number) -> Optional[Record]:
+        return self.numbers.get(number)
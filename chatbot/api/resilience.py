@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+from enum import Enum
+
+from chatbot import metrics, settings
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an upstream after consecutive failures, so a degraded bank fails fast
+    instead of holding workers. After reset_timeout seconds a single trial request is allowed (half open),
+    closing the breaker if it succeeds, or opening it again if it fails.
+    A trial that ends without a response (cancelled, unexpected error) must be released,
+    and a trial that never ends is replaced by a new one after reset_timeout seconds.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+        self.trips = 0
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        @return
+        whether a request can be sent now
+        """
+        with self._lock:
+            if self.state == BreakerState.CLOSED:
+                return True
+
+            now = time.monotonic()
+
+            if self.state == BreakerState.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = BreakerState.HALF_OPEN
+                self.probe_started = None
+
+            if self.state == BreakerState.HALF_OPEN and (self.probe_started is None
+                                                         or now - self.probe_started >= self.reset_timeout):
+                self.probe_started = now
+                return True
+
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """
+        Frees the trial request slot of a half open breaker, for a request that ended
+        without a success or a failure to record
+        """
+        with self._lock:
+            if self.state == BreakerState.HALF_OPEN:
+                self.probe_started = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = BreakerState.CLOSED
+            self.failures = 0
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+            if self.state == BreakerState.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != BreakerState.OPEN:
+                    self.trips += 1
+
+                self.state = BreakerState.OPEN
+                self.opened_at = time.monotonic()
+                self.probe_started = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state.value,
+                'failures': self.failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
+
+
+class CircuitBreakers:
+    """
+    Registry of circuit breakers, one per provider and endpoint
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, endpoint) -> CircuitBreaker:
+        key = (provider or "*", endpoint)
+
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self._breakers[key] = CircuitBreaker("/".join(key),
+                                                                   failure_threshold=self.failure_threshold,
+                                                                   reset_timeout=self.reset_timeout)
+
+        return breaker
+
+    def clear(self):
+        with self._lock:
+            self._breakers.clear()
+
+    def stats(self) -> list:
+        with self._lock:
+            breakers = list(self._breakers.values())
+
+        return [breaker.stats() for breaker in breakers]
+
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter,
+    so clients retrying at the same time don't hit the upstream together again
+    """
+    # Upstream errors worth retrying
+    retry_status = (502, 503, 504)
+
+    def __init__(self, retries=2, backoff=0.3, backoff_max=2.0):
+        """
+        @param retries: extra attempts after the first one
+        @param backoff: base delay in seconds, doubled on each retry
+        @param backoff_max: maximum delay in seconds
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+    def delays(self):
+        """
+        @return
+        the random delays to wait before each retry
+        """
+        for attempt in range(self.retries):
+            yield random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+
+class Timeouts:
+    """
+    Connect and read timeouts per endpoint, in seconds
+    """
+
+    def __init__(self, default=None, **endpoints):
+        self.default = {'connect': 3.05, 'read': 20, **(default or {})}
+        self.endpoints = endpoints
+
+    def get(self, endpoint):
+        """
+        @return
+        the (connect, read) timeouts for the endpoint
+        """
+        timeout = {**self.default, **self.endpoints.get(endpoint, {})}
+
+        return timeout['connect'], timeout['read']
+
+
+resilience_settings = getattr(settings, "CONFIG").get('resilience', {})
+
+timeouts = Timeouts(**resilience_settings.get('timeout', {}))
+retry_policy = RetryPolicy(**resilience_settings.get('retry', {}))
+breakers = CircuitBreakers(**resilience_settings.get('breaker', {}))
+
+
+def _breaker_samples():
+    for stats in breakers.stats():
+        yield (stats['name'], "open"), int(stats['state'] != BreakerState.CLOSED.value)
+
+        for stat in ('failures', 'trips', 'rejected'):
+            yield (stats['name'], stat), stats[stat]
+
+
+metrics.registry.register_collector("chatbot_circuit_breaker", "State and stats of the circuit breakers",
+                                    _breaker_samples, labels=("breaker", "stat"))
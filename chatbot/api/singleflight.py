@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import threading
+import weakref
+
+from chatbot import metrics
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls from different threads:
+    the first caller of a key runs the call, and the callers arriving while it's in flight
+    wait for it and get the same result (or exception)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            call.done.set()
+
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced}
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    asyncio twin of SingleFlight, coalescing identical concurrent coroutines of the same event loop
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        self._loop_calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, function):
+        """
+        @param function: coroutine function to call, without arguments
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            calls = self._loop_calls.setdefault(loop, {})
+
+            task = calls.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.calls += 1
+                task = calls[key] = loop.create_task(function())
+                task.add_done_callback(functools.partial(self._call_done, calls, key))
+
+        # The call runs in its own task, so a cancelled waiter (leader or not) doesn't cancel the others
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _call_done(calls, key, task):
+        del calls[key]
+
+        if not task.cancelled():
+            # Mark the exception as retrieved, all the waiters may have been cancelled
+            task.exception()
+
+
+singleflight = SingleFlight()
+async_singleflight = AsyncSingleFlight()
+
+metrics.registry.register_collector("chatbot_singleflight_requests", "Upstream calls made and coalesced",
+                                    lambda: [((kind, "sync"), count) for kind, count in singleflight.stats().items()]
+                                    + [((kind, "async"), count) for kind, count in async_singleflight.stats().items()],
+                                    labels=("kind", "client"))
@@ -1,14 +1,14 @@
 from datetime import datetime
 
-from .api import Api, Method
+from .api import Api, AsyncApi, Method
 
 
 class Info(Api):
     parameters = "info/"
     method = Method.GET
 
-    def __init__(self, api_key, key):
-        super().__init__(api_key, query_params={'key': key})
+    def __init__(self, api_key, key, **kwargs):
+        super().__init__(api_key, query_params={'key': key}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -23,8 +23,8 @@ class Account(Api):
     parameters = "account/"
     method = Method.GET
 
-    def __init__(self, api_key, key):
-        super().__init__(api_key, query_params={'key': key})
+    def __init__(self, api_key, key, **kwargs):
+        super().__init__(api_key, query_params={'key': key}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -38,16 +38,18 @@ class Account(Api):
 class AccountMovement(Api):
     parameters = "account/{account_number}/movement/"
     method = Method.GET
+    stream_key = 'movements'
     date_format = "%d/%m/%Y"
 
-    def __init__(self, api_key, key, account_number, currency, date_start: datetime, date_end: datetime):
+    def __init__(self, api_key, key, account_number, currency, date_start: datetime, date_end: datetime, **kwargs):
         super().__init__(api_key,
                          path_params={'account_number': account_number},
                          query_params={'key': key,
                                        'currency': currency,
                                        'date_start': date_start.strftime(self.date_format),
                                        'date_end': date_end.strftime(self.date_format)
-                                       })
+                                       },
+                         **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -62,8 +64,8 @@ class CreditCard(Api):
     parameters = "credit-card/"
     method = Method.GET
 
-    def __init__(self, api_key, key):
-        super().__init__(api_key, query_params={'key': key})
+    def __init__(self, api_key, key, **kwargs):
+        super().__init__(api_key, query_params={'key': key}, **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -77,16 +79,18 @@ class CreditCard(Api):
 class CreditCardMovement(Api):
     parameters = "credit-card/{card_number}/movements"
     method = Method.GET
+    stream_key = 'movements'
     date_format = "%d/%m/%Y"
 
-    def __init__(self, api_key, key, card_number, currency, date_start: datetime, date_end: datetime):
+    def __init__(self, api_key, key, card_number, currency, date_start: datetime, date_end: datetime, **kwargs):
         super().__init__(api_key,
                          path_params={'card_number': card_number},
                          query_params={'key': key,
                                        'currency': currency,
                                        'date_start': date_start.strftime(self.date_format),
                                        'date_end': date_end.strftime(self.date_format)
-                                       })
+                                       },
+                         **kwargs)
 
     def is_ok(self) -> bool:
         """
@@ -95,3 +99,23 @@ class CreditCardMovement(Api):
         return (self.response.status_code == 200
                 and self.response_json.get('status') == "success"
                 and 'movements' in self.response_json)
+
+
+class AsyncInfo(AsyncApi, Info):
+    pass
+
+
+class AsyncAccount(AsyncApi, Account):
+    pass
+
+
+class AsyncAccountMovement(AsyncApi, AccountMovement):
+    pass
+
+
+class AsyncCreditCard(AsyncApi, CreditCard):
+    pass
+
+
+class AsyncCreditCardMovement(AsyncApi, CreditCardMovement):
+    pass
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import weakref
+from http.cookiejar import CookieJar, CookiePolicy
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from chatbot import settings
+
+
+class BlockAll(CookiePolicy):
+    """
+    Cookie policy that neither keeps nor sends cookies.
+    The sessions are shared by every user, so a cookie set for a request must not be sent with the others.
+    """
+    netscape = True
+    rfc2965 = False
+    hide_cookie2 = False
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+    def domain_return_ok(self, domain, request):
+        return False
+
+    def path_return_ok(self, path, request):
+        return False
+
+
+class Transport:
+    """
+    Process-wide pool of keep-alive HTTP sessions, one per base URL (scheme + host),
+    so consecutive Api calls reuse open connections instead of doing a new TCP+TLS handshake each time
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=20, pool_block=False, keep_alive=True):
+        """
+        @param pool_connections: number of hosts to keep connection pools for
+        @param pool_maxsize: maximum number of connections kept alive per host
+        @param pool_block: if True, pool_maxsize is a hard cap of concurrent connections per host,
+         and extra requests wait for a free connection instead of opening a new one
+        @param keep_alive: if False, connections are closed after each request
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def origin(url) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, url) -> requests.Session:
+        """
+        @return
+        the shared session for the origin of the url, creating it the first time
+        """
+        origin = self.origin(url)
+
+        session = self._sessions.get(origin)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(origin)
+                if session is None:
+                    session = self._sessions[origin] = self._new_session()
+
+        return session
+
+    def close(self):
+        """
+        Closes every pooled connection. Sessions are created again on demand.
+        """
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+
+        for session in sessions.values():
+            session.close()
+
+    def _new_session(self) -> requests.Session:
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+
+        session = requests.Session()
+        session.cookies.set_policy(BlockAll())
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+        return session
+
+
+class AsyncTransport(Transport):
+    """
+    asyncio twin of Transport, with one keep-alive httpx.AsyncClient per origin.
+    Clients are bound to the event loop that created them, so they are kept per loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._clients = weakref.WeakKeyDictionary()
+
+    def client(self, url) -> httpx.AsyncClient:
+        """
+        @return
+        the shared client for the origin of the url in the running event loop, creating it the first time
+        """
+        loop = asyncio.get_running_loop()
+        origin = self.origin(url)
+
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+
+        # Only the thread running the loop uses its clients, so no lock is needed from here
+        client = clients.get(origin)
+        if client is None:
+            client = clients[origin] = self._new_client()
+
+        return client
+
+    async def aclose(self):
+        """
+        Closes every pooled connection of the running event loop
+        """
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+
+        for client in clients.values():
+            await client.aclose()
+
+    def _new_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.pool_maxsize if self.pool_block else None,
+                              max_keepalive_connections=self.pool_maxsize if self.keep_alive else 0)
+
+        # No timeout, as the sync transport
+        return httpx.AsyncClient(limits=limits, timeout=None, cookies=CookieJar(policy=BlockAll()))
+
+
+transport = Transport(**getattr(settings, "CONFIG").get('transport', {}))
+async_transport = AsyncTransport(**getattr(settings, "CONFIG").get('transport', {}))
@@ -0,0 +1,210 @@
+import asyncio
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+from django.utils import translation
+
+from chatbot import settings
+from .api import Api, ApiException
+
+
+windows_settings = getattr(settings, "CONFIG").get('movement_windows', {})
+
+# Shared by every request of the process, so the concurrent requests to the banks are bounded
+executor = ThreadPoolExecutor(max_workers=windows_settings.get('max_workers', 4),
+                              thread_name_prefix="movement-window")
+
+date_format = "%d/%m/%Y"
+
+
+def month_windows(date_start: datetime, date_end: datetime, months=1) -> List[Tuple[datetime, datetime]]:
+    """
+    Splits the date range in windows of calendar months, the first and last ones can be partial
+    @return
+    the (start, end) of each window, in date order
+    """
+    windows = []
+    start = date_start
+
+    while start.date() <= date_end.date():
+        end_month = start.month + months - 1
+        end_year, end_month = start.year + (end_month - 1) // 12, (end_month - 1) % 12 + 1
+
+        if (end_year, end_month) >= (date_end.year, date_end.month):
+            end = date_end
+        else:
+            end = start.replace(year=end_year, month=end_month, day=monthrange(end_year, end_month)[1])
+
+        windows.append((start, end))
+        start = (end.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+    return windows
+
+
+def movement_date(movement):
+    """
+    Sort key of a movement by date, movements without a valid date go last
+    """
+    try:
+        return 0, datetime.strptime(movement.get('date', ""), date_format)
+    except (TypeError, ValueError):
+        return 1, datetime.min
+
+
+class WindowFailure:
+    def __init__(self, window: Tuple[datetime, datetime], error: ApiException):
+        self.window = window
+        self.error = error
+
+    @property
+    def date_start(self) -> str:
+        return self.window[0].strftime(date_format)
+
+    @property
+    def date_end(self) -> str:
+        return self.window[1].strftime(date_format)
+
+
+class WindowedMovements:
+    """
+    Fetches the movements of a long date range as concurrent requests of calendar month windows,
+    which banks answer faster and more reliably than a single huge request.
+    Movements are merged in date order, without duplicates (by id).
+    A failed window doesn't fail the others, it's reported in `failures`,
+    the error is raised only if every window failed.
+    """
+    months = windows_settings.get('months', 1)
+
+    def __init__(self, api: Callable[[datetime, datetime], Api], date_start: datetime, date_end: datetime):
+        """
+        @param api: creates the request of the movements of a window, given its start and end dates
+        """
+        self.api = api
+        self.windows = month_windows(date_start, date_end, self.months)
+        self.failures = []
+
+    @property
+    def fetched_windows(self) -> List[Tuple[datetime, datetime]]:
+        """
+        Windows fetched successfully, once the movements were iterated
+        """
+        failed = [failure.window for failure in self.failures]
+
+        return [window for window in self.windows if window not in failed]
+
+    def movements(self):
+        """
+        @return
+        iterator of the movements of the whole range.
+        A range of a single window is streamed, as a request without windows.
+        """
+        if len(self.windows) == 1:
+            yield from self.api(*self.windows[0]).successful_items()
+            return
+
+        for _, movements in self.window_movements():
+            yield from movements
+
+    def window_movements(self):
+        """
+        @return
+        iterator of the (window, movements) of each window fetched successfully, in date order,
+        as soon as the window and the previous ones are complete
+        """
+        if len(self.windows) == 1:
+            yield self.windows[0], list(self.api(*self.windows[0]).successful_items())
+            return
+
+        language = translation.get_language()
+        futures = [executor.submit(self.fetch_window, window, language) for window in self.windows]
+        seen = set()
+
+        try:
+            for window, future in zip(self.windows, futures):
+                result = self.window_result(future)
+                movements = list(self.merge_window(window, result, seen))
+
+                if not isinstance(result, ApiException):
+                    yield window, movements
+        finally:
+            for future in futures:
+                future.cancel()
+
+        self.raise_if_all_failed()
+
+    def fetch_window(self, window, language) -> list:
+        # Error messages are translated in the worker thread, to the language of the request
+        with translation.override(language):
+            return sorted(self.api(*window).successful_items(), key=movement_date)
+
+    @staticmethod
+    def window_result(future):
+        try:
+            return future.result()
+        except ApiException as e:
+            return e
+
+    def merge_window(self, window, result, seen: set):
+        """
+        @param result: the movements of the window, or the ApiException of its request
+        @param seen: ids of the movements of the previous windows
+        @return
+        iterator of the movements of the window not seen before
+        """
+        if isinstance(result, ApiException):
+            self.failures.append(WindowFailure(window, result))
+            return
+
+        for movement in result:
+            movement_id = movement.get('id')
+            if movement_id is not None:
+                if movement_id in seen:
+                    continue
+
+                seen.add(movement_id)
+
+            yield movement
+
+    def raise_if_all_failed(self):
+        if len(self.failures) == len(self.windows):
+            raise self.failures[0].error
+
+
+class AsyncWindowedMovements(WindowedMovements):
+    """
+    asyncio twin of WindowedMovements, with at most max_workers concurrent window requests per range
+    """
+    max_workers = windows_settings.get('max_workers', 4)
+
+    async def movements(self):
+        if len(self.windows) == 1:
+            async for movement in self.api(*self.windows[0]).successful_items():
+                yield movement
+            return
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+        tasks = [asyncio.create_task(self.fetch_window(window, semaphore)) for window in self.windows]
+        seen = set()
+
+        try:
+            for window, task in zip(self.windows, tasks):
+                for movement in self.merge_window(window, await self.window_result(task), seen):
+                    yield movement
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        self.raise_if_all_failed()
+
+    async def fetch_window(self, window, semaphore) -> list:
+        async with semaphore:
+            return sorted([movement async for movement in self.api(*window).successful_items()], key=movement_date)
+
+    @staticmethod
+    async def window_result(task):
+        try:
+            return await task
+        except ApiException as e:
+            return e
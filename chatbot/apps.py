@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        from django.conf import settings as django_settings
+        from . import settings
+
+        if getattr(settings, "CONFIG").get('warm_up', False):
+            from .utils import warm_up_dates
+
+            warm_up_dates([language for language, _ in django_settings.LANGUAGES])
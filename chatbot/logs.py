@@ -0,0 +1,173 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+
+
+REDACTED = "***"
+
+# Names of headers, parameters and fields that must never be logged
+SECRET_NAMES = re.compile(r"key|password|pass|secret|token|otp|pin|answer|question", re.IGNORECASE)
+
+# Same secrets inside raw JSON bodies, e.g. the session key in the login response
+SECRET_JSON_VALUES = re.compile(r'("[^"]*(?:key|password|secret|token)[^"]*"\s*:\s*)"[^"]*"', re.IGNORECASE)
+
+
+def redact(value):
+    """
+    @return
+    a copy of the value with the secret items of mappings replaced, and the secrets in JSON bodies hidden
+    """
+    if isinstance(value, dict):
+        return {k: REDACTED if SECRET_NAMES.search(str(k)) else redact(v) for k, v in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+
+    if isinstance(value, bytes):
+        value = value.decode(errors='replace')
+
+    if isinstance(value, str):
+        return SECRET_JSON_VALUES.sub(rf'\1"{REDACTED}"', value)
+
+    return value
+
+
+def truncate(value, max_length):
+    """
+    @return
+    the string truncated to max_length characters, noting the original length
+    """
+    if isinstance(value, str) and max_length and len(value) > max_length:
+        return f"{value[:max_length]}... ({len(value)} characters)"
+
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a random fraction of the records below min_level (the tracing ones),
+    records of min_level and above are always kept
+    """
+
+    def __init__(self, rate=1.0, min_level=logging.INFO):
+        super().__init__()
+
+        self.rate = rate
+        self.min_level = min_level if isinstance(min_level, int) else logging.getLevelName(min_level)
+
+    def filter(self, record):
+        return record.levelno >= self.min_level or random.random() < self.rate
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+    Structured data is passed as `extra={'fields': {...}}`, and is redacted and truncated here,
+    outside the request path when used with QueueStreamHandler.
+    """
+
+    def __init__(self, max_length=2000):
+        """
+        @param max_length: maximum number of characters of each string field, 0 to not truncate
+        """
+        super().__init__()
+
+        self.max_length = max_length
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+
+        for name, value in redact(getattr(record, 'fields', {})).items():
+            entry[name] = truncate(value, self.max_length)
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class QueueStreamHandler(QueueHandler):
+    """
+    Non blocking handler: records are put in a queue in the request path,
+    and formatted and written to the stream by a background thread.
+    The thread doesn't survive fork (e.g. gunicorn workers forked after the app is loaded),
+    it's started again in the child process.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.running = True
+
+        _handlers.add(self)
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        # The formatter is used by the background thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Merges the message arguments, leaving the formatting to the background thread
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
+
+    def flush(self):
+        """
+        Waits until the queued records are written
+        """
+        if self.running:
+            self.listener.stop()
+            self.listener.start()
+
+        self.target.flush()
+
+    def after_fork(self):
+        """
+        Starts the background thread in a forked child process, with a new queue,
+        so the records queued in the parent are not written twice
+        """
+        if self.running:
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.target)
+            self.listener.start()
+
+    def close(self):
+        if self.running:
+            self.running = False
+            self.listener.stop()
+            atexit.unregister(self.close)
+
+        super().close()
+
+
+_handlers = weakref.WeakSet()
+
+
+def _after_fork():
+    for handler in list(_handlers):
+        handler.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,316 @@
+import abc
+import bisect
+import contextlib
+import ipaddress
+import math
+import threading
+import time
+import weakref
+
+from chatbot import settings
+
+
+class _Shards:
+    """
+    One dict of values per thread, so threads update their own values without locks or contention.
+    The lock is only taken the first time a thread updates a metric, and when the shards are collected.
+    The shards of the ended threads are folded into a single dict, so short-lived threads don't pile up shards.
+    """
+
+    def __init__(self, merge):
+        """
+        @param merge: function adding the values of a shard to a totals dict
+        """
+        self.merge = merge
+
+        self._local = threading.local()
+        self._shards = {}
+        self._ended = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def local(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._fold_ended()
+                self._shards[id(values)] = values
+
+            # The thread object is collected after the thread ends
+            weakref.finalize(threading.current_thread(), self._ended.append, values)
+
+            return values
+
+    def _fold_ended(self):
+        """
+        Moves the values of the ended threads to the retired values, with the lock taken.
+        The finalizers only append to _ended, they may run in any thread, even in one holding the lock.
+        """
+        while self._ended:
+            values = self._ended.pop()
+            self.merge(self._retired, values)
+            del self._shards[id(values)]
+
+    def collect(self) -> list:
+        with self._lock:
+            self._fold_ended()
+
+            retired = {}
+            self.merge(retired, self._retired)
+            shards = list(self._shards.values())
+
+        # Copying a dict is atomic, a thread may be adding a new key to it
+        return [retired, *(shard.copy() for shard in shards)]
+
+    def clear(self):
+        with self._lock:
+            self._fold_ended()
+
+            self._retired.clear()
+            for shard in self._shards.values():
+                shard.clear()
+
+    def __len__(self):
+        with self._lock:
+            self._fold_ended()
+
+            return len(self._shards)
+
+
+class Metric(abc.ABC):
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        """
+        @param labels: names of the labels, their values are passed in the same order when updating the metric
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+        self._shards = _Shards(self.merge)
+
+    def label_string(self, values, **extra) -> str:
+        return label_string(self.labels, values, **extra)
+
+    def clear(self):
+        self._shards.clear()
+
+    def totals(self) -> dict:
+        """
+        @return
+        the values of every thread added up, per label values
+        (for histograms, the count per bucket and the sum of the observations)
+        """
+        totals = {}
+        for shard in self._shards.collect():
+            self.merge(totals, shard)
+
+        return totals
+
+    @staticmethod
+    @abc.abstractmethod
+    def merge(totals: dict, shard: dict):
+        """
+        Adds the values of the shard to the totals, by label values, without modifying the shard
+        """
+
+    @abc.abstractmethod
+    def samples(self):
+        """
+        @return
+        the (name suffix, label string, value) of every sample of the metric
+        """
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{self.name}{suffix}{labels} {format_value(value)}" for suffix, labels, value in self.samples()]
+
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *label_values, amount=1):
+        values = self._shards.local()
+        values[label_values] = values.get(label_values, 0) + amount
+
+    @staticmethod
+    def merge(totals, shard):
+        for label_values, value in shard.items():
+            totals[label_values] = totals.get(label_values, 0) + value
+
+    def samples(self):
+        for label_values, value in sorted(self.totals().items()):
+            yield "_total", self.label_string(label_values), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    # Seconds, from a cached response to a slow bank
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, labels=(), buckets=default_buckets):
+        super().__init__(name, documentation, labels)
+
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        values = self._shards.local()
+
+        observations = values.get(label_values)
+        if observations is None:
+            # Count per bucket (the last one is +Inf), and sum
+            observations = values[label_values] = [[0] * (len(self.buckets) + 1), 0]
+
+        observations[0][bisect.bisect_left(self.buckets, value)] += 1
+        observations[1] += value
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        """
+        Observes the seconds spent in the with block
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    @staticmethod
+    def merge(totals, shard):
+        for label_values, (counts, total) in shard.items():
+            merged = totals.get(label_values)
+            if merged is None:
+                totals[label_values] = [list(counts), total]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+
+    def samples(self):
+        for label_values, (counts, total) in sorted(self.totals().items()):
+            cumulative = 0
+            for bucket, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                yield "_bucket", self.label_string(label_values, le=format_value(bucket)), cumulative
+
+            yield "_sum", self.label_string(label_values), total
+            yield "_count", self.label_string(label_values), cumulative
+
+
+class Registry:
+    """
+    Metrics of the process, and collectors of the stats kept by other components (caches, breakers...)
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def register_collector(self, name, documentation, function, labels=()):
+        """
+        Exposes values computed on each scrape as a gauge
+        @param function: returns the (label values, value) of each sample
+        """
+        with self._lock:
+            self._collectors.append((name, documentation, function, tuple(labels)))
+
+    def clear(self):
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self) -> str:
+        """
+        @return
+        every metric in the Prometheus text format
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        parts = [metric.render() for metric in metrics]
+
+        for name, documentation, function, labels in collectors:
+            lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{label_string(labels, label_values)} {format_value(value)}"
+                      for label_values, value in function()]
+
+            parts.append("\n".join(lines))
+
+        return "\n".join(parts) + "\n"
+
+
+def label_string(names, values, **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def allowed(address) -> bool:
+    """
+    @return
+    whether the client address can read the metrics
+    """
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+
+    return any(address in network for network in allowed_networks)
+
+
+metrics_settings = getattr(settings, "CONFIG").get('metrics', {})
+
+allowed_networks = [ipaddress.ip_network(network, strict=False)
+                    for network in metrics_settings.get('allowed_ips', ["127.0.0.1", "::1"])]
+
+registry = Registry()
+
+api_request_duration = registry.histogram(
+    "chatbot_api_request_duration_seconds", "Duration of the requests to the Prometeo API, retries included",
+    labels=("endpoint",))
+api_responses = registry.counter(
+    "chatbot_api_responses", "Responses of the Prometeo API, by status code ('unreachable' and 'rejected' "
+                             "for network failures and requests rejected by an open circuit breaker)",
+    labels=("endpoint", "status"))
+api_response_size = registry.histogram(
+    "chatbot_api_response_size_bytes", "Size of the responses of the Prometeo API",
+    labels=("endpoint",), buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+
+action_duration = registry.histogram(
+    "chatbot_action_duration_seconds", "Duration of the processing of a message, by selected action",
+    labels=("action",))
+
+date_processing_duration = registry.histogram(
+    "chatbot_date_processing_duration_seconds", "Duration of the DateProcessor operations",
+    labels=("operation",))
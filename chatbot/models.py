@@ -1,15 +1,33 @@
-from collections import defaultdict
+from collections import defaultdict, deque
+from datetime import timedelta
+from itertools import islice
+from typing import Optional, Tuple
 
 from django import forms
 from django.http import JsonResponse
 from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils import translation
 from django.utils.translation import gettext as _
+import inspect
 import re
+import time
+import zlib
 
 from .api import auth, meta, transactional
-from . import settings
+from .api.movement_store import MovementStore, words
+from .api.prefetch import prefetcher
+from .api.records import Items
+from .api.windows import WindowedMovements, AsyncWindowedMovements, date_format
+from . import metrics, settings
 from .forms import ProviderLoginForm
-from .utils import Dictionarizable, DateProcessor, BotException, ActionSelector, normalize_string
+from .providers import ProviderIndex, provider_indexes
+from .utils import Dictionarizable, DateProcessor, BotException, IntentRouter, normalize_string
+
+
+history_settings = getattr(settings, "CONFIG").get('message_history', {})
+stream_settings = getattr(settings, "CONFIG").get('movement_stream', {})
+summary_settings = getattr(settings, "CONFIG").get('movement_summary', {})
 
 
 class ApiKey:
@@ -19,6 +37,8 @@ class ApiKey:
 
 
 class Message(Dictionarizable):
+    __slots__ = ('sender', 'content')
+
     def __init__(self, sender, content):
         self.sender = sender
         self.content = content
@@ -43,15 +63,43 @@ class Message(Dictionarizable):
 
 
 class BotMessage(Message):
+    __slots__ = ()
+
     def __init__(self, content):
         super().__init__("bot", content)
 
 
 class UserMessage(Message):
+    __slots__ = ()
+
     def __init__(self, content):
         super().__init__("user", content)
 
 
+class MessageStream:
+    """
+    Bot message produced in parts, like the movements of a long range as they are fetched,
+    sent in chunks of at most chunk_rows lines as soon as they are ready (see views.streaming_response)
+    """
+    enabled = stream_settings.get('enabled', True)
+    chunk_rows = stream_settings.get('chunk_rows', 50)
+
+    def __init__(self, parts):
+        """
+        @param parts: iterator of lists of lines of the content
+        """
+        self.parts = parts
+
+    def chunks(self):
+        """
+        @return
+        iterator of the chunks of the content, their lines joined with new lines
+        """
+        for lines in self.parts:
+            for start in range(0, len(lines), self.chunk_rows):
+                yield "\n".join(lines[start:start + self.chunk_rows])
+
+
 class ModalForm(Dictionarizable):
 
     def __init__(self, file: str, form: forms.Form, request, logo=None, name=None):
@@ -72,22 +120,85 @@ class ModalForm(Dictionarizable):
 
 
 class MessageHistory:
+    """
+    The last max_messages messages of the chat, in a ring buffer of (sender, content) tuples.
+    Contents of at least compress_min_size characters (mostly movement tables) are kept compressed,
+    so the history stays small in the session, which is pickled whenever it changes.
+    """
+    __slots__ = ('message_history', 'total', 'changed')
+
+    max_messages = history_settings.get('max_messages', 200)
+    compress_min_size = history_settings.get('compress_min_size', 1024)
+    page_size = history_settings.get('page_size', 20)
 
     def __init__(self):
-        self.message_history = []
+        self.message_history = deque(maxlen=self.max_messages)
+        # Messages added since the chat started, including the ones dropped from the buffer
+        self.total = 0
+        # Whether messages were added since it was loaded from the session, so the session has to be saved
+        self.changed = False
 
     def __str__(self):
         return [msg for msg in self.messages()].__str__()
 
+    def __len__(self):
+        return len(self.message_history)
+
+    def __getstate__(self):
+        return self.total, list(self.message_history)
+
+    def __setstate__(self, state):
+        self.total, messages = state
+        self.message_history = deque(messages, maxlen=self.max_messages)
+        self.changed = False
+
     def add(self, message: Message):
-        self.message_history.append(message)
+        self.message_history.append(self.compact(message))
+        self.total += 1
+        self.changed = True
+
+    @classmethod
+    def compact(cls, message: Message) -> tuple:
+        content = message.content
+        if isinstance(content, str) and len(content) >= cls.compress_min_size:
+            content = zlib.compress(content.encode(), 1)
+
+        return message.sender, content
+
+    @staticmethod
+    def message(sender, content) -> dict:
+        if isinstance(content, bytes):
+            content = zlib.decompress(content).decode()
+
+        return {"sender": sender, "content": content}
 
     def messages(self):
-        for message in self.message_history:
-            yield {"sender": message.sender, "content": message.content}
+        for sender, content in self.message_history:
+            yield self.message(sender, content)
+
+    def page(self, before=None, size=None):
+        """
+        Messages are numbered from 0 (the first of the chat), numbers are kept when older messages are dropped
+        @param before: number of the message after the page, the end of the chat if None
+        @param size: messages of the page, page_size if None
+        @return
+        the messages of the page, in chat order, with their "sequence" number,
+        and the cursor of the previous page (the number of its first message), None if there are no more
+        """
+        first_kept = self.total - len(self.message_history)
+        end = self.total if before is None else max(first_kept, min(before, self.total))
+        start = max(first_kept, end - (self.page_size if size is None else size))
+
+        messages = [{"sequence": sequence, **self.message(*stored)}
+                    for sequence, stored in enumerate(islice(self.message_history, start - first_kept,
+                                                             end - first_kept), start)]
+
+        return messages, (start if start > first_kept else None)
 
 
 class MessageProcessor:
+    # Language -> intent router, and precondition of each intent
+    routers = {}
 
     def __init__(self, cache: dict, request):
         self.cache = cache
@@ -111,11 +222,12 @@ class MessageProcessor:
         self.require_logged_in()
 
         accounts = self.provider_session.get('accounts')
-        if not accounts:
-            accounts = transactional.Account(self.api_key, self.provider_session.get('key')
-                                             ).successful_json()['accounts']
+        if accounts is None:
+            accounts = self.prefetched('accounts')
+            if accounts is None:
+                accounts = self.provider_api(transactional.Account).successful_json()['accounts']
 
-            self.provider_session['accounts'] = accounts
+            accounts = self.provider_session['accounts'] = Items(accounts)
 
         return accounts
 
@@ -124,14 +236,44 @@ class MessageProcessor:
         self.require_logged_in()
 
         cards = self.provider_session.get('credit_cards')
-        if not cards:
-            cards = transactional.CreditCard(self.api_key, self.provider_session.get('key')
-                                             ).successful_json()['credit_cards']
+        if cards is None:
+            cards = self.prefetched('credit_cards')
+            if cards is None:
+                cards = self.provider_api(transactional.CreditCard).successful_json()['credit_cards']
 
-            self.provider_session['credit_cards'] = cards
+            cards = self.provider_session['credit_cards'] = Items(cards)
 
         return cards
 
+    def provider_api(self, api_class, **kwargs):
+        """
+        Creates a request to the API, for the provider session of the user
+        """
+        return api_class(self.api_key, self.provider_session.get('key'),
+                         provider=self.provider_session['provider']['name'], **kwargs)
+
+    def prefetch(self):
+        """
+        Starts fetching in background the accounts, cards and info of the user that just logged in,
+        if prefetching is enabled
+        """
+        accounts = self.provider_api(transactional.Account)
+        cards = self.provider_api(transactional.CreditCard)
+        info = self.provider_api(transactional.Info)
+
+        prefetcher.start(self.provider_session.get('key'), {
+            'accounts': lambda: accounts.successful_json()['accounts'],
+            'credit_cards': lambda: cards.successful_json()['credit_cards'],
+            'info': lambda: info.successful_json()['info'],
+        })
+
+    def prefetched(self, name):
+        """
+        @return
+        the prefetched result, None if it was not prefetched
+        """
+        return prefetcher.take(self.provider_session.get('key'), name)
+
     def is_user_logged_in(self):
         return self.provider_session and 'key' in self.provider_session
     
@@ -147,50 +289,155 @@ class MessageProcessor:
                                  ).format(provider=self.provider_session['provider']['bank']['name']))
         return True
 
+    def login_provider_code(self, normalized_message):
+        """
+        @return
+        the code of the provider whose name is exactly the message, None if there is no such provider
+        """
+        return self.provider_index().code(normalized_message)
+
+    def provider_index(self) -> ProviderIndex:
+        """
+        @return
+        the index of the provider catalog of the session, shared with the sessions with the same catalog
+        """
+        return provider_indexes.get(self.cache['providers_key'], self.cache['providers'])
+
+    def provider_suggestions(self, normalized_message) -> Optional[BotMessage]:
+        """
+        @return
+        a message with links to the providers whose names are similar to the message,
+        None if there are no such providers or the user is already logged in
+        """
+        if self.is_user_logged_in():
+            return None
+
+        names = self.provider_index().similar(normalized_message)
+        if not names:
+            return None
+
+        bank_links = [f'<a class="message-link">{name}</a>' for name in names]
+
+        return BotMessage(_("Did you mean any of these banks?") + "\n" + "\n".join(bank_links))
+
+    @staticmethod
+    def intents():
+        """
+        Message processing cascade, as (intent, regex, precondition) in priority order.
+        The action of an intent is the method action_<intent>, that must have a **kwargs parameter
+        that will be used to pass matching regex named groups, if any
+        """
+        return (
+            ("logout", _("_regex_logout"), "require_logged_in"),
+            ("client", _("_regex_customer"), "require_logged_in"),
+            ("provider", _("_regex_bank"), "require_not_logged_in"),
+            ("account_movement_search", _("_regex_account") + " +(?P<account_number>.*?) +" + _("_regex_movement")
+             + " +" + _("_regex_containing") + " +(?P<terms>.+?)(?: +" + _("_regex_during") + " +(?P<dates>.+))?$",
+             "require_logged_in"),
+            ("credit_card_movement_search", _("_regex_card") + " *(?P<card_number>.*?) *" + _("_regex_movement")
+             + "(?: +(?:" + _("_regex_currency") + " +)?(?P<currency>[A-Za-z]{3}))? +" + _("_regex_containing")
+             + " +(?P<terms>.+?)(?: +" + _("_regex_during") + " +(?P<dates>.+))?$", "require_logged_in"),
+            ("movement_search", _("_regex_movement") + " +" + _("_regex_containing")
+             + " +(?P<terms>.+?)(?: +" + _("_regex_during") + " +(?P<dates>.+))?$", "require_logged_in"),
+            ("account_movement", _("_regex_account") + " +(?P<account_number>.*?) +" + _("_regex_movement")
+             + " *(?P<dates>.*)", "require_logged_in"),
+            ("account_summary", _("_regex_account") + " +(?P<account_number>.*?) +" + _("_regex_summary")
+             + " *(?P<dates>.*)", "require_logged_in"),
+            ("account", _("_regex_account"), "require_logged_in"),
+            ("credit_card_movement", _("_regex_card") + " *(?P<card_number>.*?) *" + _("_regex_movement")
+             + " *(" + _("_regex_currency") + ")? *(?P<currency>[A-Za-z]{3}?)" + " *(?P<dates>.*)",
+             "require_logged_in"),
+            ("credit_card_summary", _("_regex_card") + " *(?P<card_number>.*?) *" + _("_regex_summary")
+             + " *(" + _("_regex_currency") + ")? *(?P<currency>[A-Za-z]{3}?)" + " *(?P<dates>.*)",
+             "require_logged_in"),
+            ("card", _("_regex_card"), "require_logged_in"),
+            ("info", _("_regex_info"), "require_logged_in"),
+            ("greeting", _("_regex_greeting"), None),
+        )
+
+    @classmethod
+    def router(cls) -> Tuple[IntentRouter, dict]:
+        """
+        @return
+        the router of the intents in the active language, built the first time it's used,
+        and the precondition of each intent
+        """
+        language = translation.get_language()
+
+        router = cls.routers.get(language)
+        if router is None:
+            intents = cls.intents()
+            router = cls.routers[language] = (IntentRouter([(intent, regex) for intent, regex, _ in intents]),
+                                              {intent: precondition for intent, _, precondition in intents})
+
+        return router
+
+    def selected_actions(self, normalized_message):
+        """
+        @return
+        iterator of the (intent, action result) of the intents matching the message, in cascade order.
+        The precondition of an intent is checked before calling its action, and may raise BotException
+        """
+        router, preconditions = self.router()
+
+        for intent, groups in router.matches(normalized_message):
+            precondition = preconditions[intent]
+            if precondition and not getattr(self, precondition)():
+                continue
+
+            yield intent, getattr(self, f"action_{intent}")(**groups)
+
     def process_message(self, message) -> Dictionarizable:
         """
         Parses the message looking for fixed strings or patterns, and calls the corresponding action
         @return
         the result of that action (it could be a message, a modal, ...)
         """
+        started = time.perf_counter()
         normalized_message = normalize_string(message)
 
         # Check for exact provider names for login. Allow login only if user is not already logged in
-        for provider in self.cache['providers']:
-            if normalized_message == normalize_string(provider['name']):
-                self.require_not_logged_in()
-                return self.action_login(provider['code'])
-
-        # Message processing cascade. All action methods must have a **kwargs parameter
-        # that will be used to pass matching regex named groups, if any
-        actions = (
-            ActionSelector(_("_regex_logout"), self.action_logout, self.require_logged_in),
-            ActionSelector(_("_regex_customer"), self.action_client, self.require_logged_in),
-            ActionSelector(_("_regex_bank"), self.action_provider, self.require_not_logged_in),
-            ActionSelector(_("_regex_account") + " +(?P<account_number>.*?) +" + _("_regex_movement")
-                           + " *(?P<dates>.*)",
-                           self.action_account_movement, self.require_logged_in),
-            ActionSelector(_("_regex_account"), self.action_account, self.require_logged_in),
-            ActionSelector(_("_regex_card") + " *(?P<card_number>.*?) *" + _("_regex_movement")
-                           + " *(" + _("_regex_currency") + ")? *(?P<currency>[A-Za-z]{3}?)" + " *(?P<dates>.*)",
-                           self.action_credit_card_movement, self.require_logged_in),
-            ActionSelector(_("_regex_card"), self.action_card, self.require_logged_in),
-            ActionSelector(_("_regex_info"), self.action_info, self.require_logged_in),
-            ActionSelector(_("_regex_greeting"), lambda **kwargs: BotMessage(_("Hello! Nice to meet you :)")))
-        )
-
-        for action in actions:
-            action_result = action.act_on(normalized_message)
+        provider_code = self.login_provider_code(normalized_message)
+        if provider_code:
+            self.require_not_logged_in()
+            login_form = self.action_login(provider_code)
+            self.observe_action("login", started)
+            return login_form
+
+        for intent, action_result in self.selected_actions(normalized_message):
             if action_result:
+                self.observe_action(intent, started)
                 return action_result
 
+        suggestions = self.provider_suggestions(normalized_message)
+        if suggestions:
+            self.observe_action("provider_suggestions", started)
+            return suggestions
+
+        self.observe_action("not_understood", started)
+        return self.not_understood_message()
+
+    @staticmethod
+    def observe_action(action_name, started):
+        """
+        Observes the duration of the processing of the message, from its start until the action returned
+        """
+        metrics.action_duration.observe(time.perf_counter() - started, action_name)
+
+    def not_understood_message(self) -> BotMessage:
         return BotMessage(_("Sorry, could you give me more details about what you want to do?"))
 
+    def action_greeting(self, **kwargs) -> BotMessage:
+        return BotMessage(_("Hello! Nice to meet you :)"))
+
     def action_provider(self, **kwargs) -> BotMessage:
         provider_response = meta.Provider(self.api_key).successful_json()
 
+        return self.providers_message(provider_response['providers'])
+
+    def providers_message(self, providers) -> BotMessage:
         banks_per_country = defaultdict(list)
-        for bank in provider_response['providers']:
+        for bank in providers:
             banks_per_country[bank['country']].append(bank['name'])
 
         bank_string = _("The available banks per country are:") + "\n"
@@ -204,7 +451,12 @@ class MessageProcessor:
     def action_login(self, provider_code) -> ModalForm:
         provider_response = meta.ProviderDetail(self.api_key, provider_code=provider_code).successful_json()
 
-        provider = provider_response['provider']
+        return self.login_form(provider_response['provider'])
+
+    def login_form(self, provider) -> ModalForm:
+        """
+        Starts a new provider session, and creates the login form with the fields required by the provider
+        """
         self.provider_session = {'provider': provider}
         logo = provider['logo']
 
@@ -225,17 +477,23 @@ class MessageProcessor:
                          name=provider['bank']['name'])
 
     def action_logout(self, **kwargs) -> BotMessage:
-        auth.Logout(self.api_key, self.provider_session.get('key')).successful_json()
+        prefetcher.cancel(self.provider_session.get('key'))
+        self.provider_api(auth.Logout).successful_json()
+
+        return self.logout_message()
 
+    def logout_message(self) -> BotMessage:
         name = self.provider_session['provider']['bank']['name']
         del self.provider_session
 
         return BotMessage(_("Thank you for operating with ") + f"{name}")
 
     def action_client(self, **kwargs) -> BotMessage:
-        client_response = auth.Client(self.api_key, self.provider_session.get('key')).successful_json()
+        client_response = self.provider_api(auth.Client).successful_json()
 
-        clients = client_response['clients']
+        return self.clients_message(client_response['clients'])
+
+    def clients_message(self, clients) -> BotMessage:
         self.provider_session['clients'] = clients
 
         if len(clients) == 0:
@@ -246,10 +504,18 @@ class MessageProcessor:
         return BotMessage(client_names)
 
     def action_info(self, **kwargs):
-        info_response = transactional.Info(self.api_key, self.provider_session.get('key')).successful_json()
+        info = self.provider_session.get('info')
+        if info is None:
+            info = self.prefetched('info')
+            if info is None:
+                info = self.provider_api(transactional.Info).successful_json()['info']
+
+            self.provider_session['info'] = info
 
-        info = info_response['info']
+        return self.info_message(info)
 
+    @staticmethod
+    def info_message(info) -> BotMessage:
         message = (_('Your info') + ":\n"
                    + _('ID') + f": {info['document']}\n"
                    + _('Name') + f": {info['name']}\n"
@@ -257,109 +523,603 @@ class MessageProcessor:
 
         return BotMessage(message)
 
-    def action_account(self, **kwargs):
-        # This is for translation purposes, so django can generate the .po with this strings
-        translation_names = (_('balance') + _('branch') + _('currency')
-                             + _('id') + _('name') + _('number'))
-
+    @staticmethod
+    def items_message(items) -> BotMessage:
+        """
+        Message listing accounts or cards, with all their fields
+        """
         message_parts = []
-        for account in self.session_accounts:
+        for item in items:
             rows = [f'<div name="{key}" class="item row">'
                     '<div class="key">' + _(key) + ':</div>'
                                                    f'<div class="value">{value}</div>'
-                                                   f'</div>' for key, value in account.items() if key != 'id']
+                                                   f'</div>' for key, value in item.items() if key != 'id']
 
-            message_parts += [f'<div class="item link" name=\"{account["id"]}\">' + "\n".join(rows) + '</div>']
+            message_parts += [f'<div class="item link" name=\"{item["id"]}\">' + "\n".join(rows) + '</div>']
 
         return BotMessage("\n".join(message_parts))
 
-    def action_account_movement(self, account_number=None, dates=None, **kwargs):
+    @classmethod
+    def movements_message(cls, movements, failures=()) -> BotMessage:
+        """
+        Message with the movements, and the date ranges that could not be fetched
+        @param movements: iterable of movements, consumed once
+        @param failures: WindowFailure of each window that could not be fetched
+        """
+        notes = cls.failure_notes(failures)
+
+        return BotMessage("\n".join(map(cls.movement_html, movements)) + "".join("\n" + note for note in notes))
+
+    @classmethod
+    def movements_stream(cls, parts, failures: list) -> MessageStream:
+        """
+        Same as movements_message, sending the movements part by part
+        @param parts: iterator of lists of movements, adding to failures the windows that could not be fetched
+        """
+        def lines():
+            for movements in parts:
+                yield [cls.movement_html(movement) for movement in movements]
+
+            yield cls.failure_notes(failures)
+
+        return MessageStream(lines())
+
+    @staticmethod
+    def failure_notes(failures) -> list:
+        return [_("Sorry, I could not get the movements from %(start)s to %(end)s: %(error)s")
+                % {'start': failure.date_start, 'end': failure.date_end, 'error': failure.error.message}
+                for failure in failures]
+
+    def windowed_movements(self, windowed_class, api_class, date_start, date_end, **kwargs) -> WindowedMovements:
+        """
+        Plans the requests of the movements of the date range, one per window
+        """
+        return windowed_class(lambda start, end: self.provider_api(api_class, date_start=start, date_end=end, **kwargs),
+                              date_start, date_end)
+
+    def movement_store(self, api_class, **kwargs) -> MovementStore:
+        """
+        @return
+        the store of the movements already fetched in the provider session,
+        for the endpoint and its parameters (account or card number and currency)
+        """
+        stores = self.provider_session.setdefault('movements', {})
+        key = (api_class.__name__.removeprefix("Async"), *sorted(kwargs.items()))
+
+        return stores.setdefault(key, MovementStore())
+
+    def filled_movement_store(self, api_class, date_start, date_end, **kwargs):
+        """
+        Fetches only the parts of the date range that are not in the movement store yet
+        @return
+        the movement store, and the failures of the windows that could not be fetched
+        """
+        store = self.movement_store(api_class, **kwargs)
+        failures = []
+
+        for gap_start, gap_end in store.gaps(date_start, date_end):
+            windowed = self.windowed_movements(WindowedMovements, api_class, gap_start, gap_end, **kwargs)
+            movements = list(windowed.movements())
+
+            store.add_windows(windowed.fetched_windows, movements)
+            failures += windowed.failures
+
+        return store, failures
+
+    def stored_movements(self, api_class, date_start, date_end, **kwargs):
+        """
+        @return
+        iterator of the movements of the date range, and the failures of the windows that could not be fetched
+        """
+        store, failures = self.filled_movement_store(api_class, date_start, date_end, **kwargs)
+
+        return store.movements(date_start, date_end), failures
+
+    def stored_movement_parts(self, api_class, date_start, date_end, failures: list, **kwargs):
+        """
+        Same as stored_movements, producing the movements of the date range in parts, in date order:
+        the parts already in the movement store right away, and the missing ones window by window, as they are fetched
+        @param failures: the failures of the windows that could not be fetched are added to it
+        @return
+        iterator of lists of movements
+        """
+        store = self.movement_store(api_class, **kwargs)
+        cursor = date_start
+
+        for gap_start, gap_end in store.gaps(date_start, date_end):
+            if gap_start.toordinal() > cursor.toordinal():
+                yield list(store.movements(cursor, gap_start - timedelta(days=1)))
+
+            windowed = self.windowed_movements(WindowedMovements, api_class, gap_start, gap_end, **kwargs)
+            for window, movements in windowed.window_movements():
+                store.add_windows([window], movements)
+                yield list(store.movements(*window))
+
+            failures += windowed.failures
+            cursor = gap_end + timedelta(days=1)
+
+        if cursor.toordinal() <= date_end.toordinal():
+            yield list(store.movements(cursor, date_end))
+
+    def movements_response(self, api_class, date_start, date_end, **kwargs):
+        """
+        @return
+        the message with the movements of the date range, streamed if MessageStream is enabled
+        """
+        if MessageStream.enabled:
+            failures = []
+            return self.movements_stream(self.stored_movement_parts(api_class, date_start, date_end, failures,
+                                                                    **kwargs), failures)
+
+        return self.movements_message(*self.stored_movements(api_class, date_start, date_end, **kwargs))
+
+    @classmethod
+    def summary_message(cls, store, date_start, date_end, failures=()) -> BotMessage:
+        """
+        Message with the totals per month, the net flow and the largest movements of the date range
+        """
+        columns = store.columns(date_start, date_end)
+        dates = {'start': date_start.strftime(date_format), 'end': date_end.strftime(date_format)}
+        notes = cls.failure_notes(failures)
+
+        if not len(columns):
+            return BotMessage("\n".join([_("There are no movements from %(start)s to %(end)s") % dates, *notes]))
+
+        months = [cls.summary_html(f"{month:02d}/{year}", [(_("Month"), f"{month:02d}/{year}"),
+                                                           (_("Debit"), f"{debit:.2f}"),
+                                                           (_("Credit"), f"{credit:.2f}"),
+                                                           (_("Net flow"), f"{credit - debit:.2f}")])
+                  for year, month, debit, credit in columns.monthly()]
+
+        total_debit, total_credit = columns.total_debit, columns.total_credit
+        total = cls.summary_html("total", [(_("Debit"), f"{total_debit:.2f}"),
+                                           (_("Credit"), f"{total_credit:.2f}"),
+                                           (_("Net flow"), f"{total_credit - total_debit:.2f}")])
+
+        largest = columns.largest(summary_settings.get('largest', 5))
+
+        return BotMessage("\n".join([_("Summary from %(start)s to %(end)s, %(count)s movements")
+                                     % {**dates, 'count': len(columns)},
+                                     total, *months,
+                                     _("Largest movements") + ":", *map(cls.movement_html, largest),
+                                     *notes]))
+
+    @classmethod
+    def search_message(cls, results, terms, failures=()) -> BotMessage:
+        """
+        Message with the movements found, grouped by account or card
+        @param results: (movement store key, movements found in its store) of each store searched
+        """
+        # The terms are written by the user, and the message is shown as HTML
+        terms = escape(terms)
+        notes = cls.failure_notes(failures)
+        parts = []
+
+        for key, movements in results:
+            movements = list(movements)
+            if movements:
+                parts += [cls.search_header(key, len(movements), terms), *map(cls.movement_html, movements)]
+
+        if not parts:
+            parts = [_("Sorry, I could not find movements containing \"%(terms)s\"") % {'terms': terms}]
+
+        return BotMessage("\n".join(parts + notes))
+
+    @staticmethod
+    def search_header(key, count, terms) -> str:
+        """
+        @param key: key of the movement store of the movements, see movement_store
+        """
+        endpoint, parameters = key[0], dict(key[1:])
+        values = {'count': count, 'terms': terms, 'currency': parameters.get('currency', "")}
+
+        if endpoint == transactional.CreditCardMovement.__name__:
+            return (_("Movements of card %(number)s (%(currency)s) containing \"%(terms)s\": %(count)s")
+                    % {**values, 'number': parameters.get('card_number')})
+
+        return (_("Movements of account %(number)s containing \"%(terms)s\": %(count)s")
+                % {**values, 'number': parameters.get('account_number')})
+
+    def movement_search_range(self, dates):
+        """
+        @return
+        the date range of a search, None to search every movement stored
+        """
+        if not dates:
+            return None, None
+
+        return DateProcessor(language=self.request.LANGUAGE_CODE).get_valid_date_range(dates)
+
+    @staticmethod
+    def summary_html(name, fields) -> str:
+        rows = [f'<div class="item row"><div class="key">{key}:</div><div class="value">{value}</div></div>'
+                for key, value in fields]
+
+        return f'<div class="item" name="{name}">' + "\n".join(rows) + '</div>'
+
+    @staticmethod
+    def movement_html(movement) -> str:
+        rows = [f'<div name="{key}" class="item row">'
+                '<div class="key">' + _(key) + ':</div>'
+                                               f'<div class="value">{value}</div>'
+                                               f'</div>' for key, value in movement.items() if
+                key in ('reference', 'date', 'detail', 'debit', 'credit')]
+
+        return f'<div class="item link" name=\"{movement["id"]}\">' + "\n".join(rows) + '</div>'
+
+    def find_account(self, accounts, account_number):
+        account = accounts.by_number(account_number)
+        if not account:
+            raise BotException(_("Sorry, could not find that account..."
+                                 "Please check that the account number is correct..."))
+
+        return account
+
+    def find_credit_card(self, credit_cards, card_number):
+        credit_card = credit_cards.by_number(card_number)
+        if not credit_card:
+            raise BotException(_("Sorry, could not find that credit card..."
+                                 "Please check that the card number is correct..."))
+
+        return credit_card
+
+    def account_movement_range(self, account_number, dates):
+        """
+        Validates the parameters of an account movement request
+        @return
+        the requested date range
+        """
         if not account_number:
-            return BotMessage(_('Please provide an account number...\n'
-                                'Usage: "account <account number> movements"'))
+            raise BotException(_('Please provide an account number...\n'
+                                 'Usage: "account <account number> movements"'))
 
-        date_start, date_end = DateProcessor(language=self.request.LANGUAGE_CODE).get_valid_date_range(dates)
+        return DateProcessor(language=self.request.LANGUAGE_CODE).get_valid_date_range(dates)
 
-        movements = None
-        for account in self.session_accounts:
-            if account_number == account['number']:
-                movements = transactional.AccountMovement(self.api_key,
-                                                          self.provider_session.get('key'),
-                                                          account_number=account_number,
-                                                          currency=account['currency'],
-                                                          date_start=date_start,
-                                                          date_end=date_end
-                                                          ).successful_json()
+    def credit_card_movement_range(self, card_number, currency, dates):
+        """
+        Validates the parameters of a credit card movement request
+        @return
+        the requested date range
+        """
+        if not card_number:
+            raise BotException(_('Please provide a credit card number...\n'
+                                 'Usage: "card <card number> movements"'))
 
-        if not movements:
-            return BotMessage(_("Sorry, could not find that account..."
-                                "Please check that the account number is correct..."))
+        if not currency or not re.match("[A-Z]{3}", currency.upper()):
+            raise BotException(_('Please provide a currency symbol for the transactions\n'
+                                 'e.g. USD for United States Dollars, UYU for Uruguayan peso'))
 
-        message_parts = []
-        for movement in movements['movements']:
-            rows = [f'<div name="{key}" class="item row">'
-                    '<div class="key">' + _(key) + ':</div>'
-                                                   f'<div class="value">{value}</div>'
-                                                   f'</div>' for key, value in movement.items() if
-                    key in ('reference', 'date', 'detail', 'debit', 'credit')]
+        return DateProcessor(language=self.request.LANGUAGE_CODE).get_valid_date_range(dates)
 
-            message_parts += [f'<div class="item link" name=\"{movement["id"]}\">' + "\n".join(rows) + '</div>']
+    def action_account(self, **kwargs):
+        # This is for translation purposes, so django can generate the .po with this strings
+        translation_names = (_('balance') + _('branch') + _('currency')
+                             + _('id') + _('name') + _('number'))
 
-        return BotMessage("\n".join(message_parts))
+        return self.items_message(self.session_accounts)
+
+    def action_account_movement(self, account_number=None, dates=None, **kwargs):
+        date_start, date_end = self.account_movement_range(account_number, dates)
+        account = self.find_account(self.session_accounts, account_number)
+
+        return self.movements_response(transactional.AccountMovement,
+                                       date_start, date_end,
+                                       account_number=account_number,
+                                       currency=account['currency'])
+
+    def action_account_summary(self, account_number=None, dates=None, **kwargs):
+        date_start, date_end = self.account_movement_range(account_number, dates)
+        account = self.find_account(self.session_accounts, account_number)
+
+        store, failures = self.filled_movement_store(transactional.AccountMovement,
+                                                     date_start, date_end,
+                                                     account_number=account_number,
+                                                     currency=account['currency'])
+
+        return self.summary_message(store, date_start, date_end, failures)
+
+    def action_account_movement_search(self, account_number=None, terms=None, dates=None, **kwargs):
+        date_start, date_end = self.movement_search_range(dates)
+        account = self.find_account(self.session_accounts, account_number)
+        parameters = {'account_number': account_number, 'currency': account['currency']}
+
+        key = (transactional.AccountMovement.__name__, *sorted(parameters.items()))
+        if date_start is None:
+            return self.stored_movement_search(self.fetched_stores(key), terms, date_start, date_end)
+
+        store, failures = self.filled_movement_store(transactional.AccountMovement,
+                                                     date_start, date_end, **parameters)
+
+        return self.search_message([(key, store.search(words(terms), date_start, date_end))], terms, failures)
+
+    def action_movement_search(self, terms=None, dates=None, **kwargs):
+        """
+        Searches the movements of every account and card already fetched in the session, without fetching more
+        """
+        date_start, date_end = self.movement_search_range(dates)
+
+        return self.stored_movement_search(self.provider_session.get('movements', {}).items(),
+                                           terms, date_start, date_end)
+
+    def stored_movement_search(self, stores, terms, date_start, date_end) -> BotMessage:
+        """
+        Searches the movements already fetched in the given stores, without fetching more
+        @param stores: (key, movement store) of each store to search
+        """
+        stores = list(stores)
+        if not stores:
+            raise BotException(_("There are no movements to search yet, "
+                                 "please ask for the movements of an account or card first"))
+
+        return self.search_message([(key, store.search(words(terms), date_start, date_end))
+                                    for key, store in stores], terms)
+
+    def fetched_stores(self, key):
+        """
+        @return
+        the (key, movement store) of the movements already fetched for the key, empty if there are none yet
+        """
+        store = self.provider_session.get('movements', {}).get(key)
+
+        return [] if store is None else [(key, store)]
+
+    def credit_card_stores(self, card_number):
+        """
+        @return
+        the (key, movement store) of the movements of the card already fetched, in every currency
+        """
+        return [(key, store) for key, store in self.provider_session.get('movements', {}).items()
+                if key[0] == transactional.CreditCardMovement.__name__ and ('card_number', card_number) in key]
+
+    def action_credit_card_movement_search(self, card_number=None, currency=None, terms=None, dates=None,
+                                           **kwargs):
+        """
+        Searches the movements of the card in the currency, fetching the date range if given,
+        or the ones of the card already fetched in every currency if there's no currency
+        """
+        date_start, date_end = self.movement_search_range(dates)
+        self.find_credit_card(self.session_credit_cards, card_number)
+
+        if not currency:
+            return self.stored_movement_search(self.credit_card_stores(card_number), terms, date_start, date_end)
+
+        parameters = {'card_number': card_number, 'currency': currency.upper()}
+
+        key = (transactional.CreditCardMovement.__name__, *sorted(parameters.items()))
+        if date_start is None:
+            return self.stored_movement_search(self.fetched_stores(key), terms, date_start, date_end)
+
+        store, failures = self.filled_movement_store(transactional.CreditCardMovement,
+                                                     date_start, date_end, **parameters)
+
+        return self.search_message([(key, store.search(words(terms), date_start, date_end))], terms, failures)
 
     def action_card(self, **kwargs):
         # This is for translation purposes, so django can generate the .po with this strings
         translation_names = (_('balance_dollar') + _('balance_local') + _('close_date')
                              + _('due_date') + _('id') + _('name') + _('number'))
 
-        message_parts = []
-        for card in self.session_credit_cards:
-            rows = [f'<div name="{key}" class="item row">'
-                    '<div class="key">' + _(key) + ':</div>'
-                                                   f'<div class="value">{value}</div>'
-                                                   f'</div>' for key, value in card.items() if key != 'id']
+        return self.items_message(self.session_credit_cards)
 
-            message_parts += [f'<div class="item link" name=\"{card["id"]}\">' + "\n".join(rows) + '</div>']
+    def action_credit_card_movement(self, card_number=None, dates=None, currency: str = None, **kwargs):
+        date_start, date_end = self.credit_card_movement_range(card_number, currency, dates)
+        self.find_credit_card(self.session_credit_cards, card_number)
 
-        return BotMessage("\n".join(message_parts))
+        return self.movements_response(transactional.CreditCardMovement,
+                                       date_start, date_end,
+                                       card_number=card_number,
+                                       currency=currency.upper())
 
-    def action_credit_card_movement(self, card_number=None, dates=None, currency: str = None, **kwargs):
-        if not card_number:
-            return BotMessage(_('Please provide a credit card number...\n'
-                                'Usage: "card <card number> movements"'))
+    def action_credit_card_summary(self, card_number=None, dates=None, currency: str = None, **kwargs):
+        date_start, date_end = self.credit_card_movement_range(card_number, currency, dates)
+        self.find_credit_card(self.session_credit_cards, card_number)
 
-        if not currency or not re.match("[A-Z]{3}", currency.upper()):
-            return BotMessage(_('Please provide a currency symbol for the transactions\n'
-                                'e.g. USD for United States Dollars, UYU for Uruguayan peso'))
-
-        date_start, date_end = DateProcessor(language=self.request.LANGUAGE_CODE).get_valid_date_range(dates)
-
-        movements = None
-        for credit_card in self.session_credit_cards:
-            if card_number == credit_card['number']:
-                movements = transactional.CreditCardMovement(self.api_key,
-                                                             self.provider_session.get('key'),
-                                                             card_number=card_number,
-                                                             currency=currency.upper(),
-                                                             date_start=date_start,
-                                                             date_end=date_end
-                                                             ).successful_json()
-
-        if not movements:
-            return BotMessage(_("Sorry, could not find that credit card..."
-                                "Please check that the card number is correct..."))
+        store, failures = self.filled_movement_store(transactional.CreditCardMovement,
+                                                     date_start, date_end,
+                                                     card_number=card_number,
+                                                     currency=currency.upper())
 
-        message_parts = []
-        for movement in movements['movements']:
-            rows = [f'<div name="{key}" class="item row">'
-                    '<div class="key">' + _(key) + ':</div>'
-                                                   f'<div class="value">{value}</div>'
-                                                   f'</div>' for key, value in movement.items() if
-                    key in ('reference', 'date', 'detail', 'debit', 'credit')]
+        return self.summary_message(store, date_start, date_end, failures)
 
-            message_parts += [f'<div class="item link" name=\"{movement["id"]}\">' + "\n".join(rows) + '</div>']
 
-        return BotMessage("\n".join(message_parts))
+class AsyncMessageProcessor(MessageProcessor):
+    """
+    asyncio twin of MessageProcessor: the actions calling the Prometeo API are coroutines,
+    so the worker can keep serving other messages while the bank responds
+    """
+
+    async def aprefetched(self, name):
+        return await prefetcher.atake(self.provider_session.get('key'), name)
+
+    async def get_session_accounts(self):
+        self.require_logged_in()
+
+        accounts = self.provider_session.get('accounts')
+        if accounts is None:
+            accounts = await self.aprefetched('accounts')
+            if accounts is None:
+                accounts = (await self.provider_api(transactional.AsyncAccount).successful_json())['accounts']
+
+            accounts = self.provider_session['accounts'] = Items(accounts)
+
+        return accounts
+
+    async def get_session_credit_cards(self):
+        self.require_logged_in()
+
+        cards = self.provider_session.get('credit_cards')
+        if cards is None:
+            cards = await self.aprefetched('credit_cards')
+            if cards is None:
+                cards = (await self.provider_api(transactional.AsyncCreditCard).successful_json())['credit_cards']
+
+            cards = self.provider_session['credit_cards'] = Items(cards)
+
+        return cards
+
+    async def process_message(self, message) -> Dictionarizable:
+        """
+        Same as MessageProcessor.process_message, awaiting the actions that are coroutines
+        """
+        started = time.perf_counter()
+        normalized_message = normalize_string(message)
+
+        provider_code = self.login_provider_code(normalized_message)
+        if provider_code:
+            self.require_not_logged_in()
+            login_form = await self.action_login(provider_code)
+            self.observe_action("login", started)
+            return login_form
+
+        for intent, action_result in self.selected_actions(normalized_message):
+            if inspect.isawaitable(action_result):
+                action_result = await action_result
+
+            if action_result:
+                self.observe_action(intent, started)
+                return action_result
+
+        suggestions = self.provider_suggestions(normalized_message)
+        if suggestions:
+            self.observe_action("provider_suggestions", started)
+            return suggestions
+
+        self.observe_action("not_understood", started)
+        return self.not_understood_message()
+
+    async def action_provider(self, **kwargs) -> BotMessage:
+        provider_response = await meta.AsyncProvider(self.api_key).successful_json()
+
+        return self.providers_message(provider_response['providers'])
+
+    async def action_login(self, provider_code) -> ModalForm:
+        provider_response = await meta.AsyncProviderDetail(self.api_key, provider_code=provider_code
+                                                           ).successful_json()
+
+        return self.login_form(provider_response['provider'])
+
+    async def action_logout(self, **kwargs) -> BotMessage:
+        prefetcher.cancel(self.provider_session.get('key'))
+        await self.provider_api(auth.AsyncLogout).successful_json()
+
+        return self.logout_message()
+
+    async def action_client(self, **kwargs) -> BotMessage:
+        client_response = await self.provider_api(auth.AsyncClient).successful_json()
+
+        return self.clients_message(client_response['clients'])
+
+    async def action_info(self, **kwargs):
+        info = self.provider_session.get('info')
+        if info is None:
+            info = await self.aprefetched('info')
+            if info is None:
+                info = (await self.provider_api(transactional.AsyncInfo).successful_json())['info']
+
+            self.provider_session['info'] = info
+
+        return self.info_message(info)
+
+    async def action_account(self, **kwargs):
+        return self.items_message(await self.get_session_accounts())
+
+    async def filled_movement_store(self, api_class, date_start, date_end, **kwargs):
+        store = self.movement_store(api_class, **kwargs)
+        failures = []
+
+        for gap_start, gap_end in store.gaps(date_start, date_end):
+            windowed = self.windowed_movements(AsyncWindowedMovements, api_class, gap_start, gap_end, **kwargs)
+            movements = [movement async for movement in windowed.movements()]
+
+            store.add_windows(windowed.fetched_windows, movements)
+            failures += windowed.failures
+
+        return store, failures
+
+    async def stored_movements(self, api_class, date_start, date_end, **kwargs):
+        store, failures = await self.filled_movement_store(api_class, date_start, date_end, **kwargs)
+
+        return store.movements(date_start, date_end), failures
+
+    async def action_account_movement(self, account_number=None, dates=None, **kwargs):
+        date_start, date_end = self.account_movement_range(account_number, dates)
+        account = self.find_account(await self.get_session_accounts(), account_number)
+
+        movements, failures = await self.stored_movements(transactional.AsyncAccountMovement,
+                                                          date_start, date_end,
+                                                          account_number=account_number,
+                                                          currency=account['currency'])
+
+        return self.movements_message(movements, failures)
+
+    async def action_account_summary(self, account_number=None, dates=None, **kwargs):
+        date_start, date_end = self.account_movement_range(account_number, dates)
+        account = self.find_account(await self.get_session_accounts(), account_number)
+
+        store, failures = await self.filled_movement_store(transactional.AsyncAccountMovement,
+                                                           date_start, date_end,
+                                                           account_number=account_number,
+                                                           currency=account['currency'])
+
+        return self.summary_message(store, date_start, date_end, failures)
+
+    async def action_account_movement_search(self, account_number=None, terms=None, dates=None, **kwargs):
+        date_start, date_end = self.movement_search_range(dates)
+        account = self.find_account(await self.get_session_accounts(), account_number)
+        parameters = {'account_number': account_number, 'currency': account['currency']}
+
+        key = (transactional.AccountMovement.__name__, *sorted(parameters.items()))
+        if date_start is None:
+            return self.stored_movement_search(self.fetched_stores(key), terms, date_start, date_end)
+
+        store, failures = await self.filled_movement_store(transactional.AsyncAccountMovement,
+                                                           date_start, date_end, **parameters)
+
+        return self.search_message([(key, store.search(words(terms), date_start, date_end))], terms, failures)
+
+    async def action_card(self, **kwargs):
+        return self.items_message(await self.get_session_credit_cards())
+
+    async def action_credit_card_movement_search(self, card_number=None, currency=None, terms=None, dates=None,
+                                                 **kwargs):
+        date_start, date_end = self.movement_search_range(dates)
+        self.find_credit_card(await self.get_session_credit_cards(), card_number)
+
+        if not currency:
+            return self.stored_movement_search(self.credit_card_stores(card_number), terms, date_start, date_end)
+
+        parameters = {'card_number': card_number, 'currency': currency.upper()}
+
+        key = (transactional.CreditCardMovement.__name__, *sorted(parameters.items()))
+        if date_start is None:
+            return self.stored_movement_search(self.fetched_stores(key), terms, date_start, date_end)
+
+        store, failures = await self.filled_movement_store(transactional.AsyncCreditCardMovement,
+                                                           date_start, date_end, **parameters)
+
+        return self.search_message([(key, store.search(words(terms), date_start, date_end))], terms, failures)
+
+    async def action_credit_card_movement(self, card_number=None, dates=None, currency: str = None, **kwargs):
+        date_start, date_end = self.credit_card_movement_range(card_number, currency, dates)
+        self.find_credit_card(await self.get_session_credit_cards(), card_number)
+
+        movements, failures = await self.stored_movements(transactional.AsyncCreditCardMovement,
+                                                          date_start, date_end,
+                                                          card_number=card_number,
+                                                          currency=currency.upper())
+
+        return self.movements_message(movements, failures)
+
+    async def action_credit_card_summary(self, card_number=None, dates=None, currency: str = None, **kwargs):
+        date_start, date_end = self.credit_card_movement_range(card_number, currency, dates)
+        self.find_credit_card(await self.get_session_credit_cards(), card_number)
+
+        store, failures = await self.filled_movement_store(transactional.AsyncCreditCardMovement,
+                                                           date_start, date_end,
+                                                           card_number=card_number,
+                                                           currency=currency.upper())
+
+        return self.summary_message(store, date_start, date_end, failures)
 
 
 class ErrorResponse(JsonResponse):
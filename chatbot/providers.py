@@ -0,0 +1,152 @@
+import hashlib
+import heapq
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Optional
+
+from . import settings
+from .utils import normalize_string
+
+
+lookup_settings = getattr(settings, "CONFIG").get('provider_lookup', {})
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(normalized: str) -> set:
+    """
+    @return
+    the trigrams of each word of the normalized string, padded with two spaces before and one after the word
+    """
+    grams = set()
+    for word in _WORD.findall(normalized):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+
+def catalog_key(providers) -> str:
+    """
+    @return
+    a fingerprint of the names and codes of the provider catalog, equal for sessions with the same catalog
+    """
+    digest = hashlib.sha1()
+    for provider in providers:
+        digest.update(f"{provider['code']}\0{provider['name']}\0".encode())
+
+    return digest.hexdigest()
+
+
+class ProviderIndex:
+    """
+    Provider catalog indexed by normalized name, and by the trigrams of the names for approximate lookups,
+    built once per catalog
+    """
+    min_score = lookup_settings.get('min_score', 0.5)
+    max_candidates = lookup_settings.get('max_candidates', 5)
+
+    def __init__(self, providers):
+        self.codes = {}
+        # Name and number of trigrams of each distinct normalized name, in catalog order
+        self.names = []
+        self.sizes = []
+        # Trigram -> indexes in names of the names having it
+        self.postings = {}
+
+        for provider in providers:
+            normalized_name = normalize_string(provider['name'])
+            if normalized_name in self.codes:
+                # The first provider with a name wins, as in the catalog order
+                continue
+
+            self.codes[normalized_name] = provider['code']
+
+            grams = trigrams(normalized_name)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(len(self.names))
+
+            self.names.append(provider['name'])
+            self.sizes.append(len(grams))
+
+    def code(self, normalized_name) -> Optional[str]:
+        """
+        @return
+        the code of the provider whose normalized name is exactly the given one, None if there is no such provider
+        """
+        return self.codes.get(normalized_name)
+
+    def similar(self, normalized_string) -> List[str]:
+        """
+        Approximate lookup, tolerant to typos and partial names.
+        The score of a name is the mean of the trigram similarity of the string and the name,
+        and the fraction of the trigrams of the string found in the name, so partial names score high.
+        @return
+        the names of the providers scoring at least min_score, best first, at most max_candidates
+        """
+        grams = trigrams(normalized_string)
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting:
+                shared.update(posting)
+
+        # The score is never higher than the fraction of the trigrams of the string found in the name
+        min_shared = math.ceil(self.min_score * len(grams))
+
+        scored = []
+        for i, count in shared.items():
+            if count < min_shared:
+                continue
+
+            score = (count / (len(grams) + self.sizes[i] - count) + count / len(grams)) / 2
+            if score >= self.min_score:
+                scored.append((-score, i))
+
+        return [self.names[i] for _, i in heapq.nsmallest(self.max_candidates, scored)]
+
+
+class ProviderIndexes:
+    """
+    Process-wide indexes of the provider catalogs, shared by the sessions with the same catalog,
+    with LRU eviction when full
+    """
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, providers) -> ProviderIndex:
+        """
+        @param key: the catalog_key of the providers
+        @return
+        the index of the catalog, built from the providers if it's not indexed yet
+        """
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        index = ProviderIndex(providers)
+
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+provider_indexes = ProviderIndexes()
@@ -0,0 +1,294 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+
+from chatbot import metrics, settings
+
+
+session_settings = getattr(settings, "CONFIG").get('session_store', {})
+
+
+class SessionDatabase:
+    """
+    SQLite database of the sessions, in WAL mode, shared by every worker process of the host.
+    Readers don't block the writer, and a request reads and writes its session with a single statement each,
+    by primary key of a table clustered by it.
+    Each thread has its own connection, opened again in forked processes.
+    Expired sessions are swept by the processes saving sessions, at most every sweep_interval seconds each.
+    """
+
+    def __init__(self, path="sessions.sqlite3", timeout=5, sweep_interval=60, touch_interval=60):
+        """
+        @param timeout: seconds to wait for the lock of another process writing
+        @param touch_interval: seconds the expiry of a session read must be behind to be refreshed
+        """
+        self.path = path
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self.touch_interval = touch_interval
+
+        self._local = threading.local()
+        self._last_sweep = time.time()
+
+        self.reads = 0
+        self.writes = 0
+        self.touches = 0
+        self.swept = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.connection = self.connect()
+            self._local.pid = pid
+
+        return self._local.connection
+
+    def connect(self) -> sqlite3.Connection:
+        # Autocommit, every statement is its own transaction
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Durable up to the last checkpoint on power loss, enough for sessions
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS session "
+                           "(key TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL) WITHOUT ROWID")
+        connection.execute("CREATE INDEX IF NOT EXISTS session_expires ON session (expires)")
+
+        return connection
+
+    def load(self, key, now=None):
+        """
+        @return
+        the data and expiry timestamp of the session, None if it doesn't exist or expired
+        """
+        self.reads += 1
+        return self.connection.execute("SELECT data, expires FROM session WHERE key = ? AND expires > ?",
+                                       (key, time.time() if now is None else now)).fetchone()
+
+    def exists(self, key, now=None) -> bool:
+        return self.connection.execute("SELECT 1 FROM session WHERE key = ? AND expires > ?",
+                                       (key, time.time() if now is None else now)).fetchone() is not None
+
+    def insert(self, key, data, expires, now=None) -> bool:
+        """
+        Inserts a new session, replacing an expired one with the same key
+        @return
+        False if the key is already used by a session not expired
+        """
+        self.writes += 1
+        cursor = self.connection.execute(
+            "INSERT INTO session (key, data, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET data = excluded.data, expires = excluded.expires "
+            "WHERE session.expires <= ?",
+            (key, data, expires, time.time() if now is None else now))
+
+        return cursor.rowcount > 0
+
+    def update(self, key, data, expires, now=None) -> bool:
+        """
+        @return
+        False if the session doesn't exist anymore (it expired or was deleted by another request)
+        """
+        self.writes += 1
+        cursor = self.connection.execute("UPDATE session SET data = ?, expires = ? WHERE key = ? AND expires > ?",
+                                         (data, expires, key, time.time() if now is None else now))
+
+        return cursor.rowcount > 0
+
+    def touch(self, key, expires, age, now=None):
+        """
+        Refreshes the expiry of a session read, without writing its data,
+        if it's at least touch_interval seconds behind a full age from now
+        @param expires: the expiry read with the session
+        """
+        now = time.time() if now is None else now
+        if now + age - expires < self.touch_interval:
+            return
+
+        self.touches += 1
+        self.connection.execute("UPDATE session SET expires = ? WHERE key = ? AND expires > ?",
+                                (now + age, key, now))
+
+    def delete(self, key):
+        self.connection.execute("DELETE FROM session WHERE key = ?", (key,))
+
+    def sweep(self, now=None) -> int:
+        """
+        Deletes the expired sessions
+        @return
+        how many were deleted
+        """
+        now = time.time() if now is None else now
+        self._last_sweep = now
+
+        swept = self.connection.execute("DELETE FROM session WHERE expires <= ?", (now,)).rowcount
+        self.swept += swept
+
+        return swept
+
+    def sweep_if_due(self):
+        if time.time() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def stats(self) -> dict:
+        return {'reads': self.reads, 'writes': self.writes, 'touches': self.touches, 'swept': self.swept}
+
+
+class TrackedDict(dict):
+    """
+    Dict of a session loaded from the database, that records whether it was modified in place
+    (like session['cache'] and its provider session), so the session is saved only then.
+    It's pickled as a plain dict.
+    """
+    __slots__ = ('changed',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed = False
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.changed = True
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed = True
+
+    def __ior__(self, other):
+        self.changed = True
+        return super().__ior__(other)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.changed = True
+
+        return super().setdefault(key, default)
+
+    def pop(self, key, *default):
+        if key in self:
+            self.changed = True
+
+        return super().pop(key, *default)
+
+    def popitem(self):
+        self.changed = True
+        return super().popitem()
+
+    def update(self, *args, **kwargs):
+        self.changed = True
+        super().update(*args, **kwargs)
+
+    def clear(self):
+        self.changed = True
+        super().clear()
+
+
+def tracked(value):
+    """
+    @return
+    the value, with its dicts and the dicts nested in them as TrackedDicts
+    """
+    if type(value) is dict:
+        return TrackedDict((key, tracked(item)) for key, item in value.items())
+
+    return value
+
+
+def changed(value) -> bool:
+    """
+    Whether the value, a dict nested in it, or one of their objects with change tracking was modified.
+    Objects track their changes in a `changed` attribute, like MessageHistory and MovementStore.
+    """
+    if getattr(value, 'changed', False) is True:
+        return True
+
+    if isinstance(value, dict):
+        return any(changed(item) for item in value.values())
+
+    return False
+
+
+class SessionStore(SessionBase):
+    """
+    Sessions in the SQLite database shared by the worker processes (SESSION_ENGINE = 'chatbot.sessions').
+    The whole session is pickled, as the cache backend does, so it keeps the objects of the chatbot
+    (message history, movement stores) and `session['cache']` is read and written back in one piece.
+    A session is modified, and saved, when its values are set, or when they are modified in place
+    (see `changed`), so SESSION_SAVE_EVERY_REQUEST is not needed.
+    Sessions only read get their expiry refreshed (see SessionDatabase.touch).
+    """
+    database = SessionDatabase(**session_settings)
+
+    @property
+    def modified(self):
+        return self._modified or changed(getattr(self, '_session_cache', None))
+
+    @modified.setter
+    def modified(self, modified):
+        self._modified = modified
+
+    def load(self):
+        row = self.database.load(self.session_key)
+        if row is None:
+            self._session_key = None
+            return {}
+
+        data, expires = row
+        session = tracked(pickle.loads(data))
+        self.database.touch(self.session_key, expires, self.get_expiry_age(expiry=session.get('_session_expiry')))
+
+        return session
+
+    def exists(self, session_key):
+        return self.database.exists(session_key)
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                # Key collision, try again with a new key
+                continue
+
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        data = pickle.dumps(self._get_session(no_load=must_create), pickle.HIGHEST_PROTOCOL)
+        expires = time.time() + self.get_expiry_age()
+
+        if must_create:
+            if not self.database.insert(self.session_key, data, expires):
+                raise CreateError
+        elif not self.database.update(self.session_key, data, expires):
+            raise UpdateError
+
+        self.database.sweep_if_due()
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+
+        self.database.delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        cls.database.sweep()
+
+
+metrics.registry.register_collector("chatbot_session_store", "Operations of the session database of the process",
+                                    lambda: [((stat,), value) for stat, value in SessionStore.database.stats().items()],
+                                    labels=("stat",))
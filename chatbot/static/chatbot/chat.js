@@ -6,7 +6,7 @@ function processMessageResponse(data) {
 
     if ('message' in data) {
         exitModal();
-        addNewMessage(data['message']);
+        return addNewMessage(data['message']);
     } else if ('modal-form' in data) {
         showModalForm(data['modal-form']);
     } else if ('modal-feedback' in data) {
@@ -76,16 +76,120 @@ function exitModal(timeout = 500) {
         }, timeout);
 }
 
-function addNewMessage(message) {
+function messageElement(message) {
     let newMessage = document.createElement("div");
     newMessage.innerHTML = message['content'];
 
     newMessage.classList.add("message")
     newMessage.classList.add(message['sender'])
 
+    return newMessage;
+}
+
+function addNewMessage(message) {
+    const newMessage = messageElement(message);
     chatHistory.insertBefore(newMessage, messageEnd);
 
     messageEnd.scrollIntoView();
+
+    return newMessage;
+}
+
+function readMessageStream(response, action) {
+    // NDJSON lines: the first one is a message, the next ones are appended to it
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let message = null;
+
+    function processLine(line) {
+        if (!line) {
+            return;
+        }
+
+        const data = JSON.parse(line);
+        if ('append' in data && message) {
+            message.insertAdjacentHTML("beforeend", "\n" + data['append']);
+            messageEnd.scrollIntoView();
+        } else {
+            message = action(data);
+        }
+    }
+
+    function read() {
+        return reader.read().then(({done, value}) => {
+            buffer += decoder.decode(value, {stream: !done});
+
+            const lines = buffer.split("\n");
+            buffer = lines.pop();
+            lines.forEach(processLine);
+
+            if (done) {
+                processLine(buffer);
+                return;
+            }
+            return read();
+        });
+    }
+
+    return read();
+}
+
+function loadHistory() {
+    // The cursor of the previous page of messages, empty if there are no more
+    const cursor = chatHistory.dataset.cursor;
+    if (!cursor || loadingHistory) {
+        return;
+    }
+
+    loadingHistory = true;
+    historyMarker.classList.remove("hidden");
+
+    fetch("history/?before=" + encodeURIComponent(cursor), {
+      credentials: "same-origin",
+      headers: {
+        "X-Requested-With": "XMLHttpRequest",
+      },
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error("History request failed with status " + response.status);
+        }
+        return response.json();
+    })
+    .then(data => {
+        loadingHistory = false;
+        historyMarker.classList.add("hidden");
+        prependHistoryPage(data);
+    })
+    .catch((error) => {
+        loadingHistory = false;
+        historyMarker.classList.add("hidden");
+        console.log(error);
+    });
+}
+
+function prependHistoryPage(data) {
+    const page = document.createDocumentFragment();
+    for (const message of data['messages']) {
+        page.appendChild(messageElement(message));
+    }
+
+    // Keep the messages in view where they were
+    const previousHeight = chatHistory.scrollHeight;
+    chatHistory.insertBefore(page, historyMarker.nextSibling);
+    chatHistory.scrollTop += chatHistory.scrollHeight - previousHeight;
+
+    chatHistory.dataset.cursor = data['cursor'] ?? "";
+
+    // The chat may not fill the box yet
+    loadHistoryIfNear();
+}
+
+function loadHistoryIfNear() {
+    if (chatHistory.scrollTop < historyLoadDistance) {
+        loadHistory();
+    }
 }
 
 function addErrorMessage() {
@@ -119,8 +223,12 @@ function post(url, body, action, errorAction) {
       },
       body: body
     })
-    .then(response => response.json())
-    .then(data => action(data))
+    .then(response => {
+        if (response.headers.get("Content-Type") === "application/x-ndjson") {
+            return readMessageStream(response, action);
+        }
+        return response.json().then(data => action(data));
+    })
     .catch((error) => errorAction(error));
 }
 
@@ -183,6 +291,7 @@ function modalFeedbackElement() {
 const csrftoken = getCookie('csrftoken');
 
 const chatHistory = document.getElementById("chat-history");
+const historyMarker = document.getElementById("history-marker");
 const messageEnd = document.getElementById("end-marker");
 const chatForm = document.getElementById("chat-form");
 const userMessageField = document.getElementById("input-field");
@@ -191,11 +300,17 @@ const submitMessageBtn = document.getElementById("submit");
 const baseModal = document.getElementById("modal");
 const modalContent = document.getElementById("modal-content");
 
+// Pixels from the top of the chat at which the previous page of messages is loaded
+const historyLoadDistance = 200;
+let loadingHistory = false;
+
 
 document.addEventListener('click', clickListener);
 
 chatForm.addEventListener("submit", messageSubmit);
 
+chatHistory.addEventListener("scroll", loadHistoryIfNear);
+
 
 document.addEventListener("keydown", (e) => {
     if (e.key === "Escape") {
@@ -211,4 +326,5 @@ window.addEventListener("click", backgroundClick);
 window.onload = function() {
     messageEnd.scrollIntoView();
     userMessageField.focus();
+    loadHistoryIfNear();
 }
@@ -0,0 +1,112 @@
+import heapq
+import operator
+from array import array
+from bisect import bisect_left
+from datetime import date
+from typing import Iterable, List, Tuple
+
+
+def amount(value) -> float:
+    """
+    @return
+    the amount of a debit or credit field, 0 if it's empty or not a number
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def amounts(movements, field) -> array:
+    """
+    @return
+    the column of the amounts of the field of the movements
+    """
+    values = [movement.get(field) or 0.0 for movement in movements]
+    try:
+        return array('d', values)
+    except TypeError:
+        # Some amounts are strings
+        return array('d', map(amount, values))
+
+
+class MovementColumns:
+    """
+    Movements of a date range as columns (arrays of day ordinals, debits and credits), built once,
+    so they are aggregated by C loops (sum, slicing, bisect, max) instead of Python loops over the movement dicts
+    """
+    # Movements per block of the columns, when looking for the largest ones
+    block_size = 256
+
+    def __init__(self, days_movements: Iterable[Tuple[int, list]]):
+        """
+        @param days_movements: (day ordinal, movements of the day) of each day with movements, in date order
+        """
+        self.days = array('l')
+        self.debits = array('d')
+        self.credits = array('d')
+        # Debit plus credit, the amount of the movement
+        self.sizes = array('d')
+        # The movements themselves, in the same order, to show the largest ones
+        self.movements = []
+
+        for day, movements in days_movements:
+            self.days.extend([day] * len(movements))
+            debits, credits = amounts(movements, 'debit'), amounts(movements, 'credit')
+
+            self.debits.extend(debits)
+            self.credits.extend(credits)
+            self.sizes.extend(map(operator.add, debits, credits))
+            self.movements += movements
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def total_debit(self) -> float:
+        return sum(self.debits)
+
+    @property
+    def total_credit(self) -> float:
+        return sum(self.credits)
+
+    @property
+    def net_flow(self) -> float:
+        return self.total_credit - self.total_debit
+
+    def monthly(self) -> List[Tuple[int, int, float, float]]:
+        """
+        @return
+        the (year, month, debit, credit) of each month with movements, in date order
+        """
+        months = []
+        start = 0
+
+        while start < len(self.days):
+            first = date.fromordinal(self.days[start])
+            next_month = date(first.year + first.month // 12, first.month % 12 + 1, 1).toordinal()
+            end = bisect_left(self.days, next_month, start)
+
+            months.append((first.year, first.month,
+                           sum(self.debits[start:end]), sum(self.credits[start:end])))
+            start = end
+
+        return months
+
+    def largest(self, n) -> list:
+        """
+        @return
+        the n movements with the largest amount, largest first (the earliest one first on ties)
+        """
+        size = len(self.sizes)
+        block_maximums = [(max(self.sizes[start:start + self.block_size]), -start)
+                          for start in range(0, size, self.block_size)]
+
+        # Each of the n largest movements is in a block with a maximum at least as large as it,
+        # so they are all in the n blocks with the largest maximums (the earliest ones first on ties)
+        candidates = sorted(index for _, start in heapq.nlargest(n, block_maximums)
+                            for index in range(-start, min(-start + self.block_size, size)))
+        # Stable, the earliest one first on ties
+        candidates.sort(key=self.sizes.__getitem__, reverse=True)
+
+        return [self.movements[index] for index in candidates[:n]]
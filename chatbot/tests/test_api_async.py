@@ -0,0 +1,56 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.api import ApiException
+from chatbot.api.cache import meta_cache
+from chatbot.api.meta import AsyncProvider
+
+
+@patch('httpx.AsyncClient.get', new_callable=AsyncMock)
+class TestAsyncProvider(SimpleTestCase):
+    api_key = "test_api_key"
+
+    def setUp(self) -> None:
+        meta_cache.clear()
+
+    @parameterized.expand([
+        (200, {"status": "success", "providers": None}),
+        (200, {"status": "success", "providers": {}}),
+    ])
+    def test_successful_json_happy(self, mock_response, status_code, json):
+        print()
+        print("Testing behavior of async successful_json() method - happy path scenario.")
+        print("status code:", status_code)
+        print("json:", json)
+
+        mock_response.return_value = MagicMock(status_code=status_code)
+        mock_response.return_value.json.return_value = json
+
+        self.assertEqual(async_to_sync(AsyncProvider(self.api_key).successful_json)(), json)
+
+    @parameterized.expand([
+        (200, {}),
+        (200, {"status": "error", "providers": None}),
+        (400, {"status": "success", "providers": None}),
+        (500, {"status": "success", "providers": None}),
+    ])
+    def test_successful_json_failure(self, mock_response, status_code, json):
+        print()
+        print("Testing behavior of async successful_json() method - failure scenario.")
+        print("status code:", status_code)
+        print("json:", json)
+
+        mock_response.return_value = MagicMock(status_code=status_code)
+        mock_response.return_value.json.return_value = json
+
+        self.assertRaises(ApiException, async_to_sync(AsyncProvider(self.api_key).successful_json))
+
+    def test_response_before_fetch(self, mock_response):
+        print()
+        print("Testing that the response of an async Api can't be used before fetching it.")
+
+        self.assertRaises(RuntimeError, lambda: AsyncProvider(self.api_key).is_ok())
+        mock_response.assert_not_called()
@@ -0,0 +1,117 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.cache import ResponseCache, meta_cache
+from chatbot.api.meta import Provider, ProviderDetail
+
+
+@patch('time.monotonic')
+class TestResponseCache(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.cache = ResponseCache(ttl=10, max_size=2, stale_while_revalidate=5)
+
+    @parameterized.expand([
+        (0, ("response", {}), False),
+        (10, ("response", {}), False),
+        (12, ("response", {}), True),
+        (15, ("response", {}), True),
+        (16, None, False),
+    ])
+    def test_get_by_age(self, mock_time, age, expected_value, expected_revalidate):
+        print()
+        print("Testing ResponseCache.get depending on the age of the response.")
+        print("age:", age)
+
+        mock_time.return_value = 100
+        self.cache.set("key", "response", {})
+
+        mock_time.return_value = 100 + age
+        self.assertEqual(self.cache.get("key"), (expected_value, expected_revalidate))
+
+    def test_revalidate_once(self, mock_time):
+        print()
+        print("Testing that a stale response is revalidated by only one caller at a time.")
+
+        mock_time.return_value = 100
+        self.cache.set("key", "response", {})
+
+        mock_time.return_value = 112
+        self.assertTrue(self.cache.get("key")[1])
+        self.assertFalse(self.cache.get("key")[1])
+
+        self.cache.release("key")
+        self.assertTrue(self.cache.get("key")[1])
+
+    def test_lru_eviction(self, mock_time):
+        print()
+        print("Testing that the least recently used response is evicted when the cache is full.")
+
+        mock_time.return_value = 100
+        self.cache.set("key1", "response1", {})
+        self.cache.set("key2", "response2", {})
+        self.cache.get("key1")
+        self.cache.set("key3", "response3", {})
+
+        self.assertEqual(self.cache.get("key2"), (None, False))
+        self.assertEqual(self.cache.get("key1")[0], ("response1", {}))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_stats(self, mock_time):
+        print()
+        print("Testing hit and miss counters.")
+
+        mock_time.return_value = 100
+        self.cache.get("key")
+        self.cache.set("key", "response", {})
+        self.cache.get("key")
+        self.cache.get("key")
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.assertAlmostEqual(stats['hit_ratio'], 2 / 3)
+
+
+@patch('requests.Session.get')
+class TestMetaCache(SimpleTestCase):
+
+    def setUp(self) -> None:
+        meta_cache.clear()
+
+    def test_provider_cached(self, mock_response):
+        print()
+        print("Testing that the provider list is requested once per API key.")
+
+        mock_response.return_value.status_code = 200
+        mock_response.return_value.json.return_value = {"status": "success", "providers": []}
+
+        Provider("key1").successful_json()
+        Provider("key1").successful_json()
+        self.assertEqual(mock_response.call_count, 1)
+
+        Provider("key2").successful_json()
+        self.assertEqual(mock_response.call_count, 2)
+
+    def test_provider_detail_shared(self, mock_response):
+        print()
+        print("Testing that the provider detail is shared between API keys.")
+
+        mock_response.return_value.status_code = 200
+        mock_response.return_value.json.return_value = {"status": "success", "provider": {}}
+
+        ProviderDetail("key1", "test").successful_json()
+        ProviderDetail("key2", "test").successful_json()
+        self.assertEqual(mock_response.call_count, 1)
+
+    def test_error_not_cached(self, mock_response):
+        print()
+        print("Testing that unsuccessful responses are not cached.")
+
+        mock_response.return_value.status_code = 200
+        mock_response.return_value.json.return_value = {"status": "error"}
+
+        Provider("key1").is_ok()
+        Provider("key1").is_ok()
+        self.assertEqual(mock_response.call_count, 2)
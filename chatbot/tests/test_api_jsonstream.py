@@ -0,0 +1,113 @@
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.api import ApiException
+from chatbot.api.jsonstream import JsonArrayStream
+from chatbot.api.transactional import AccountMovement
+
+
+def movements_json(count, status="success"):
+    return json.dumps({"status": status,
+                       "movements": [{"id": i, "detail": "Café \"express\"", "debit": 1.5 * i, "credit": None}
+                                     for i in range(count)]})
+
+
+def chunks(string, size):
+    return [string[i:i + size] for i in range(0, len(string), size)]
+
+
+class TestJsonArrayStream(SimpleTestCase):
+
+    @parameterized.expand([(1,), (7,), (64,), (100000,)])
+    def test_items(self, chunk_size):
+        print()
+        print("Testing the incremental decoding of the items, with chunks of size", chunk_size)
+
+        document = movements_json(50)
+        stream = JsonArrayStream("movements")
+
+        items = [item for chunk in chunks(document, chunk_size) for item in stream.feed(chunk)]
+        stream.close()
+
+        self.assertEqual(items, json.loads(document)["movements"])
+        self.assertEqual(stream.members, {"status": "success"})
+        self.assertTrue(stream.found)
+
+    def test_members_after_items(self):
+        print()
+        print("Testing that the members after the array are kept.")
+
+        stream = JsonArrayStream("movements")
+        items = list(stream.feed('{"movements": [1, 2], "status": "success", "count": 2}'))
+        stream.close()
+
+        self.assertEqual(items, [1, 2])
+        self.assertEqual(stream.members, {"status": "success", "count": 2})
+
+    @parameterized.expand([
+        ('{"status": "success", "movements": [{"id": 1}',),
+        ('{"status": "success", "movements": [{"id": 1}]} {}',),
+        ('[{"id": 1}]',),
+        ('{"status" "success"}',),
+    ])
+    def test_invalid(self, document):
+        print()
+        print("Testing that invalid documents raise ValueError:", document)
+
+        def parse():
+            stream = JsonArrayStream("movements")
+            list(stream.feed(document))
+            stream.close()
+
+        self.assertRaises(ValueError, parse)
+
+
+@patch('requests.Session.get')
+class TestStreamedMovements(SimpleTestCase):
+
+    @staticmethod
+    def movement_api():
+        return AccountMovement("api_key", "key", "123", "UYU", datetime(2022, 7, 1), datetime(2022, 7, 31))
+
+    @staticmethod
+    def mock(mock_get, status_code, content):
+        response = mock_get.return_value
+        response.status_code = status_code
+        response.iter_content.side_effect = lambda chunk_size: iter(chunks(content.encode(), chunk_size))
+        response.json.side_effect = lambda: json.loads(content)
+
+    def test_successful_items(self, mock_get):
+        print()
+        print("Testing that movements are streamed with stream=True.")
+
+        document = movements_json(1000)
+        self.mock(mock_get, 200, document)
+
+        api = self.movement_api()
+        api.stream_chunk_size = 100
+
+        self.assertEqual(list(api.successful_items()), json.loads(document)["movements"])
+        self.assertTrue(mock_get.call_args.kwargs['stream'])
+
+    @parameterized.expand([
+        (200, '{"status": "error", "message": "Key not Found"}'),
+        (200, '{"status": "error", "movements": [{"id": 1}]}'),
+        (200, '{"status": "success", "movements": [{"id": 1}'),
+        (500, '{"status": "error"}'),
+    ])
+    def test_unsuccessful_items(self, mock_get, status_code, content):
+        print()
+        print("Testing that unsuccessful streamed responses raise ApiException:", status_code, content)
+
+        self.mock(mock_get, status_code, content)
+
+        items = []
+        with self.assertRaises(ApiException):
+            for item in self.movement_api().successful_items():
+                items.append(item)
+
+        self.assertEqual(items, [])
@@ -4,13 +4,17 @@ from unittest.mock import patch
 from parameterized import parameterized
 
 from chatbot.api.api import ApiException
+from chatbot.api.cache import meta_cache
 from chatbot.api.meta import Provider
 
 
-@patch('requests.get')
+@patch('requests.Session.get')
 class TestProvider(SimpleTestCase):
     api_key = "test_api_key"
 
+    def setUp(self) -> None:
+        meta_cache.clear()
+
     @parameterized.expand([
         (200, {"status": "success", "providers": None}),
         (200, {"status": "success", "providers": {}}),
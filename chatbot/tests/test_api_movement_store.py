@@ -0,0 +1,180 @@
+import pickle
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.movement_store import MovementStore, words
+
+
+def movements(date_start, date_end, detail="movement"):
+    days = (date_end - date_start).days + 1
+    return [{'id': f"{day:%Y%m%d}", 'date': f"{day:%d/%m/%Y}", 'detail': detail}
+            for day in (date_start + timedelta(days=i) for i in range(days))]
+
+
+def day_range(first, last):
+    return datetime.strptime(first, "%d/%m/%Y"), datetime.strptime(last, "%d/%m/%Y")
+
+
+def formatted(ranges):
+    return [(start.strftime("%d/%m/%Y"), end.strftime("%d/%m/%Y")) for start, end in ranges]
+
+
+class TestMovementStore(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.store = MovementStore()
+        self.store.add(*day_range("01/01/2022", "28/02/2022"), movements(*day_range("01/01/2022", "28/02/2022")))
+
+    @parameterized.expand([
+        ("01/01/2022", "31/01/2022", []),
+        ("01/01/2022", "31/03/2022", [("01/03/2022", "31/03/2022")]),
+        ("01/12/2021", "31/03/2022", [("01/12/2021", "31/12/2021"), ("01/03/2022", "31/03/2022")]),
+        ("01/06/2022", "30/06/2022", [("01/06/2022", "30/06/2022")]),
+    ])
+    def test_gaps(self, first, last, expected_gaps):
+        print()
+        print("Testing the gaps of the range from", first, "to", last)
+
+        self.assertEqual(formatted(self.store.gaps(*day_range(first, last))), expected_gaps)
+
+    def test_covered_query(self):
+        print()
+        print("Testing that covered ranges are answered from the store, in date order.")
+
+        stored = list(self.store.movements(*day_range("15/01/2022", "15/02/2022")))
+
+        self.assertEqual(len(stored), 32)
+        self.assertEqual(stored[0]['date'], "15/01/2022")
+        self.assertEqual(stored[-1]['date'], "15/02/2022")
+
+    def test_replace(self):
+        print()
+        print("Testing that fetching a range again replaces its movements, without duplicates.")
+
+        self.store.add(*day_range("10/02/2022", "10/03/2022"), movements(*day_range("10/02/2022", "10/03/2022"), "new"))
+        stored = list(self.store.movements(*day_range("01/01/2022", "31/03/2022")))
+
+        self.assertEqual(len(stored), 31 + 28 + 10)
+        self.assertEqual(len({movement['id'] for movement in stored}), len(stored))
+        self.assertEqual({movement['detail'] for movement in stored[:40]}, {"movement"})
+        self.assertEqual({movement['detail'] for movement in stored[40:]}, {"new"})
+        self.assertEqual(formatted(self.store.gaps(*day_range("01/01/2022", "10/03/2022"))), [])
+
+    def test_recent_edge(self):
+        print()
+        print("Testing that the recent edge of the range is fetched again after its ttl.")
+
+        today = datetime.combine(datetime.today(), datetime.min.time())
+        month_ago = today - timedelta(days=30)
+        recent_start = today - timedelta(days=self.store.recent_days - 1)
+
+        self.store.add(month_ago, today, movements(month_ago, today), now=1000)
+
+        self.assertEqual(self.store.gaps(month_ago, today, now=1000 + self.store.recent_ttl), [])
+        self.assertEqual(self.store.gaps(month_ago, today, now=1001 + self.store.recent_ttl), [(recent_start, today)])
+
+    def test_failed_windows(self):
+        print()
+        print("Testing that windows that failed are not covered.")
+
+        store = MovementStore()
+        windows = [day_range("01/01/2022", "31/01/2022"), day_range("01/03/2022", "31/03/2022")]
+        store.add_windows(windows, movements(*day_range("01/01/2022", "31/01/2022"))
+                          + movements(*day_range("01/03/2022", "31/03/2022")))
+
+        self.assertEqual(formatted(store.gaps(*day_range("01/01/2022", "31/03/2022"))),
+                         [("01/02/2022", "28/02/2022")])
+        self.assertEqual(len(list(store.movements(*day_range("01/01/2022", "31/03/2022")))), 62)
+
+    def test_changed(self):
+        print()
+        print("Testing that adding movements marks the store as changed, until it's loaded again.")
+
+        self.assertTrue(self.store.changed)
+
+        store = pickle.loads(pickle.dumps(self.store))
+
+        self.assertFalse(store.changed)
+        self.assertEqual(store.intervals, self.store.intervals)
+        self.assertEqual(list(store.gaps(*day_range("01/01/2022", "28/02/2022"))), [])
+
+    def test_columns_cached(self):
+        print()
+        print("Testing that the columns of a range are built once, until movements are added.")
+
+        january = day_range("01/01/2022", "31/01/2022")
+        columns = self.store.columns(*january)
+
+        self.assertEqual(len(columns), 31)
+        self.assertIs(self.store.columns(*january), columns)
+        self.assertEqual(len(self.store.columns(*day_range("01/01/2022", "28/02/2022"))), 59)
+
+        self.store.add(*day_range("31/01/2022", "31/01/2022"),
+                       movements(*day_range("31/01/2022", "31/01/2022")) + [{'id': "extra", 'date': "31/01/2022"}])
+
+        self.assertEqual(len(self.store.columns(*january)), 32)
+        self.assertEqual(pickle.loads(pickle.dumps(self.store)).columns_cache, {})
+
+
+class TestMovementIndex(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.store = MovementStore()
+        self.store.add(*day_range("01/01/2022", "31/03/2022"), [
+            {**movement, 'detail': "UBER Trip" if i % 10 == 0 else "Rent payment", 'reference': f"Ref-{i}"}
+            for i, movement in enumerate(movements(*day_range("01/01/2022", "31/03/2022")))])
+
+    def searched(self, terms, *dates):
+        return [movement['date'] for movement in self.store.search(words(terms), *day_range(*dates) if dates else ())]
+
+    def scanned(self, terms):
+        """
+        @return
+        the dates of the movements containing the terms, looking at every movement
+        """
+        return [movement['date'] for movement in self.store.movements(*day_range("01/01/2022", "31/03/2022"))
+                if words(terms) <= words(f"{movement['detail']} {movement['reference']}")]
+
+    @parameterized.expand([("uber",), ("Übér trip",), ("rent",), ("ref 20",), ("payment ref 10",), ("nothing",)])
+    def test_search(self, terms):
+        print()
+        print("Testing that searching", terms, "finds the same movements as looking at every one")
+
+        self.assertEqual(self.searched(terms), self.scanned(terms))
+
+    def test_date_range(self):
+        print()
+        print("Testing that a search in a date range finds only the movements of those dates.")
+
+        self.assertEqual(self.searched("uber", "01/02/2022", "28/02/2022"), ["10/02/2022", "20/02/2022"])
+
+    def test_replace(self):
+        print()
+        print("Testing that movements fetched again replace the old ones in the index.")
+
+        self.store.add(*day_range("01/01/2022", "31/01/2022"),
+                       movements(*day_range("01/01/2022", "31/01/2022"), "Netflix"))
+
+        self.assertEqual(self.searched("uber", "01/01/2022", "31/01/2022"), [])
+        self.assertEqual(len(self.searched("netflix")), 31)
+        self.assertNotIn("30", self.store.index.postings)
+
+    def test_packed(self):
+        print()
+        print("Testing that a store loaded from the session is unpacked when used, and packed again only if changed.")
+
+        data = pickle.dumps(self.store)
+        store = pickle.loads(data)
+
+        self.assertNotIn('days', store.__dict__)
+        self.assertEqual(pickle.dumps(store), data)
+        self.assertNotIn('days', store.__dict__)
+
+        self.assertEqual(self.searched("uber"), [movement['date'] for movement in store.search(words("uber"))])
+        self.assertEqual(store.movement("20220111")['detail'], "UBER Trip")
+        self.assertIsNone(store.movement("20230110"))
+
+        store.add(*day_range("01/04/2022", "01/04/2022"), movements(*day_range("01/04/2022", "01/04/2022"), "Uber"))
+        self.assertEqual(len(list(pickle.loads(pickle.dumps(store)).search(words("uber")))), 10)
@@ -0,0 +1,88 @@
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from chatbot.api.prefetch import Prefetcher
+
+
+class TestPrefetcher(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.prefetcher = Prefetcher(enabled=True, ttl=60, max_workers=2)
+
+    def test_disabled(self):
+        print()
+        print("Testing that nothing is prefetched when prefetching is disabled.")
+
+        calls = []
+        prefetcher = Prefetcher(enabled=False)
+        prefetcher.start("key", {'accounts': lambda: calls.append(1)})
+
+        self.assertIsNone(prefetcher.take("key", 'accounts'))
+        self.assertEqual(calls, [])
+
+    def test_several_processes(self):
+        print()
+        print("Testing that nothing is prefetched with several worker processes.")
+
+        calls = []
+        with self.assertLogs('chatbot.api.prefetch', 'WARNING'):
+            prefetcher = Prefetcher(enabled=True, processes=4)
+        prefetcher.start("key", {'accounts': lambda: calls.append(1)})
+
+        self.assertFalse(prefetcher.enabled)
+        self.assertIsNone(prefetcher.take("key", 'accounts'))
+        self.assertEqual(calls, [])
+
+    def test_take(self):
+        print()
+        print("Testing that prefetched results are taken once.")
+
+        self.prefetcher.start("key", {'accounts': lambda: ["account"], 'info': lambda: {"name": "N"}})
+
+        self.assertEqual(self.prefetcher.take("key", 'accounts'), ["account"])
+        self.assertIsNone(self.prefetcher.take("key", 'accounts'))
+        self.assertIsNone(self.prefetcher.take("other key", 'info'))
+        self.assertEqual(async_to_sync(self.prefetcher.atake)("key", 'info'), {"name": "N"})
+        self.assertEqual(self.prefetcher.stats()['sessions'], 0)
+
+    def test_failure(self):
+        print()
+        print("Testing that failed prefetches are not taken, so they are fetched as usual.")
+
+        def fail():
+            raise ValueError()
+
+        self.prefetcher.start("key", {'accounts': fail})
+
+        self.assertIsNone(self.prefetcher.take("key", 'accounts'))
+
+    def test_cancel(self):
+        print()
+        print("Testing that cancelled prefetches are not run nor taken.")
+
+        release = threading.Event()
+        calls = []
+
+        # Both workers are busy, so the last prefetch is still queued when cancelled
+        self.prefetcher.start("busy", {'a': release.wait, 'b': release.wait})
+        self.prefetcher.start("key", {'accounts': lambda: calls.append(1)})
+        self.prefetcher.cancel("key")
+        release.set()
+
+        self.assertIsNone(self.prefetcher.take("key", 'accounts'))
+        self.prefetcher.executor.shutdown(wait=True)
+        self.assertEqual(calls, [])
+
+    @patch('time.monotonic')
+    def test_expired(self, mock_time):
+        print()
+        print("Testing that prefetched results expire after the ttl.")
+
+        mock_time.return_value = 100
+        self.prefetcher.start("key", {'accounts': lambda: ["account"]})
+
+        mock_time.return_value = 161
+        self.assertIsNone(self.prefetcher.take("key", 'accounts'))
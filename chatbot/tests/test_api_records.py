@@ -0,0 +1,59 @@
+import pickle
+
+from django.test import SimpleTestCase
+
+from chatbot.api.records import Items, Record
+
+
+class TestRecord(SimpleTestCase):
+    item = {'id': "1", 'number': "123", 'currency': "UYU", 'balance': 10.5}
+
+    def test_read_as_dict(self):
+        print()
+        print("Testing that a record is read like the dict it was made from.")
+
+        record = Record.of(self.item)
+
+        self.assertEqual(record['number'], "123")
+        self.assertEqual(record.get('balance'), 10.5)
+        self.assertIsNone(record.get('missing'))
+        self.assertRaises(KeyError, record.__getitem__, 'missing')
+        self.assertIn('currency', record)
+        self.assertEqual(list(record.items()), list(self.item.items()))
+        self.assertEqual(record, self.item)
+        self.assertEqual(record.dict(), self.item)
+
+    def test_shared_fields(self):
+        print()
+        print("Testing that records with the same fields share them, also once pickled.")
+
+        records = [Record.of({**self.item, 'id': str(i)}) for i in range(3)]
+        loaded = pickle.loads(pickle.dumps(records))
+
+        self.assertIs(records[0].fields, records[1].fields)
+        self.assertIs(loaded[0].fields, loaded[2].fields)
+        self.assertEqual(loaded, records)
+
+    def test_interned(self):
+        print()
+        print("Testing that the values of the interned fields are shared by the records.")
+
+        first = Record.of({'date': "".join(["01/01/", "2022"])}, interned=('date',))
+        second = Record.of({'date': "".join(["01/01/", "2022"])}, interned=('date',))
+
+        self.assertIs(first['date'], second['date'])
+
+
+class TestItems(SimpleTestCase):
+
+    def test_by_number(self):
+        print()
+        print("Testing that items are found by number, the first one if the number repeats.")
+
+        items = Items([{'id': "1", 'number': "123"}, {'id': "2", 'number': "456"}, {'id': "3", 'number': "123"}])
+
+        self.assertEqual(items.by_number("123")['id'], "1")
+        self.assertEqual(items.by_number("456")['id'], "2")
+        self.assertIsNone(items.by_number("789"))
+        self.assertEqual([item['id'] for item in pickle.loads(pickle.dumps(items))], ["1", "2", "3"])
+        self.assertEqual(pickle.loads(pickle.dumps(items)).by_number("456")['id'], "2")
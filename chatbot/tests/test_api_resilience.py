@@ -0,0 +1,248 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import requests
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.api import ApiException
+from chatbot.api.resilience import BreakerState, CircuitBreaker, RetryPolicy, Timeouts, breakers
+from chatbot.api.transactional import Account, AsyncAccount
+from chatbot.api.auth import Logout
+
+
+@patch('time.monotonic', return_value=100)
+class TestCircuitBreaker(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self, mock_time):
+        print()
+        print("Testing that the breaker opens after consecutive failures.")
+
+        self.fail(2)
+        self.assertTrue(self.breaker.allow())
+
+        self.fail(1)
+        self.assertEqual(self.breaker.state, BreakerState.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.stats()['trips'], 1)
+
+    def test_success_resets_failures(self, mock_time):
+        print()
+        print("Testing that a success resets the consecutive failures.")
+
+        self.fail(2)
+        self.breaker.record_success()
+        self.fail(2)
+
+        self.assertEqual(self.breaker.state, BreakerState.CLOSED)
+
+    @parameterized.expand([
+        ("success", CircuitBreaker.record_success, BreakerState.CLOSED, 1),
+        ("failure", CircuitBreaker.record_failure, BreakerState.OPEN, 2),
+    ])
+    def test_half_open_trial(self, mock_time, name, record, expected_state, expected_trips):
+        print()
+        print("Testing the trial request after the reset timeout, with a", name)
+
+        self.fail(3)
+        mock_time.return_value = 110
+
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, BreakerState.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        record(self.breaker)
+        self.assertEqual(self.breaker.state, expected_state)
+        self.assertEqual(self.breaker.trips, expected_trips)
+
+    def test_half_open_trial_released(self, mock_time):
+        print()
+        print("Testing that a released trial request lets a new one through.")
+
+        self.fail(3)
+        mock_time.return_value = 110
+
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+
+        self.assertEqual(self.breaker.state, BreakerState.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_trial_never_ended(self, mock_time):
+        print()
+        print("Testing that a trial request that never ends is replaced after the reset timeout.")
+
+        self.fail(3)
+        mock_time.return_value = 110
+        self.assertTrue(self.breaker.allow())
+
+        mock_time.return_value = 119
+        self.assertFalse(self.breaker.allow())
+
+        mock_time.return_value = 120
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, BreakerState.HALF_OPEN)
+
+
+class TestRetryPolicy(SimpleTestCase):
+
+    def test_delays(self):
+        print()
+        print("Testing that retry delays are bounded by the exponential backoff.")
+
+        for _ in range(100):
+            delays = list(RetryPolicy(retries=4, backoff=0.5, backoff_max=2).delays())
+
+            self.assertEqual(len(delays), 4)
+            for delay, limit in zip(delays, (0.5, 1, 2, 2)):
+                self.assertTrue(0 <= delay <= limit)
+
+
+class TestTimeouts(SimpleTestCase):
+
+    @parameterized.expand([
+        ("Account", (3, 20)),
+        ("AccountMovement", (3, 60)),
+        ("Login", (1, 20)),
+    ])
+    def test_endpoint_timeout(self, endpoint, expected_timeout):
+        print()
+        print("Testing timeouts of endpoint", endpoint)
+
+        timeouts = Timeouts(default={'connect': 3, 'read': 20},
+                            AccountMovement={'read': 60},
+                            Login={'connect': 1})
+
+        self.assertEqual(timeouts.get(endpoint), expected_timeout)
+
+
+@patch('time.sleep')
+@patch('requests.Session.get')
+class TestApiResilience(SimpleTestCase):
+
+    def setUp(self) -> None:
+        breakers.clear()
+
+    @staticmethod
+    def response(status_code, json):
+        response = MagicMock(status_code=status_code)
+        response.json.return_value = json
+        return response
+
+    def test_retry_upstream_error(self, mock_get, mock_sleep):
+        print()
+        print("Testing that GET requests are retried when the upstream fails.")
+
+        json = {"status": "success", "accounts": []}
+        mock_get.side_effect = [self.response(503, {}), self.response(200, json)]
+
+        self.assertEqual(Account("api_key", "key").successful_json(), json)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    def test_retries_exhausted(self, mock_get, mock_sleep):
+        print()
+        print("Testing that a friendly ApiException is raised when all the retries fail.")
+
+        mock_get.side_effect = requests.ConnectTimeout()
+
+        with self.assertRaises(ApiException) as context:
+            Account("api_key", "key", provider="test").successful_json()
+
+        self.assertEqual(context.exception.status, 504)
+        self.assertEqual(mock_get.call_count, 3)
+
+    def test_not_idempotent_not_retried(self, mock_get, mock_sleep):
+        print()
+        print("Testing that non idempotent requests are not retried.")
+
+        mock_get.side_effect = requests.ConnectionError()
+
+        self.assertRaises(ApiException, Logout("api_key", "key").successful_json)
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test_timeout_sent(self, mock_get, mock_sleep):
+        print()
+        print("Testing that requests are sent with connect and read timeouts.")
+
+        mock_get.return_value = self.response(200, {"status": "success", "accounts": []})
+        Account("api_key", "key").successful_json()
+
+        connect_timeout, read_timeout = mock_get.call_args.kwargs['timeout']
+        self.assertGreater(connect_timeout, 0)
+        self.assertGreater(read_timeout, 0)
+
+    def test_breaker_fails_fast(self, mock_get, mock_sleep):
+        print()
+        print("Testing that an unhealthy provider fails fast, without affecting other providers.")
+
+        mock_get.return_value = self.response(500, {})
+        breaker = breakers.get("broken", "Account")
+
+        for _ in range(breaker.failure_threshold):
+            self.assertRaises(ApiException, Account("api_key", "key", provider="broken").successful_json)
+
+        calls = mock_get.call_count
+        with self.assertRaises(ApiException) as context:
+            Account("api_key", "key", provider="broken").successful_json()
+
+        self.assertEqual(context.exception.status, 503)
+        self.assertEqual(mock_get.call_count, calls)
+        self.assertEqual(breaker.stats()['state'], "open")
+
+        mock_get.return_value = self.response(200, {"status": "success", "accounts": []})
+        Account("api_key", "key", provider="working").successful_json()
+        self.assertEqual(mock_get.call_count, calls + 1)
+
+    def test_breaker_trial_unexpected_error(self, mock_get, mock_sleep):
+        print()
+        print("Testing that a trial request ending with an unexpected error doesn't leave the breaker half open.")
+
+        breaker = breakers.get("broken", "Account")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        breaker.opened_at -= breaker.reset_timeout
+
+        mock_get.side_effect = RuntimeError("unexpected")
+        self.assertRaises(RuntimeError, Account("api_key", "key", provider="broken").successful_json)
+        self.assertEqual(breaker.stats()['state'], "half_open")
+
+        mock_get.side_effect = None
+        mock_get.return_value = self.response(200, {"status": "success", "accounts": []})
+        Account("api_key", "key", provider="broken").successful_json()
+        self.assertEqual(breaker.stats()['state'], "closed")
+
+    def test_breaker_trial_cancelled(self, mock_get, mock_sleep):
+        print()
+        print("Testing that a cancelled async trial request releases the trial of the breaker.")
+
+        breaker = breakers.get("broken", "Account")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        breaker.opened_at -= breaker.reset_timeout
+
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        async def cancel_trial():
+            trial = asyncio.create_task(AsyncAccount("api_key", "key", provider="broken").successful_json())
+            await asyncio.sleep(0.01)
+            trial.cancel()
+
+            with self.assertRaises(asyncio.CancelledError):
+                await trial
+
+        with patch('httpx.AsyncClient.get', side_effect=slow_get):
+            async_to_sync(cancel_trial)()
+
+        self.assertEqual(breaker.stats()['state'], "half_open")
+        self.assertTrue(breaker.allow())
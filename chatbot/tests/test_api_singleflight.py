@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from chatbot.api.singleflight import SingleFlight, AsyncSingleFlight
+from chatbot.api.transactional import Account, AsyncAccount
+
+
+class TestSingleFlight(SimpleTestCase):
+    callers = 10
+
+    def slow_call(self):
+        self.call_count += 1
+        time.sleep(0.1)
+        return {"status": "success"}
+
+    def setUp(self) -> None:
+        self.call_count = 0
+
+    def test_concurrent_calls_coalesced(self):
+        print()
+        print("Testing that identical concurrent calls are run once, sharing the result.")
+
+        single_flight = SingleFlight()
+        barrier = threading.Barrier(self.callers)
+
+        def call():
+            barrier.wait()
+            return single_flight.do("key", self.slow_call)
+
+        with ThreadPoolExecutor(self.callers) as executor:
+            results = list(executor.map(lambda _: call(), range(self.callers)))
+
+        self.assertEqual(self.call_count, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(single_flight.stats(), {'calls': 1, 'coalesced': self.callers - 1})
+
+    def test_exception_shared(self):
+        print()
+        print("Testing that waiters get the exception raised by the call.")
+
+        single_flight = SingleFlight()
+        started = threading.Event()
+
+        def failing_call():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError("failed")
+
+        with ThreadPoolExecutor(2) as executor:
+            leader = executor.submit(single_flight.do, "key", failing_call)
+            started.wait()
+            waiter = executor.submit(single_flight.do, "key", self.slow_call)
+
+            self.assertRaises(ValueError, leader.result)
+            self.assertRaises(ValueError, waiter.result)
+
+        self.assertEqual(self.call_count, 0)
+
+    def test_sequential_calls_not_coalesced(self):
+        print()
+        print("Testing that calls are not shared once they are finished.")
+
+        single_flight = SingleFlight()
+        single_flight.do("key", self.slow_call)
+        single_flight.do("key", self.slow_call)
+
+        self.assertEqual(self.call_count, 2)
+
+    def test_async_concurrent_calls_coalesced(self):
+        print()
+        print("Testing that identical concurrent coroutines are run once, sharing the result.")
+
+        single_flight = AsyncSingleFlight()
+
+        async def slow_call():
+            self.call_count += 1
+            await asyncio.sleep(0.1)
+            return {"status": "success"}
+
+        async def gather():
+            return await asyncio.gather(*(single_flight.do("key", slow_call) for _ in range(self.callers)))
+
+        results = async_to_sync(gather)()
+
+        self.assertEqual(self.call_count, 1)
+        self.assertEqual(len(results), self.callers)
+
+    def test_async_leader_cancelled(self):
+        print()
+        print("Testing that cancelling the first coroutine of a key doesn't cancel the ones waiting for it.")
+
+        single_flight = AsyncSingleFlight()
+
+        async def slow_call():
+            self.call_count += 1
+            await asyncio.sleep(0.1)
+            return {"status": "success"}
+
+        async def cancel_leader():
+            leader = asyncio.create_task(single_flight.do("key", slow_call))
+            await asyncio.sleep(0)
+            followers = [asyncio.create_task(single_flight.do("key", slow_call)) for _ in range(self.callers)]
+            await asyncio.sleep(0.01)
+
+            leader.cancel()
+            results = await asyncio.gather(*followers)
+
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+
+            return results
+
+        results = async_to_sync(cancel_leader)()
+
+        self.assertEqual(results, [{"status": "success"}] * self.callers)
+        self.assertEqual(self.call_count, 1)
+        self.assertEqual(single_flight.stats(), {'calls': 1, 'coalesced': self.callers})
+
+    def test_async_exception_shared(self):
+        print()
+        print("Testing that the exception of a coalesced coroutine is raised to all of its waiters.")
+
+        single_flight = AsyncSingleFlight()
+
+        async def failing_call():
+            self.call_count += 1
+            await asyncio.sleep(0.05)
+            raise ValueError("upstream down")
+
+        async def gather():
+            return await asyncio.gather(*(single_flight.do("key", failing_call) for _ in range(self.callers)),
+                                        return_exceptions=True)
+
+        results = async_to_sync(gather)()
+
+        self.assertEqual(self.call_count, 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+
+class TestApiCoalescing(SimpleTestCase):
+    callers = 10
+    json = {"status": "success", "accounts": []}
+
+    def slow_get(self, *args, **kwargs):
+        time.sleep(0.1)
+        response = MagicMock(status_code=200)
+        response.json.return_value = self.json
+        return response
+
+    async def async_slow_get(self, *args, **kwargs):
+        await asyncio.sleep(0.1)
+        response = MagicMock(status_code=200)
+        response.json.return_value = self.json
+        return response
+
+    def test_identical_requests(self):
+        print()
+        print("Testing that identical concurrent Api requests share a single upstream request.")
+
+        with patch('requests.Session.get', side_effect=self.slow_get) as mock_get, \
+                ThreadPoolExecutor(self.callers) as executor:
+            results = list(executor.map(lambda _: Account("api_key", "key").successful_json(), range(self.callers)))
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(results, [self.json] * self.callers)
+
+    def test_different_requests(self):
+        print()
+        print("Testing that concurrent Api requests with different keys are not shared.")
+
+        with patch('requests.Session.get', side_effect=self.slow_get) as mock_get, \
+                ThreadPoolExecutor(self.callers) as executor:
+            list(executor.map(lambda i: Account("api_key", f"key{i}").successful_json(), range(self.callers)))
+
+        self.assertEqual(mock_get.call_count, self.callers)
+
+    def test_identical_async_requests(self):
+        print()
+        print("Testing that identical concurrent async Api requests share a single upstream request.")
+
+        async def gather():
+            return await asyncio.gather(*(AsyncAccount("api_key", "key").successful_json()
+                                          for _ in range(self.callers)))
+
+        with patch('httpx.AsyncClient.get', side_effect=self.async_slow_get) as mock_get:
+            results = async_to_sync(gather)()
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(results, [self.json] * self.callers)
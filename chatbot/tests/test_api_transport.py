@@ -0,0 +1,110 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.transport import AsyncTransport, Transport
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    """
+    Sets a cookie, and answers the cookies received
+    """
+
+    def do_GET(self):
+        body = (self.headers.get('Cookie') or "").encode()
+
+        self.send_response(200)
+        self.send_header('Set-Cookie', "user=1; Path=/")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTransport(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.transport = Transport(pool_connections=2, pool_maxsize=5, pool_block=True)
+
+    def tearDown(self) -> None:
+        self.transport.close()
+
+    @parameterized.expand([
+        ("https://example.com/provider/", "https://example.com/account/1/movement/?key=abc"),
+        ("https://example.com/", "https://example.com/login/"),
+    ])
+    def test_session_shared_per_origin(self, url1, url2):
+        print()
+        print("Testing that urls with the same origin share a session.")
+        print("urls:", url1, url2)
+
+        self.assertIs(self.transport.session(url1), self.transport.session(url2))
+
+    @parameterized.expand([
+        ("https://example.com/provider/", "https://other.com/provider/"),
+        ("https://example.com/provider/", "http://example.com/provider/"),
+    ])
+    def test_session_per_origin(self, url1, url2):
+        print()
+        print("Testing that urls with different origins use different sessions.")
+        print("urls:", url1, url2)
+
+        self.assertIsNot(self.transport.session(url1), self.transport.session(url2))
+
+    def test_pool_settings(self):
+        print()
+        print("Testing that the pool settings are applied to the session adapters.")
+
+        adapter = self.transport.session("https://example.com/").get_adapter("https://example.com/")
+
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 5)
+        self.assertTrue(adapter._pool_block)
+
+
+class TestCookies(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), CookieHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_session_without_cookies(self):
+        print()
+        print("Testing that the shared session doesn't send the cookies set for another request.")
+
+        transport = Transport()
+        session = transport.session(self.url)
+
+        self.assertEqual(session.get(self.url).text, "")
+        self.assertEqual(session.get(self.url).text, "")
+        self.assertEqual(len(session.cookies), 0)
+        transport.close()
+
+    def test_client_without_cookies(self):
+        print()
+        print("Testing that the shared async client doesn't send the cookies set for another request.")
+
+        transport = AsyncTransport()
+
+        async def requests():
+            client = transport.client(self.url)
+            bodies = [(await client.get(self.url)).text for _ in range(2)]
+            cookies = len(client.cookies.jar)
+            await transport.aclose()
+            return bodies, cookies
+
+        self.assertEqual(async_to_sync(requests)(), (["", ""], 0))
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.api import ApiException
+from chatbot.api.windows import AsyncWindowedMovements, WindowedMovements, month_windows
+
+
+class FakeMovements:
+    """
+    Movement request of a window, with one movement per day and a duplicate of the first day of the window
+    """
+    failing = set()
+
+    def __init__(self, date_start, date_end):
+        self.date_start = date_start
+        self.date_end = date_end
+
+    def movements(self):
+        if self.date_start.month in self.failing:
+            raise ApiException("The bank is not responding at the moment...", status=504)
+
+        days = [datetime(self.date_start.year, self.date_start.month, day)
+                for day in range(self.date_start.day, self.date_end.day + 1)]
+        # Unordered, with the first movement of the previous window repeated
+        return [{'id': f"{day:%Y%m%d}", 'date': f"{day:%d/%m/%Y}"} for day in reversed(days)] + [{'id': "20220101"}]
+
+    def successful_items(self):
+        yield from self.movements()
+
+
+class AsyncFakeMovements(FakeMovements):
+    async def successful_items(self):
+        for movement in self.movements():
+            yield movement
+
+
+class TestMonthWindows(SimpleTestCase):
+
+    @parameterized.expand([
+        (datetime(2022, 7, 5), datetime(2022, 7, 20), 1, [("05/07/2022", "20/07/2022")]),
+        (datetime(2022, 11, 15), datetime(2023, 1, 10), 1,
+         [("15/11/2022", "30/11/2022"), ("01/12/2022", "31/12/2022"), ("01/01/2023", "10/01/2023")]),
+        (datetime(2022, 1, 31), datetime(2022, 3, 31), 1,
+         [("31/01/2022", "31/01/2022"), ("01/02/2022", "28/02/2022"), ("01/03/2022", "31/03/2022")]),
+        (datetime(2022, 1, 1), datetime(2022, 12, 31), 6, [("01/01/2022", "30/06/2022"), ("01/07/2022", "31/12/2022")]),
+    ])
+    def test_month_windows(self, date_start, date_end, months, expected_windows):
+        print()
+        print("Testing the windows from", date_start, "to", date_end, "of", months, "months")
+
+        windows = [(start.strftime("%d/%m/%Y"), end.strftime("%d/%m/%Y"))
+                   for start, end in month_windows(date_start, date_end, months)]
+
+        self.assertEqual(windows, expected_windows)
+
+
+class TestWindowedMovements(SimpleTestCase):
+
+    def tearDown(self) -> None:
+        FakeMovements.failing = set()
+
+    @staticmethod
+    def collect(windowed):
+        if isinstance(windowed, AsyncWindowedMovements):
+            async def collect():
+                return [movement async for movement in windowed.movements()]
+
+            return async_to_sync(collect)()
+
+        return list(windowed.movements())
+
+    @parameterized.expand([(WindowedMovements, FakeMovements), (AsyncWindowedMovements, AsyncFakeMovements)])
+    def test_merge(self, windowed_class, api_class):
+        print()
+        print("Testing that", windowed_class.__name__, "merges the windows in date order without duplicates.")
+
+        windowed = windowed_class(api_class, datetime(2022, 1, 1), datetime(2022, 3, 31))
+        ids = [movement['id'] for movement in self.collect(windowed)]
+
+        self.assertEqual(len(windowed.windows), 3)
+        self.assertEqual(len(ids), 31 + 28 + 31)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(windowed.failures, [])
+
+    @parameterized.expand([(WindowedMovements, FakeMovements), (AsyncWindowedMovements, AsyncFakeMovements)])
+    def test_window_failure(self, windowed_class, api_class):
+        print()
+        print("Testing that", windowed_class.__name__, "reports the failed windows.")
+
+        FakeMovements.failing = {2}
+
+        windowed = windowed_class(api_class, datetime(2022, 1, 1), datetime(2022, 3, 31))
+        movements = self.collect(windowed)
+
+        self.assertEqual(len(movements), 31 + 31)
+        self.assertEqual([(failure.date_start, failure.date_end) for failure in windowed.failures],
+                         [("01/02/2022", "28/02/2022")])
+        self.assertEqual(windowed.failures[0].error.status, 504)
+
+    @parameterized.expand([(WindowedMovements, FakeMovements), (AsyncWindowedMovements, AsyncFakeMovements)])
+    def test_all_windows_failure(self, windowed_class, api_class):
+        print()
+        print("Testing that", windowed_class.__name__, "raises the error if every window failed.")
+
+        FakeMovements.failing = {1, 2}
+
+        windowed = windowed_class(api_class, datetime(2022, 1, 1), datetime(2022, 2, 28))
+
+        self.assertRaises(ApiException, self.collect, windowed)
+
+    def test_window_movements(self):
+        print()
+        print("Testing that the movements are produced window by window, skipping the failed ones.")
+
+        FakeMovements.failing = {2}
+
+        windowed = WindowedMovements(FakeMovements, datetime(2022, 1, 1), datetime(2022, 3, 31))
+        windows = [(start.month, len(movements)) for (start, _), movements in windowed.window_movements()]
+
+        self.assertEqual(windows, [(1, 31), (3, 31)])
+        self.assertEqual(len(windowed.failures), 1)
@@ -0,0 +1,118 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.logs import REDACTED, QueueStreamHandler, SamplingFilter, StructuredFormatter, redact, truncate
+
+
+class TestRedaction(SimpleTestCase):
+
+    @parameterized.expand([
+        ({'X-API-Key': "secret"}, {'X-API-Key': REDACTED}),
+        ({'provider': "test", 'username': "user", 'password': "1234"},
+         {'provider': "test", 'username': "user", 'password': REDACTED}),
+        ({'query': {'key': "session", 'date_start': "01/07/2022"}},
+         {'query': {'key': REDACTED, 'date_start': "01/07/2022"}}),
+        (b'{"status": "logged_in", "key": "session"}', f'{{"status": "logged_in", "key": "{REDACTED}"}}'),
+        (200, 200),
+    ])
+    def test_redact(self, value, expected):
+        print()
+        print("Testing redaction of", value)
+
+        self.assertEqual(redact(value), expected)
+
+    @parameterized.expand([
+        ("abc", 5, "abc"),
+        ("abcdefgh", 5, "abcde... (8 characters)"),
+        ("abcdefgh", 0, "abcdefgh"),
+    ])
+    def test_truncate(self, value, max_length, expected):
+        print()
+        print("Testing truncation of", value, "to", max_length)
+
+        self.assertEqual(truncate(value, max_length), expected)
+
+
+class TestStructuredLogging(SimpleTestCase):
+
+    @staticmethod
+    def record(level, **fields):
+        return logging.makeLogRecord({'name': "chatbot.test", 'levelno': level,
+                                      'levelname': logging.getLevelName(level),
+                                      'msg': "status %s", 'args': (200,), 'fields': fields})
+
+    @parameterized.expand([
+        (0.0, logging.DEBUG, False),
+        (1.0, logging.DEBUG, True),
+        (0.0, logging.WARNING, True),
+    ])
+    def test_sampling(self, rate, level, expected):
+        print()
+        print("Testing sampling at rate", rate, "of", logging.getLevelName(level), "records")
+
+        self.assertEqual(SamplingFilter(rate).filter(self.record(level)), expected)
+
+    def test_format(self):
+        print()
+        print("Testing the JSON format, with secrets redacted and long fields truncated")
+
+        entry = json.loads(StructuredFormatter(max_length=10).format(
+            self.record(logging.DEBUG, headers={'X-API-Key': "secret"}, content=b"x" * 20)))
+
+        self.assertEqual(entry['level'], "DEBUG")
+        self.assertEqual(entry['message'], "status 200")
+        self.assertNotIn("secret", entry['headers'])
+        self.assertEqual(entry['content'], "xxxxxxxxxx... (20 characters)")
+
+    def test_queue_handler(self):
+        print()
+        print("Testing that records are written by the background thread")
+
+        stream = io.StringIO()
+        handler = QueueStreamHandler(stream)
+        handler.setFormatter(StructuredFormatter())
+
+        try:
+            handler.handle(self.record(logging.INFO))
+            handler.flush()
+        finally:
+            handler.close()
+
+        self.assertEqual(json.loads(stream.getvalue())['message'], "status 200")
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "fork is not available")
+    def test_queue_handler_after_fork(self):
+        print()
+        print("Testing that records are written by the background thread in a forked process")
+
+        with tempfile.TemporaryFile("w+") as stream:
+            handler = QueueStreamHandler(stream)
+            handler.setFormatter(StructuredFormatter())
+
+            try:
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        handler.handle(self.record(logging.INFO))
+
+                        # Without flushing, only the background thread writes the record
+                        deadline = time.monotonic() + 5
+                        while not os.fstat(stream.fileno()).st_size and time.monotonic() < deadline:
+                            time.sleep(0.01)
+                    finally:
+                        os._exit(0)
+
+                os.waitpid(pid, 0)
+            finally:
+                handler.close()
+
+            stream.seek(0)
+            self.assertEqual(json.loads(stream.read())['message'], "status 200")
@@ -0,0 +1,142 @@
+import gc
+import ipaddress
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from parameterized import parameterized
+
+from chatbot import metrics
+from chatbot.api.meta import Provider
+from chatbot.api.cache import meta_cache
+from chatbot.metrics import Counter, Histogram, Metric, Registry
+
+
+class TestMetrics(SimpleTestCase):
+
+    def test_counter_threads(self):
+        print()
+        print("Testing that counters add the increments of every thread.")
+
+        counter = Counter("test", "Test counter", labels=("endpoint",))
+
+        def increment():
+            for _ in range(1000):
+                counter.inc("Provider")
+
+        threads = [threading.Thread(target=increment) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.totals(), {("Provider",): 8000})
+
+    def test_ended_threads_folded(self):
+        print()
+        print("Testing that the values of ended threads are kept, without keeping a shard per thread.")
+
+        counter = Counter("test", "Test counter")
+        histogram = Histogram("test", "Test histogram", buckets=(1,))
+
+        def update():
+            counter.inc()
+            histogram.observe(0.5)
+
+        for _ in range(50):
+            thread = threading.Thread(target=update)
+            thread.start()
+            thread.join()
+            del thread
+        gc.collect()
+
+        self.assertEqual(counter.totals(), {(): 50})
+        self.assertEqual(histogram.totals(), {(): [[50, 0], 25.0]})
+        self.assertEqual(len(counter._shards), 0)
+        self.assertEqual(len(histogram._shards), 0)
+
+        update()
+        self.assertEqual(counter.totals(), {(): 51})
+        self.assertEqual(len(counter._shards), 1)
+
+    def test_metric_abstract(self):
+        print()
+        print("Testing that a metric must define its samples.")
+
+        self.assertRaises(TypeError, Metric, "test", "Test metric")
+
+    @parameterized.expand([
+        (0.1, '_bucket{le="0.1"} 1'),
+        (0.5, '_bucket{le="0.1"} 0'),
+        (0.5, '_bucket{le="1"} 1'),
+        (5, '_bucket{le="+Inf"} 1'),
+        (0.5, '_sum 0.5'),
+        (0.5, '_count 1'),
+    ])
+    def test_histogram(self, value, expected_sample):
+        print()
+        print("Testing the histogram samples of", value)
+
+        histogram = Histogram("test", "Test histogram", buckets=(0.1, 1))
+        histogram.observe(value)
+
+        self.assertIn(f"test{expected_sample}\n", histogram.render() + "\n")
+
+    def test_render(self):
+        print()
+        print("Testing the Prometheus text format of the registry.")
+
+        registry = Registry()
+        registry.counter("test_requests", "Test requests", labels=("status",)).inc('2"00')
+        registry.register_collector("test_size", "Test size", lambda: [(("cache",), 3)], labels=("name",))
+
+        self.assertEqual(registry.render(), '# HELP test_requests Test requests\n'
+                                            '# TYPE test_requests counter\n'
+                                            'test_requests_total{status="2\\"00"} 1\n'
+                                            '# HELP test_size Test size\n'
+                                            '# TYPE test_size gauge\n'
+                                            'test_size{name="cache"} 3\n')
+
+
+@patch('requests.Session.get')
+class TestMetricsView(SimpleTestCase):
+
+    def setUp(self) -> None:
+        meta_cache.clear()
+        metrics.registry.clear()
+
+    def test_api_metrics(self, mock_response):
+        print()
+        print("Testing that Api requests are exposed in the metrics view.")
+
+        mock_response.return_value.status_code = 200
+        mock_response.return_value.content = b"x" * 100
+        mock_response.return_value.json.return_value = {"status": "success", "providers": []}
+
+        Provider("api_key").successful_json()
+
+        response = self.client.get(reverse('chatbot:metrics'))
+        content = response.content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('chatbot_api_responses_total{endpoint="Provider",status="200"} 1', content)
+        self.assertIn('chatbot_api_response_size_bytes_sum{endpoint="Provider"} 100', content)
+        self.assertIn('chatbot_api_request_duration_seconds_count{endpoint="Provider"} 1', content)
+        self.assertIn('chatbot_meta_cache{stat="size"} 1', content)
+
+    @parameterized.expand([
+        ("127.0.0.1", 200),
+        ("10.0.0.7", 403),
+        ("10.1.0.7", 200),
+        ("unknown", 403),
+    ])
+    def test_allowed_addresses(self, mock_response, address, expected_status):
+        print()
+        print("Testing the metrics view from", address)
+
+        with patch.object(metrics, 'allowed_networks', [ipaddress.ip_network("127.0.0.1"),
+                                                         ipaddress.ip_network("10.1.0.0/16")]):
+            response = self.client.get(reverse('chatbot:metrics'), REMOTE_ADDR=address)
+
+        self.assertEqual(response.status_code, expected_status)
@@ -0,0 +1,97 @@
+import pickle
+from collections import deque
+
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.models import BotMessage, MessageHistory, MessageStream, UserMessage
+
+
+class TestMessageHistory(SimpleTestCase):
+    table = "".join(f'<div class="item link" name="{i}"><div class="key">Detail:</div>'
+                    f'<div class="value">Movement {i}</div></div>' for i in range(100))
+
+    def test_ring_buffer(self):
+        print()
+        print("Testing that only the last max_messages messages are kept")
+
+        history = MessageHistory()
+        for i in range(history.max_messages + 10):
+            history.add(UserMessage(f"message {i}"))
+
+        messages = list(history.messages())
+
+        self.assertEqual(len(history), history.max_messages)
+        self.assertEqual(history.total, history.max_messages + 10)
+        self.assertEqual(messages[0], {"sender": "user", "content": "message 10"})
+        self.assertEqual(messages[-1], {"sender": "user", "content": f"message {history.max_messages + 9}"})
+
+    def test_compact(self):
+        print()
+        print("Testing that long contents are compressed, and read back unchanged")
+
+        history = MessageHistory()
+        history.add(UserMessage("account 123 movements july"))
+        history.add(BotMessage(self.table))
+
+        self.assertIsInstance(history.message_history[1][1], bytes)
+        self.assertLess(len(history.message_history[1][1]), len(self.table) / 4)
+        self.assertEqual(list(history.messages()), [{"sender": "user", "content": "account 123 movements july"},
+                                                    {"sender": "bot", "content": self.table}])
+
+    def test_pickle(self):
+        print()
+        print("Testing that the history is pickled compactly and restored")
+
+        history = MessageHistory()
+        for i in range(20):
+            history.add(UserMessage(f"message {i}"))
+            history.add(BotMessage(self.table))
+
+        restored = pickle.loads(pickle.dumps(history))
+
+        self.assertEqual(list(restored.messages()), list(history.messages()))
+        self.assertEqual(restored.total, history.total)
+        self.assertEqual(restored.message_history.maxlen, history.max_messages)
+        self.assertLess(len(pickle.dumps(history)), 20 * len(self.table) / 4)
+
+    def test_slots(self):
+        print()
+        print("Testing that messages don't have a __dict__")
+
+        self.assertFalse(hasattr(BotMessage("hi"), "__dict__"))
+        self.assertFalse(hasattr(MessageHistory(), "__dict__"))
+
+    @parameterized.expand([
+        (None, [40, 41, 42, 43, 44], 40),
+        (40, [35, 36, 37, 38, 39], 35),
+        (12, [10, 11], None),
+        (3, [], None),
+        (100, [40, 41, 42, 43, 44], 40),
+    ])
+    def test_page(self, before, expected_sequences, expected_cursor):
+        print()
+        print("Testing the page of the history before", before)
+
+        history = MessageHistory()
+        history.message_history = deque(maxlen=35)
+        for i in range(45):
+            history.add(UserMessage(f"message {i}"))
+
+        messages, cursor = history.page(before, size=5)
+
+        self.assertEqual([message["sequence"] for message in messages], expected_sequences)
+        self.assertEqual([message["content"] for message in messages], [f"message {i}" for i in expected_sequences])
+        self.assertEqual(cursor, expected_cursor)
+
+
+class TestMessageStream(SimpleTestCase):
+
+    def test_chunks(self):
+        print()
+        print("Testing that the parts of a message are sent in chunks of at most chunk_rows lines")
+
+        stream = MessageStream(iter([[f"row {i}" for i in range(5)], [], ["row 5"], ["note"]]))
+        stream.chunk_rows = 2
+
+        self.assertEqual(list(stream.chunks()), ["row 0\nrow 1", "row 2\nrow 3", "row 4", "row 5", "note"])
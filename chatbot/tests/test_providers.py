@@ -0,0 +1,85 @@
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.providers import ProviderIndex, ProviderIndexes, catalog_key, trigrams
+
+
+providers = [
+    {'code': "santander_uy", 'name': "Banco Santander", 'country': "UY"},
+    {'code': "itau_uy", 'name': "Itaú", 'country': "UY"},
+    {'code': "itau_br", 'name': "Itaú", 'country': "BR"},
+    {'code': "test", 'name': "Test Bank", 'country': "UY"},
+    {'code': "hipotecario", 'name': "Banco Hipotecario", 'country': "UY"},
+    {'code': "brou", 'name': "BROU", 'country': "UY"},
+]
+
+
+class TestProviderIndex(SimpleTestCase):
+
+    @parameterized.expand([
+        ("banco santander", "santander_uy"),
+        ("itau", "itau_uy"),
+        ("test bank", "test"),
+        ("banco", None),
+        ("hi", None),
+    ])
+    def test_code(self, normalized_name, expected_code):
+        print()
+        print("Testing the provider code of the normalized name", normalized_name)
+
+        self.assertEqual(ProviderIndex(providers).code(normalized_name), expected_code)
+
+    @parameterized.expand([
+        ("banco santader", ["Banco Santander"]),
+        ("itau", ["Itaú"]),
+        ("banco hipotecaro", ["Banco Hipotecario"]),
+        ("banco", ["Banco Santander", "Banco Hipotecario"]),
+        ("tst bank", ["Test Bank"]),
+        ("hi", []),
+        ("what can you do?", []),
+        ("", []),
+    ])
+    def test_similar(self, normalized_string, expected_names):
+        print()
+        print("Testing the providers with names similar to", normalized_string)
+
+        self.assertEqual(ProviderIndex(providers).similar(normalized_string), expected_names)
+
+    def test_similar_limit(self):
+        print()
+        print("Testing that at most max_candidates providers are suggested, the best first")
+
+        index = ProviderIndex(providers)
+        index.max_candidates = 1
+
+        self.assertEqual(index.similar("banco"), ["Banco Santander"])
+
+    def test_trigrams(self):
+        print()
+        print("Testing the trigrams of each word of a string")
+
+        self.assertEqual(trigrams("ab, c"), {"  a", " ab", "ab ", "  c", " c "})
+
+    def test_catalog_key(self):
+        print()
+        print("Testing that the catalog key depends only on the names and codes of the providers")
+
+        self.assertEqual(catalog_key(providers), catalog_key([dict(provider) for provider in providers]))
+        self.assertNotEqual(catalog_key(providers), catalog_key(providers[:-1]))
+        self.assertNotEqual(catalog_key(providers), catalog_key(providers[::-1]))
+
+    def test_shared(self):
+        print()
+        print("Testing that catalogs are indexed once, and the least recently used is evicted when full")
+
+        indexes = ProviderIndexes(max_size=2)
+        index = indexes.get("a", providers)
+
+        self.assertIs(indexes.get("a", []), index)
+
+        indexes.get("b", providers[:1])
+        indexes.get("a", [])
+        indexes.get("c", providers[:2])
+
+        self.assertIs(indexes.get("a", []), index)
+        self.assertIsNone(indexes.get("b", []).code("banco santander"))
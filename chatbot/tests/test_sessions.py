@@ -0,0 +1,142 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.sessions.backends.base import UpdateError
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.api.movement_store import MovementStore
+from chatbot.models import BotMessage, MessageHistory, UserMessage
+from chatbot.sessions import SessionDatabase, SessionStore, TrackedDict
+
+
+class TestSessionStore(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = SessionDatabase(os.path.join(self.directory.name, "sessions.sqlite3"))
+        self.store_class = type("TestStore", (SessionStore,), {'database': self.database})
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        print()
+        print("Testing that the objects of the session are saved and loaded back")
+
+        history = MessageHistory()
+        history.add(BotMessage("Hi!"))
+
+        session = self.store_class()
+        session['cache'] = {'api-key': "key", 'movement_stores': {"account": MovementStore()}}
+        session['message_history'] = history
+        session.save()
+
+        loaded = self.store_class(session.session_key)
+
+        self.assertEqual(loaded['cache']['api-key'], "key")
+        self.assertIsInstance(loaded['cache']['movement_stores']['account'], MovementStore)
+        self.assertEqual(list(loaded['message_history'].messages()), [{"sender": "bot", "content": "Hi!"}])
+
+    def test_shared(self):
+        print()
+        print("Testing that a session saved by a connection is seen by another one")
+
+        session = self.store_class()
+        session['cache'] = {'api-key': "key"}
+        session.save()
+
+        loaded = {}
+        thread = threading.Thread(target=lambda: loaded.update(self.store_class(session.session_key)['cache']))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(loaded, {'api-key': "key"})
+
+    def test_update_deleted(self):
+        print()
+        print("Testing that a session deleted by another request is not saved again")
+
+        session = self.store_class()
+        session['cache'] = {}
+        session.save()
+
+        self.store_class(session.session_key).delete()
+        session['cache']['api-key'] = "key"
+
+        with self.assertRaises(UpdateError):
+            session.save()
+
+    def test_expiry(self):
+        print()
+        print("Testing that expired sessions are not loaded, and are swept")
+
+        session = self.store_class()
+        session['cache'] = {}
+        session.save()
+
+        expired_at = time.time() + session.get_expiry_age() + 1
+
+        self.assertIsNone(self.database.load(session.session_key, now=expired_at))
+        self.assertTrue(self.database.insert(session.session_key, b"", expired_at + 600, now=expired_at))
+
+        self.assertEqual(self.database.sweep(now=expired_at + 601), 1)
+        self.assertFalse(self.store_class().exists(session.session_key))
+
+    def saved_session(self) -> str:
+        history = MessageHistory()
+        history.add(BotMessage("Hi!"))
+
+        session = self.store_class()
+        session['cache'] = {'api-key': "key", 'provider_session': {'provider': {'name': "test"}}}
+        session['message_history'] = history
+        session.save()
+
+        return session.session_key
+
+    def test_unchanged(self):
+        print()
+        print("Testing that a session only read is not modified, and is stored without tracking")
+
+        session = self.store_class(self.saved_session())
+        provider_session = session['cache']['provider_session']
+
+        self.assertIsInstance(provider_session, TrackedDict)
+        self.assertEqual(provider_session.get('key'), None)
+        self.assertFalse(session.modified)
+        self.assertNotIn(b"TrackedDict", self.database.load(session.session_key)[0])
+
+    @parameterized.expand([
+        ("provider session key", lambda session: session['cache']['provider_session'].update(key="k")),
+        ("nested dict", lambda session: session['cache']['provider_session']['provider'].pop('name')),
+        ("setdefault", lambda session: session['cache']['provider_session'].setdefault('movements', {})),
+        ("message history", lambda session: session['message_history'].add(UserMessage("banks"))),
+    ])
+    def test_changed_in_place(self, name, change):
+        print()
+        print("Testing that a change in place of the", name, "modifies the session")
+
+        key = self.saved_session()
+        session = self.store_class(key)
+        change(session)
+
+        self.assertTrue(session.modified)
+        session.save()
+
+        self.assertFalse(self.store_class(key).modified)
+
+    def test_touch(self):
+        print()
+        print("Testing that the expiry of a session read is refreshed once it's touch_interval behind")
+
+        key = self.saved_session()
+        _, expires = self.database.load(key)
+        age = self.store_class().get_expiry_age()
+
+        self.database.touch(key, expires, age, now=expires - age + self.database.touch_interval - 1)
+        self.assertEqual(self.database.load(key)[1], expires)
+
+        self.database.touch(key, expires, age, now=expires - age + self.database.touch_interval)
+        self.assertEqual(self.database.load(key)[1], expires + self.database.touch_interval)
@@ -0,0 +1,60 @@
+from datetime import date
+
+from django.test import SimpleTestCase
+from parameterized import parameterized
+
+from chatbot.summary import MovementColumns
+
+
+def day(day_string):
+    return date(*reversed([int(part) for part in day_string.split("/")])).toordinal()
+
+
+class TestMovementColumns(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.columns = MovementColumns([
+            (day("30/12/2021"), [{'id': "a", 'debit': 10.5, 'credit': ""}]),
+            (day("05/01/2022"), [{'id': "b", 'debit': "", 'credit': 100},
+                                 {'id': "c", 'debit': "40", 'credit': None}]),
+            (day("31/01/2022"), [{'id': "d", 'debit': 100.0, 'credit': ""}]),
+            (day("01/03/2022"), [{'id': "e", 'credit': "not a number"},
+                                 {'id': "f", 'debit': 0, 'credit': 7.25}]),
+        ])
+
+    def test_totals(self):
+        print()
+        print("Testing the totals and the net flow, with missing and invalid amounts as 0")
+
+        self.assertEqual(len(self.columns), 6)
+        self.assertEqual(self.columns.total_debit, 150.5)
+        self.assertEqual(self.columns.total_credit, 107.25)
+        self.assertEqual(self.columns.net_flow, -43.25)
+
+    def test_monthly(self):
+        print()
+        print("Testing the totals per month, only of the months with movements")
+
+        self.assertEqual(self.columns.monthly(), [(2021, 12, 10.5, 0), (2022, 1, 140, 100), (2022, 3, 0, 7.25)])
+
+    @parameterized.expand([
+        (2, ["b", "d"]),
+        (4, ["b", "d", "c", "a"]),
+        (10, ["b", "d", "c", "a", "f", "e"]),
+    ])
+    def test_largest(self, n, expected_ids):
+        print()
+        print("Testing the", n, "largest movements, the earliest first on ties")
+
+        self.assertEqual([movement['id'] for movement in self.columns.largest(n)], expected_ids)
+
+    def test_largest_across_blocks(self):
+        print()
+        print("Testing the largest movements spread across blocks of the columns")
+
+        movements = [{'id': i, 'debit': float(i % 1000), 'credit': ""} for i in range(5000)]
+        columns = MovementColumns([(day("01/01/2022"), movements)])
+        columns.block_size = 64
+
+        self.assertEqual([movement['id'] for movement in columns.largest(6)], [999, 1999, 2999, 3999, 4999, 998])
+        self.assertEqual(MovementColumns([]).largest(5), [])
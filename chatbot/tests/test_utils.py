@@ -1,10 +1,15 @@
-from datetime import datetime
+from datetime import date, datetime
 
 from dateutil.relativedelta import relativedelta
+import re
+import sys
+
 from django.test import SimpleTestCase
+from django.utils import translation
 from parameterized import parameterized
 
 import chatbot.utils as utils
+from chatbot.models import MessageProcessor
 
 
 class TestDateProcessor(SimpleTestCase):
@@ -43,6 +48,129 @@ class TestDateProcessorEs(TestDateProcessor):
     language = 'es'
 
 
+class TestFastDateParser(SimpleTestCase):
+
+    @parameterized.expand([
+        ('en', "july"), ('en', "july 2022"), ('en', "jan"), ('en', "sept 2021"), ('en', "2021"),
+        ('en', "01/02/2022"), ('en', "12/31/1999"), ('en', "from july to september"), ('en', "december to january"),
+        ('en', "from 01/01/2022 to 03/31/2022"), ('en', "01/01/2022 03/31/2022"), ('en', "march 2022 to may 2022"),
+        ('en', "2020 - 2021"),
+        ('es', "julio"), ('es', "julio 2022"), ('es', "marzo de 2022"), ('es', "setiembre"), ('es', "2021"),
+        ('es', "01/02/2022"), ('es', "31/12/1999"), ('es', "del 01/01/2022 al 31/03/2022"),
+        ('es', "desde diciembre hasta enero"), ('es', "enero 2020 al marzo de 2021"),
+        ('es', TestDateProcessor.past_date),
+        ('es', f"{TestDateProcessor.past_date} al {TestDateProcessor.present_date}"),
+    ])
+    def test_same_as_dateparser(self, language, date_string):
+        print()
+        print(f"Testing that the fast path gets the same dates as dateparser, with date string '{date_string}' "
+              f"in language {language}")
+
+        date_range = utils.fast_date_parser(language).date_range(date_string)
+        if datetime.utcnow().day > 28 and date_string in ("from july to september", "december to january",
+                                                           "desde diciembre hasta enero"):
+            self.assertIsNone(date_range)
+            return
+
+        self.assertIsNotNone(date_range)
+        self.assertEqual(date_range, utils.DateProcessor(language, fast_path=False).get_date_range(date_string))
+
+    @parameterized.expand([
+        ('en', "july 5"), ('en', "last week"), ('en', "31/12/1999"), ('en', "01/02/2022 july 2022"), ('en', "july "),
+        ('es', "julio a septiembre"), ('es', "01/01/2022 31/03/2022"), ('es', "12/31/1999"), ('es', "5 de julio"),
+    ])
+    def test_undecided(self, language, date_string):
+        print()
+        print(f"Testing that the fast path leaves to dateparser the date string '{date_string}' in language {language}")
+
+        self.assertIsNone(utils.fast_date_parser(language).date_range(date_string))
+
+    def test_warm_up(self):
+        print()
+        print("Testing that the warm up loads the parsers of the languages")
+
+        utils.cached_date_parser.cache_clear()
+        utils.warm_up_dates(['en', 'es'])
+
+        self.assertEqual(utils.cached_date_parser.cache_info().currsize, 2)
+        self.assertIn('dateparser.search', sys.modules)
+
+    def test_parser_pool(self):
+        print()
+        print("Testing that date parsers are shared by language and relative base day")
+
+        self.assertIs(utils.DateProcessor('es').date_parser, utils.DateProcessor('es').date_parser)
+        self.assertIsNot(utils.DateProcessor('es').date_parser, utils.DateProcessor('en').date_parser)
+        relative_day = date(2022, 7, 31)
+        self.assertIs(utils.cached_date_parser('es', relative_day), utils.cached_date_parser('es', relative_day))
+
+        utils.cached_date_parser.cache_clear()
+        for hour in range(24):
+            utils.DateProcessor('es').get_start_date("junio", datetime(2022, 7, 31, hour, 30))
+
+        self.assertEqual(utils.cached_date_parser.cache_info().currsize, 1)
+
+
+class TestDateRangeMemo(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.memo = utils.DateRangeMemo(max_size=2)
+        self.resolved = []
+
+    def resolve(self, phrase):
+        def resolve():
+            self.resolved.append(phrase)
+            if phrase == "invalid":
+                raise utils.BotException("Invalid dates")
+
+            return datetime(2022, 7, 1), datetime(2022, 7, 31)
+
+        return resolve
+
+    def test_hits(self):
+        print()
+        print("Testing that phrases are resolved once per language")
+
+        for language, phrase in [('en', "july"), ('en', "july"), ('es', "july"), ('en', "july")]:
+            self.assertEqual(self.memo.get(language, phrase, self.resolve(phrase)),
+                             (datetime(2022, 7, 1), datetime(2022, 7, 31)))
+
+        self.assertEqual(self.resolved, ["july", "july"])
+        self.assertEqual(self.memo.stats(), {'size': 2, 'hits': 2, 'misses': 2, 'hit_ratio': 0.5})
+
+    def test_exception(self):
+        print()
+        print("Testing that the BotException of an invalid phrase is memoized too")
+
+        for _ in range(2):
+            with self.assertRaises(utils.BotException) as context:
+                self.memo.get('en', "invalid", self.resolve("invalid"))
+
+            self.assertEqual(context.exception.message, "Invalid dates")
+
+        self.assertEqual(self.resolved, ["invalid"])
+
+    def test_lru(self):
+        print()
+        print("Testing that the least recently used phrase is evicted when the memo is full")
+
+        for phrase in ["july", "june", "july", "may", "july", "june"]:
+            self.memo.get('en', phrase, self.resolve(phrase))
+
+        self.assertEqual(self.resolved, ["july", "june", "may", "june"])
+
+    def test_day_rollover(self):
+        print()
+        print("Testing that the memo is cleared when the day changes")
+
+        self.memo.get('en', "july", self.resolve("july"))
+        self.memo.today = lambda: (date(2099, 1, 1), date(2099, 1, 1))
+        self.memo.get('en', "july", self.resolve("july"))
+
+        self.assertEqual(self.resolved, ["july", "july"])
+        self.assertEqual(self.memo.stats()['size'], 1)
+
+
 class TestActionSelector(SimpleTestCase):
 
     def action_true(self):
@@ -141,3 +269,90 @@ class TestActionSelector(SimpleTestCase):
         self.assertRaises(utils.BotException, utils.ActionSelector(criteria, self.action_groups,
                                                                    self.raise_bot_exception
                                                                    ).act_on, string)
+
+
+class TestIntentRouter(SimpleTestCase):
+    messages = ["hi", "hello, my info please", "logout", "banks", "accounts", "account 123 movements july",
+                "account 123 movements from 01/01/2022 to 31/03/2022", "card 123 movements currency uyu july",
+                "credit cards", "cards 1 movements usd", "hola", "mis datos", "salir", "cuenta 9 movimientos julio",
+                "tarjetas 5 movimientos moneda uyu junio", "account 123 summary last year",
+                "card 4 summary usd july", "cuenta 9 resumen el ano pasado", "account 123 movements containing rent",
+                "movements with uber in 2022", "cuenta 9 movimientos con uber en julio", "nothing\nhi", "", "unknown"]
+
+    @staticmethod
+    def searched(intents, string):
+        """
+        @return
+        the intents matching the string searching their regex one by one, as the cascade did before the router
+        """
+        return [(name, match.groupdict()) for name, match in ((name, re.search(criteria, string))
+                                                              for name, criteria in intents) if match]
+
+    @parameterized.expand([("en",), ("es",)])
+    def test_same_as_search(self, language):
+        print()
+        print("Testing that the router matches the same intents and groups as searching each regex, "
+              "in language", language)
+
+        with translation.override(language):
+            intents = [(intent, regex) for intent, regex, _ in MessageProcessor.intents()]
+
+        router = utils.IntentRouter(intents)
+
+        for message in self.messages:
+            self.assertEqual(list(router.matches(message)), self.searched(intents, message), message)
+
+    def test_priority(self):
+        print()
+        print("Testing that intents are returned in priority order, not in the order they appear in the string")
+
+        router = utils.IntentRouter([("second", "b(?P<x>.)"), ("first", "a(?P<x>.)")])
+
+        self.assertEqual(list(router.matches("a1 b2")), [("second", {"x": "2"}), ("first", {"x": "1"})])
+
+    def test_router_per_language(self):
+        print()
+        print("Testing that the router of each language is built once and reused")
+
+        with translation.override("es"):
+            router = MessageProcessor.router()
+            self.assertIs(MessageProcessor.router(), router)
+            self.assertEqual(next(router[0].matches("hola")), ("greeting", {}))
+
+        with translation.override("en"):
+            self.assertIsNot(MessageProcessor.router(), router)
+            self.assertEqual(next(MessageProcessor.router()[0].matches("hello")), ("greeting", {}))
+
+    @parameterized.expand([
+        ("en", "account 123 summary last year", "account_summary", {'account_number': "123", 'dates': "last year"}),
+        ("en", "card 4 summary usd july", "credit_card_summary",
+         {'card_number': "4", 'currency': "usd", 'dates': "july"}),
+        ("es", "cuenta 9 resumen el ano pasado", "account_summary", {'account_number': "9", 'dates': "el ano pasado"}),
+    ])
+    def test_summary_intent(self, language, message, expected_intent, expected_groups):
+        print()
+        print("Testing that", message, "is routed to", expected_intent)
+
+        with translation.override(language):
+            self.assertEqual(next(MessageProcessor.router()[0].matches(message)), (expected_intent, expected_groups))
+
+    @parameterized.expand([
+        ("en", "account 123 movements containing rent", "account_movement_search",
+         {'account_number': "123", 'terms': "rent", 'dates': None}),
+        ("en", "movements with uber trip in 2022", "movement_search", {'terms': "uber trip", 'dates': "2022"}),
+        ("en", "card 4 movements with uber", "credit_card_movement_search",
+         {'card_number': "4", 'currency': None, 'terms': "uber", 'dates': None}),
+        ("en", "card 4 movements usd containing uber in july", "credit_card_movement_search",
+         {'card_number': "4", 'currency': "usd", 'terms': "uber", 'dates': "july"}),
+        ("es", "tarjeta 4 movimientos moneda uyu con uber", "credit_card_movement_search",
+         {'card_number': "4", 'currency': "uyu", 'terms': "uber", 'dates': None}),
+        ("es", "cuenta 9 movimientos con uber en julio", "account_movement_search",
+         {'account_number': "9", 'terms': "uber", 'dates': "julio"}),
+        ("es", "movimientos que contengan alquiler", "movement_search", {'terms': "alquiler", 'dates': None}),
+    ])
+    def test_search_intent(self, language, message, expected_intent, expected_groups):
+        print()
+        print("Testing that", message, "is routed to", expected_intent)
+
+        with translation.override(language):
+            self.assertEqual(next(MessageProcessor.router()[0].matches(message)), (expected_intent, expected_groups))
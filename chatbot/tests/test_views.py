@@ -0,0 +1,470 @@
+import json
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from django.urls import include, path
+from parameterized import parameterized
+
+from chatbot import urls, views
+from chatbot.api import api
+from chatbot.api.prefetch import prefetcher
+from chatbot.models import MessageHistory, MessageProcessor, MessageStream
+from chatbot.sessions import SessionDatabase, SessionStore
+from chatbot.tests import upstream
+
+
+# The chat with the async views, as with async_views: true
+async_urlpatterns = [
+    path('chat/process_message/', views.process_message_async, name='process_message'),
+    path('chat/provider_login/', views.provider_login_async, name='provider_login'),
+    *urls.urlpatterns,
+]
+urlpatterns = [path('', include((async_urlpatterns, 'chatbot')))]
+
+# The AsyncClient of Django 4.1 takes the headers by their name
+LANGUAGE = {'Accept-Language': "en"}
+AJAX = {**LANGUAGE, 'X-Requested-With': "XMLHttpRequest"}
+
+
+class ViewTestCase(SimpleTestCase):
+    """
+    Views against the fake Prometeo API, with the sessions in a temporary database
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, url = upstream.start()
+        cls.directory = tempfile.TemporaryDirectory()
+
+        cls.patches = [patch.object(api.Api, 'base_url', url),
+                       patch.object(SessionStore, 'database',
+                                    SessionDatabase(os.path.join(cls.directory.name, "sessions.sqlite3")))]
+        for patcher in cls.patches:
+            patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for patcher in cls.patches:
+            patcher.stop()
+
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        upstream.Handler.calls = []
+        upstream.Handler.delay = 0
+        upstream.Handler.login_status = "logged_in"
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestAsyncViews(ViewTestCase):
+
+    async def chat(self, logged_in=True) -> AsyncClient:
+        """
+        @return
+        a client with the chat open, logged in the test bank if logged_in
+        """
+        client = AsyncClient()
+        await self.post(client, "/", {'api_key': "key"}, **LANGUAGE)
+        await client.get("/chat/", **LANGUAGE)
+
+        if logged_in:
+            await self.send(client, "test bank")
+            response = await self.login(client)
+            self.assertEqual(response.status_code, 200)
+
+        return client
+
+    @staticmethod
+    async def post(client, url, data, **extra):
+        """
+        Posts data url encoded, the multipart body of the AsyncClient of Django 4.1 can't be read by the views
+        """
+        return await client.post(url, urlencode(data), content_type="application/x-www-form-urlencoded", **extra)
+
+    async def send(self, client, text):
+        return await self.post(client, "/chat/process_message/", {'text_field': text}, **AJAX)
+
+    async def login(self, client, password="password"):
+        return await self.post(client, "/chat/provider_login/", {'username': "user", 'password': password},
+                               **AJAX)
+
+    async def test_login(self):
+        print()
+        print("Testing the login in a bank with the async views.")
+
+        client = await self.chat(logged_in=False)
+
+        response = await self.send(client, "test bank")
+        self.assertIn('modal-form', response.json())
+
+        response = await self.login(client)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Successfully logged in!", response.json()['message']['content'])
+        self.assertIn(("POST", "/login/"), upstream.Handler.calls)
+
+    async def test_wrong_credentials(self):
+        print()
+        print("Testing that wrong credentials are reported in the login form.")
+
+        client = await self.chat(logged_in=False)
+        await self.send(client, "test bank")
+        upstream.Handler.login_status = "wrong_credentials"
+
+        response = await self.login(client, "wrong")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'modal-feedback': "Wrong credentials!"})
+
+    async def test_movements(self):
+        print()
+        print("Testing the movements of an account with the async views, fetched once.")
+
+        client = await self.chat()
+
+        for _ in range(2):
+            response = await self.send(client, "account 123 movements from 01/01/2022 to 31/01/2022")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['message']['content'].count('class="item link"'), 31)
+
+        self.assertEqual(sum(1 for _, call in upstream.Handler.calls if "/movement" in call), 1)
+
+    async def test_errors(self):
+        print()
+        print("Testing the errors of the async views: not logged in, unknown account, invalid and non AJAX messages.")
+
+        client = await self.chat(logged_in=False)
+        response = await self.send(client, "accounts")
+        self.assertEqual(response.json()['message']['content'], "You must log in first!")
+
+        client = await self.chat()
+        response = await self.send(client, "account 999 movements july 2022")
+        self.assertIn("could not find that account", response.json()['message']['content'])
+
+        response = await self.send(client, "")
+        self.assertEqual(response.status_code, 500)
+
+        response = await self.post(client, "/chat/process_message/", {'text_field': "accounts"},
+                                   **LANGUAGE)
+        self.assertEqual(response.status_code, 400)
+
+        response = await client.get("/chat/process_message/", **AJAX)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_history_saved(self):
+        print()
+        print("Testing that the messages of the async views are saved in the session.")
+
+        client = await self.chat()
+        await self.send(client, "accounts")
+
+        response = await client.get("/chat/history/", {'before': 100}, **AJAX)
+        contents = [message['content'] for message in response.json()['messages']]
+
+        self.assertEqual(contents[-2], "accounts")
+        self.assertIn('name="a1"', contents[-1])
+
+    async def test_prefetched_empty(self):
+        print()
+        print("Testing that empty prefetched accounts and cards are used, not fetched again, with the async views.")
+
+        client = await self.chat()
+        with patch.object(prefetcher, 'atake', return_value=[]):
+            for text in ("accounts", "credit cards", "accounts", "credit cards"):
+                await self.send(client, text)
+
+        self.assertNotIn(("GET", "/account/"), upstream.Handler.calls)
+        self.assertNotIn(("GET", "/credit-card/"), upstream.Handler.calls)
+
+    async def test_search_without_movements(self):
+        print()
+        print("Testing that searching an account without dates before fetching it doesn't leave an empty store.")
+
+        client = await self.chat()
+
+        for text in ("account 123 movements with uber", "card 4444 movements uyu with uber", "movements with uber"):
+            response = await self.send(client, text)
+            self.assertIn("There are no movements to search yet", response.json()['message']['content'])
+
+    async def test_card_movement_search(self):
+        print()
+        print("Testing that a search of the movements of a card only looks at the card, with the async views.")
+
+        client = await self.chat()
+        await self.send(client, "account 123 movements from 01/01/2022 to 01/31/2022")
+
+        response = await self.send(client, "card 4444 movements with uber")
+        self.assertIn("There are no movements to search yet", response.json()['message']['content'])
+
+        response = await self.send(client, "card 4444 movements uyu with uber in january 2022")
+        content = response.json()['message']['content']
+
+        self.assertIn('Movements of card 4444 (UYU) containing "uber": 10', content)
+        self.assertNotIn("Movements of account", content)
+
+    async def test_session_loaded_off_the_loop(self):
+        print()
+        print("Testing that the async views load the session out of the event loop thread.")
+
+        client = await self.chat(logged_in=False)
+        threads = []
+        load = SessionStore.load
+
+        def recording_load(session):
+            threads.append(threading.get_ident())
+            return load(session)
+
+        with patch.object(SessionStore, 'load', recording_load):
+            await self.send(client, "test bank")
+            await self.login(client)
+
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+@patch.object(MessageHistory, 'page_size', 3)
+class TestHistoryView(ViewTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.client.post("/", {'api_key': "key"}, HTTP_ACCEPT_LANGUAGE="en")
+        self.client.get("/chat/", HTTP_ACCEPT_LANGUAGE="en")
+
+        for _ in range(4):
+            self.client.post("/chat/process_message/", {'text_field': "banks"},
+                             HTTP_ACCEPT_LANGUAGE="en", HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def page(self, before):
+        return self.client.get("/chat/history/", {'before': before},
+                               HTTP_ACCEPT_LANGUAGE="en", HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def test_paging(self):
+        print()
+        print("Testing that the history is paged back with the cursors, up to the first message.")
+
+        sequences = []
+        cursor = 1000
+        while cursor is not None:
+            response = self.page(cursor)
+            self.assertEqual(response.status_code, 200)
+
+            page = response.json()
+            self.assertLessEqual(len(page['messages']), 3)
+            sequences = [message['sequence'] for message in page['messages']] + sequences
+            cursor = page['cursor']
+
+        # The welcome message and 4 messages with their answers
+        self.assertEqual(sequences, list(range(9)))
+
+    def test_last_page(self):
+        print()
+        print("Testing that the page with the first message has no cursor, and there's nothing before it.")
+
+        page = self.page(3).json()
+        self.assertEqual([message['sequence'] for message in page['messages']], [0, 1, 2])
+        self.assertIsNone(page['cursor'])
+
+        self.assertEqual(self.page(0).json(), {'messages': [], 'cursor': None})
+
+    @parameterized.expand([
+        ("missing", None),
+        ("not a number", "abc"),
+    ])
+    def test_invalid_cursor(self, name, before):
+        print()
+        print("Testing a history request with a", name, "cursor.")
+
+        data = {} if before is None else {'before': before}
+        response = self.client.get("/chat/history/", data, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_ajax(self):
+        print()
+        print("Testing that the history is only sent to AJAX requests.")
+
+        response = self.client.get("/chat/history/", {'before': 1000})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_history(self):
+        print()
+        print("Testing a history request of a session without a chat.")
+
+        self.client.post("/close/")
+        response = self.page(1000)
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestStreamingViews(ViewTestCase):
+    movements = "account 123 movements from 01/01/2022 to 05/31/2022"
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.client.post("/", {'api_key': "key"}, HTTP_ACCEPT_LANGUAGE="en")
+        self.client.get("/chat/", HTTP_ACCEPT_LANGUAGE="en")
+        self.send("test bank")
+        self.client.post("/chat/provider_login/", {'username': "user", 'password': "password"},
+                         HTTP_ACCEPT_LANGUAGE="en", HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def send(self, text):
+        return self.client.post("/chat/process_message/", {'text_field': text},
+                                HTTP_ACCEPT_LANGUAGE="en", HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    @staticmethod
+    def lines(content):
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def last_messages(self, count):
+        response = self.client.get("/chat/history/", {'before': 1000},
+                                   HTTP_ACCEPT_LANGUAGE="en", HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+        return response.json()['messages'][-count:]
+
+    def test_movements_streamed(self):
+        print()
+        print("Testing that a long movement listing is streamed as NDJSON lines, and saved whole in the history.")
+
+        response = self.send(self.movements)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], "application/x-ndjson")
+
+        lines = self.lines(b"".join(response.streaming_content))
+        self.assertIn('message', lines[0])
+        self.assertTrue(all('append' in line for line in lines[1:]))
+
+        content = "\n".join([lines[0]['message']['content'], *(line['append'] for line in lines[1:])])
+        self.assertEqual(content.count('class="item link"'), 151)
+
+        _, answer = self.last_messages(2)
+        self.assertEqual(answer['content'], content)
+
+    def test_movements_kept(self):
+        print()
+        print("Testing that the movements fetched while streaming are kept in the session.")
+
+        b"".join(self.send(self.movements).streaming_content)
+        calls = len(upstream.Handler.calls)
+
+        response = self.send("account 123 movements from 01/01/2022 to 05/31/2022")
+        b"".join(response.streaming_content)
+
+        self.assertEqual(len(upstream.Handler.calls), calls)
+
+    def test_prefetched_empty(self):
+        print()
+        print("Testing that empty prefetched accounts and cards are used, not fetched again.")
+
+        with patch.object(prefetcher, 'take', return_value=[]):
+            for text in ("accounts", "credit cards", "accounts", "credit cards"):
+                self.send(text)
+
+        self.assertNotIn(("GET", "/account/"), upstream.Handler.calls)
+        self.assertNotIn(("GET", "/credit-card/"), upstream.Handler.calls)
+
+    def test_search_without_movements(self):
+        print()
+        print("Testing that searching an account without dates before fetching it doesn't leave an empty store.")
+
+        for text in ("account 123 movements with uber", "card 4444 movements uyu with uber", "movements with uber"):
+            content = self.send(text).json()['message']['content']
+            self.assertIn("There are no movements to search yet", content)
+
+    def test_card_movement_search(self):
+        print()
+        print("Testing that a search of the movements of a card only looks at the stored movements of the card.")
+
+        b"".join(self.send(self.movements).streaming_content)
+        b"".join(self.send("card 4444 movements uyu from 01/01/2022 to 01/31/2022").streaming_content)
+
+        content = self.send("card 4444 movements with uber").json()['message']['content']
+        self.assertIn('Movements of card 4444 (UYU) containing "uber": 10', content)
+        self.assertNotIn("Movements of account", content)
+
+        content = self.send("movements with uber").json()['message']['content']
+        self.assertIn('Movements of card 4444 (UYU) containing "uber": 10', content)
+        self.assertIn('Movements of account 123 containing "uber": 49', content)
+
+    def test_search_terms_escaped(self):
+        print()
+        print("Testing that the search terms written by the user are escaped in the results.")
+
+        b"".join(self.send(self.movements).streaming_content)
+
+        content = self.send("movements with uber <>").json()['message']['content']
+        self.assertIn('containing "uber &lt;&gt;": 49', content)
+
+        content = self.send("movements with <b>nothing</b>").json()['message']['content']
+        self.assertNotIn("<b>", content)
+        self.assertIn("&lt;b&gt;nothing&lt;/b&gt;", content)
+
+    def test_logout_while_streaming(self):
+        print()
+        print("Testing that a logout sent while a message is streamed is not reverted when the stream ends.")
+
+        response = self.send(self.movements)
+
+        logout = self.send("logout")
+        self.assertIn("Thank you for operating with", logout.json()['message']['content'])
+
+        b"".join(response.streaming_content)
+
+        self.assertEqual(self.send("accounts").json()['message']['content'], "You must log in first!")
+        # The streamed answer is added when the stream ends, after the logout
+        contents = [message['content'] for message in self.last_messages(6)]
+        self.assertEqual(contents[:2], [self.movements, "logout"])
+        self.assertEqual(contents[3].count('class="item link"'), 151)
+        self.assertEqual(contents[4], "accounts")
+
+    def test_error_while_streaming(self):
+        print()
+        print("Testing that an error in the middle of a stream is sent as its last chunk, and saved.")
+
+        def parts():
+            yield ["first line"]
+            raise api.ApiException("The bank is down")
+
+        with patch.object(MessageProcessor, 'process_message', return_value=MessageStream(parts())):
+            response = self.send(self.movements)
+            lines = self.lines(b"".join(response.streaming_content))
+
+        self.assertEqual(lines[0]['message']['content'], "first line")
+        self.assertEqual(lines[1:], [{'append': "Beep-bop! The bank is down"}])
+        self.assertEqual(self.last_messages(1)[0]['content'], "first line\nBeep-bop! The bank is down")
+
+    def test_asgi_not_streamed(self):
+        print()
+        print("Testing that under ASGI the NDJSON lines are sent in one response, not iterated in the event loop.")
+
+        client = AsyncClient()
+        client.cookies = self.client.cookies
+
+        response = async_to_sync(client.post)("/chat/process_message/", urlencode({'text_field': self.movements}),
+                                              content_type="application/x-www-form-urlencoded", **AJAX)
+
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], "application/x-ndjson")
+
+        lines = self.lines(response.content)
+        self.assertIn('message', lines[0])
+        content = "\n".join([lines[0]['message']['content'], *(line['append'] for line in lines[1:])])
+        self.assertEqual(content.count('class="item link"'), 151)
+
+        question, answer = self.last_messages(2)
+        self.assertEqual(question['content'], self.movements)
+        self.assertEqual(answer['content'], content)
+
+        b"".join(self.send(self.movements).streaming_content)
+        self.assertEqual(len([call for call in upstream.Handler.calls if "/movement" in call[1]]), 5)
@@ -0,0 +1,100 @@
+"""
+Fake Prometeo API on a local port, for the tests of the views
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PROVIDERS = [{'code': "test", 'name': "Test Bank", 'country': "UY"}]
+PROVIDER = {'code': "test", 'name': "test", 'logo': "logo.png", 'bank': {'name': "Test Bank"},
+            'auth_fields': [{'name': "username", 'type': "text", 'interactive': False, 'optional': False,
+                             'label_es': "Usuario", 'label_en': "User"},
+                            {'name': "password", 'type': "password", 'interactive': False, 'optional': False,
+                             'label_es': "Clave", 'label_en': "Password"}]}
+ACCOUNTS = [{'id': "a1", 'name': "Account", 'number': "123", 'branch': "Main", 'currency': "UYU", 'balance': 10.0}]
+CARDS = [{'id': "c1", 'name': "Visa", 'number': "4444", 'close_date': "01/01/2022", 'due_date': "01/02/2022",
+          'balance_local': 1.0, 'balance_dollar': 2.0}]
+
+
+def movements(date_start, date_end):
+    """
+    @return
+    a movement per day, with UBER in the detail of every third day
+    """
+    start, end = datetime.strptime(date_start, "%d/%m/%Y"), datetime.strptime(date_end, "%d/%m/%Y")
+
+    return [{'id': f"{day:%Y%m%d}", 'reference': f"ref{day.day}", 'date': f"{day:%d/%m/%Y}",
+             'detail': "UBER trip" if day.day % 3 == 0 else "Rent payment", 'debit': float(day.day), 'credit': "",
+             'extra_data': None}
+            for day in (start + timedelta(days=i) for i in range((end - start).days + 1))]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # (method, path) of the requests received
+    calls = []
+    # Seconds to wait before answering the movements
+    delay = 0
+    # Status of the login responses
+    login_status = "logged_in"
+
+    def respond(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+
+        Handler.calls.append((self.command, url.path))
+        body = self.body(url.path, query)
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def body(self, path, query) -> dict:
+        if path == "/provider/":
+            return {'status': "success", 'providers': PROVIDERS}
+        if path.startswith("/provider/"):
+            return {'status': "success", 'provider': PROVIDER}
+        if path == "/login/":
+            if Handler.login_status == "wrong_credentials":
+                return {'status': "wrong_credentials"}
+            return {'status': Handler.login_status, 'key': "session-key"}
+        if path == "/logout/":
+            return {'status': "logged_out"}
+        if path == "/info/":
+            return {'status': "success", 'info': {'document': "1", 'name': "Name", 'email': "name@example.com"}}
+        if path == "/account/":
+            return {'status': "success", 'accounts': ACCOUNTS}
+        if path == "/credit-card/":
+            return {'status': "success", 'credit_cards': CARDS}
+        if "/movement" in path:
+            time.sleep(Handler.delay)
+            return {'status': "success", 'movements': movements(query['date_start'], query['date_end'])}
+
+        return {'status': "error", 'message': "Not found"}
+
+    do_GET = respond
+    do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+def start():
+    """
+    @return
+    the server, and its base url
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
@@ -1,6 +1,9 @@
 from django.urls import path
 
-from . import views
+from . import settings, views
+
+# Async views are meant to be served by an ASGI server, see prometeo_chatbot/asgi.py
+async_views = getattr(settings, "CONFIG").get('async_views', False)
 
 app_name = 'chatbot'
 urlpatterns = [
@@ -8,6 +11,10 @@ urlpatterns = [
     path('close/', views.close, name='close'),
     path('guest/', views.guest, name='guest'),
     path('chat/', views.chat, name='chat'),
-    path('chat/process_message/', views.process_message, name='process_message'),
-    path('chat/provider_login/', views.provider_login, name='provider_login'),
+    path('chat/history/', views.history, name='history'),
+    path('chat/process_message/', views.process_message_async if async_views else views.process_message,
+         name='process_message'),
+    path('chat/provider_login/', views.provider_login_async if async_views else views.provider_login,
+         name='provider_login'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
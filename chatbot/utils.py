@@ -1,15 +1,28 @@
+import functools
+import logging
 import re
+import threading
+import time
 import unicodedata
 from calendar import monthrange
-from datetime import datetime
-from typing import Optional, List, Tuple, Callable
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Optional, List, Tuple, Callable
 
-from dateparser.date import DateDataParser
-from dateparser.search import search_dates
 from django.utils.translation import gettext as _
 
+from . import metrics, settings
+
+if TYPE_CHECKING:
+    from dateparser.date import DateDataParser
+
+
+logger = logging.getLogger(__name__)
+
 
 class Dictionarizable:
+    __slots__ = ()
+
     def dict(self):
         """
         default implementation returns __dict__ object
@@ -23,26 +36,189 @@ class BotException(Exception):
         self.message = message
 
 
+def date_settings(language) -> dict:
+    return {'DATE_ORDER': 'DMY' if language == 'es' else 'MDY',
+            'PREFER_DATES_FROM': 'past'}
+
+
+@functools.lru_cache(maxsize=256)
+def cached_date_parser(language, relative_day: date = None) -> "DateDataParser":
+    """
+    Process-wide pool of parsers, one per language and relative base day.
+    dateparser is imported the first time it's needed, it's slow to import and most messages don't need it
+    @param relative_day: the day that relative dates are based on, by default the current time.
+    A day rather than a datetime, so the pool doesn't grow with every time of day
+    """
+    from dateparser.date import DateDataParser
+
+    with metrics.date_processing_duration.time("init"):
+        settings = date_settings(language)
+        if relative_day:
+            settings['RELATIVE_BASE'] = datetime.combine(relative_day, datetime.min.time())
+
+        return DateDataParser(languages=[language], settings=settings)
+
+
+class FastDateParser:
+    """
+    Hand-written parser of the most common date forms, much cheaper than dateparser:
+    dd/mm/YYYY (mm/dd/YYYY in english), month names with or without year, years,
+    and ranges of two of them, e.g. "from july to september" or "01/01/2022 31/03/2022".
+    It gives the same date ranges as DateProcessor gets with dateparser,
+    and None for anything else, so dateparser decides.
+    """
+    months = {
+        'en': {'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+               'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+               'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9,
+               'oct': 10, 'nov': 11, 'dec': 12},
+        'es': {'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+               'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12},
+    }
+    # Words before the range, between its dates (spaces included), and between a month and its year.
+    # dateparser doesn't find both dates of spanish ranges separated only by spaces
+    connectors = {
+        'en': ("from", " (?:(?:to|-) )?", None),
+        'es': ("del|desde", " (?:al|hasta) ", "de"),
+    }
+
+    def __init__(self, language):
+        self.language = language
+        self.month_numbers = self.months.get(language, {})
+        self.day_first = date_settings(language)['DATE_ORDER'] == 'DMY'
+
+        prefix, infix, month_year = self.connectors.get(language, (None, None, None))
+        self.pattern = re.compile(
+            (fr"(?:(?:{prefix}) )?" if prefix else "")
+            + self.date_pattern("1", month_year)
+            + (fr"(?:{infix}{self.date_pattern('2', month_year)})?" if infix else "")
+        )
+
+    def date_pattern(self, suffix, month_year) -> str:
+        year = r"(?:19|20)\d\d"
+        month_names = "|".join(sorted(self.month_numbers, key=len, reverse=True))
+        month_year = fr"(?:{month_year} )?" if month_year else ""
+
+        return (fr"(?:(?P<a{suffix}>\d{{1,2}})/(?P<b{suffix}>\d{{1,2}})/(?P<day_year{suffix}>{year})"
+                + (fr"|(?P<month{suffix}>{month_names})(?: {month_year}(?P<month_year{suffix}>{year}))?"
+                   if month_names else "")
+                + fr"|(?P<year{suffix}>{year}))")
+
+    def date_range(self, string) -> Optional[List[datetime]]:
+        """
+        @return
+        the [start, end] of the date range in the string, None if it's not a supported form
+        """
+        match = self.pattern.fullmatch(string)
+        if not match:
+            return None
+
+        first = self.period(match, "1")
+        second = self.period(match, "2")
+        if not first or second is False:
+            return None
+
+        # The current month as dateparser gets it
+        today = datetime.utcnow()
+
+        if second is None:
+            kind, year, month, day = first
+            if kind == "month" and year is None:
+                year = today.year if month <= today.month else today.year - 1
+
+            return [self.start(kind, year, month, day), self.end(kind, year, month, day)]
+
+        if first[0] != second[0] or (first[1] is None) != (second[1] is None):
+            # dateparser doesn't find both dates of ranges mixing forms
+            return None
+
+        kind, year, month, day = second
+        if kind == "month" and year is None:
+            if today.day > 28:
+                # dateparser resolves these ranges with the day of today, which may not exist in other months
+                return None
+
+            # As dateparser, the end month is the closest one not after the start month,
+            # which is the closest one not after today
+            first_year = today.year if first[2] <= today.month else today.year - 1
+            year = first_year if month <= first[2] else first_year - 1
+        end_date = self.end(kind, year, month, day)
+
+        kind, year, month, day = first
+        if kind == "month" and year is None:
+            # And the start month is the closest one not after the end date
+            year = end_date.year if month <= end_date.month else end_date.year - 1
+
+        return [self.start(kind, year, month, day), end_date]
+
+    def period(self, match, suffix):
+        """
+        @return
+        (kind, year, month, day) of a date of the match, None if it's not in the match,
+        False if it's not a valid date
+        """
+        if match.group(f"day_year{suffix}"):
+            a, b = int(match.group(f"a{suffix}")), int(match.group(f"b{suffix}"))
+            day, month = (a, b) if self.day_first else (b, a)
+            year = int(match.group(f"day_year{suffix}"))
+
+            if not 1 <= month <= 12 or not 1 <= day <= monthrange(year, month)[1]:
+                # dateparser may try other date orders
+                return False
+
+            return "day", year, month, day
+
+        if match.group(f"month{suffix}"):
+            year = match.group(f"month_year{suffix}")
+            return "month", int(year) if year else None, self.month_numbers[match.group(f"month{suffix}")], None
+
+        if match.group(f"year{suffix}"):
+            return "year", int(match.group(f"year{suffix}")), None, None
+
+        return None
+
+    @staticmethod
+    def start(kind, year, month, day) -> datetime:
+        if kind == "year":
+            return datetime(year, 1, 1)
+
+        return datetime(year, month, day or 1)
+
+    @staticmethod
+    def end(kind, year, month, day) -> datetime:
+        if kind == "year":
+            return datetime(year, 12, 31)
+
+        return datetime(year, month, day or monthrange(year, month)[1])
+
+
+@functools.lru_cache(maxsize=None)
+def fast_date_parser(language) -> FastDateParser:
+    return FastDateParser(language)
+
+
 class DateProcessor:
     """
     Class to model the processing of dates, including the search of dates inside strings
      and date range validations
     """
-    def __init__(self, language='en'):
+    def __init__(self, language='en', fast_path=True):
+        """
+        @param fast_path: whether to try the FastDateParser before dateparser
+        """
         self.language = language
-        self.date_settings = {'DATE_ORDER': 'DMY' if language == 'es' else 'MDY',
-                              'PREFER_DATES_FROM': 'past'}
-        self.date_parser = DateDataParser(languages=[self.language], settings=self.date_settings)
+        self.date_settings = date_settings(language)
+        self.fast_path = fast_path
+
+    @property
+    def date_parser(self) -> "DateDataParser":
+        return cached_date_parser(self.language)
 
     def get_start_date(self, string: str, relative_to: datetime = None) -> datetime:
         """
         Returns the starting date of the provided date period string
         """
-        if relative_to:
-            date_parser = DateDataParser(languages=[self.language],
-                                         settings={**self.date_settings, **{'RELATIVE_BASE': relative_to}})
-        else:
-            date_parser = self.date_parser
+        date_parser = cached_date_parser(self.language, relative_to.date()) if relative_to else self.date_parser
 
         date_data = date_parser.get_date_data(string)
         start_date = date_data.date_obj
@@ -79,6 +255,13 @@ class DateProcessor:
         if not string:
             return None
 
+        if self.fast_path:
+            date_range = fast_date_parser(self.language).date_range(string)
+            if date_range is not None:
+                return date_range
+
+        from dateparser.search import search_dates
+
         dates = search_dates(string, languages=[self.language], settings=self.date_settings)
 
         if not dates:
@@ -110,7 +293,16 @@ class DateProcessor:
         a valid date range in the past (start date < end date < now)
         raises Exception if range is not valid
         """
-        date_range = self.get_date_range(string)
+        phrase = " ".join(normalize_string(string or "").split())
+
+        return date_range_memo.get(self.language, phrase, lambda: self.resolve_valid_date_range(phrase))
+
+    def resolve_valid_date_range(self, string: str) -> Tuple[datetime, datetime]:
+        """
+        Same as get_valid_date_range, without the memo
+        """
+        with metrics.date_processing_duration.time("date_range"):
+            date_range = self.get_date_range(string)
 
         if not date_range:
             raise BotException(_("Sorry, could not get the dates... \n"
@@ -128,6 +320,104 @@ class DateProcessor:
         return date_start, date_end
 
 
+def warm_up_dates(languages):
+    """
+    Imports dateparser and loads the data of the languages, so the first messages with dates don't wait for it
+    """
+    started = time.perf_counter()
+
+    for language in languages:
+        DateProcessor(language, fast_path=False).get_date_range("01/01/2020")
+
+    logger.info("Date parsing warmed up in %.3f s", time.perf_counter() - started,
+                extra={'fields': {'languages': list(languages)}})
+
+
+class DateRangeMemo:
+    """
+    Process-wide LRU memo of the valid date ranges of the phrases, or the message of their BotException,
+    per language. Ranges depend on the current day, so the memo is cleared when the day changes.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+
+        self._entries = OrderedDict()
+        self._day = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def today():
+        """
+        The local day validates the ranges, and the UTC day resolves the months without year, as dateparser does
+        """
+        return date.today(), datetime.utcnow().date()
+
+    def get(self, language, phrase, resolve: Callable[[], Tuple[datetime, datetime]]) -> Tuple[datetime, datetime]:
+        """
+        @param resolve: gets the valid date range of the phrase, or raises BotException, when it's not memoized
+        @return
+        the valid date range of the phrase, raises BotException if it's not valid
+        """
+        key = language, phrase
+        today = self.today()
+
+        with self._lock:
+            if today != self._day:
+                self._entries.clear()
+                self._day = today
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if entry is None:
+            try:
+                entry = True, resolve()
+            except BotException as e:
+                entry = False, e.message
+
+            with self._lock:
+                if today == self._day:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+
+        valid, value = entry
+        if not valid:
+            raise BotException(value)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests if requests else 0.0,
+            }
+
+
+date_range_memo = DateRangeMemo(**getattr(settings, "CONFIG").get('date_range_memo', {}))
+
+metrics.registry.register_collector("chatbot_date_range_memo", "Stats of the memo of date ranges",
+                                    lambda: [((stat,), value) for stat, value in date_range_memo.stats().items()],
+                                    labels=("stat",))
+
+
 class ActionSelector:
     """
     Defines the object used to select an action, based on a string (message)
@@ -146,13 +436,43 @@ class ActionSelector:
         returning the result of the action if the precondition is met
         """
         match = re.search(self.selection_criteria, string)
-        print("criteria", self.selection_criteria, "-------------")
         if match and (not self.precondition or self.precondition()):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Selected action %s", self.action.__name__,
+                             extra={'fields': {'criteria': self.selection_criteria}})
+
             return self.action(**match.groupdict())
 
         return None
 
 
+class IntentRouter:
+    """
+    Selects the intents matching a string, with the regex of each intent compiled once.
+    Intents are searched in priority order, and lazily, so the cascade stops searching
+    at the first intent whose action handles the string.
+    """
+
+    def __init__(self, intents: List[Tuple[str, str]]):
+        """
+        @param intents: (name, regex) of each intent, in priority order
+        """
+        self.intents = [(name, re.compile(criteria)) for name, criteria in intents]
+
+    def matches(self, string):
+        """
+        @return
+        iterator of the (name, named groups) of the intents matching the string, in priority order
+        """
+        for name, pattern in self.intents:
+            match = pattern.search(string)
+            if match:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Matched intent %s", name, extra={'fields': {'criteria': pattern.pattern}})
+
+                yield name, match.groupdict()
+
+
 def normalize_string(string):
     return (unicodedata.normalize('NFD', string)
             .encode('ascii', 'ignore').decode()
@@ -1,22 +1,34 @@
+import asyncio
 import functools
-import traceback
-
-from django.core.exceptions import BadRequest
-from django.http import HttpResponseRedirect
-from django.http import JsonResponse
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.sessions.backends.base import UpdateError
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils import translation
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_POST
 
+from . import metrics
 from .api import api, auth, meta
 from .forms import LoginForm, ChatForm, ProviderLoginForm
-from .models import ApiKey, MessageHistory, MessageProcessor, \
-    Message, BotMessage, UserMessage, \
+from .models import ApiKey, MessageHistory, MessageProcessor, AsyncMessageProcessor, \
+    Message, BotMessage, UserMessage, MessageStream, \
     ErrorResponse, ModalForm
+from .providers import catalog_key
 from .utils import BotException
 
 
+logger = logging.getLogger(__name__)
+
+
 def log_me_in(session: dict, api_key: str) -> bool:
     """
     Validates the key by requesting the provider list
@@ -31,6 +43,7 @@ def log_me_in(session: dict, api_key: str) -> bool:
         session['cache'] = {}
         session['cache']['api-key'] = api_key
         session['cache']['providers'] = provider_api.response_json['providers']
+        session['cache']['providers_key'] = catalog_key(session['cache']['providers'])
 
         return True
 
@@ -74,12 +87,23 @@ def is_ajax(request):
 
 def require_ajax(view):
     """
-    Decorator to allow only AJAX requests in the decorated view
+    Decorator to allow only AJAX requests in the decorated view (sync or async)
     """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request):
+            if not is_ajax(request):
+                logger.info("Request to %s is not AJAX", request.path)
+                raise BadRequest
+
+            return await view(request)
+
+        return async_wrapper
+
     @functools.wraps(view)
     def wrapper(request):
         if not is_ajax(request):
-            print("request is not AJAX...")
+            logger.info("Request to %s is not AJAX", request.path)
             raise BadRequest
 
         return view(request)
@@ -87,28 +111,163 @@ def require_ajax(view):
     return wrapper
 
 
-@require_ajax
-@require_POST
-def process_message(request):
+def require_POST_async(view):
     """
-    Processes the message from the user (sent via AJAX) and returns the bot response.
+    Same as django require_POST decorator, for async views
+    """
+    @functools.wraps(view)
+    async def wrapper(request):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+
+        return await view(request)
+
+    return wrapper
+
+
+def load_session_async(view):
+    """
+    Decorator to load the session of the request before the decorated async view,
+    in a thread so the session database doesn't block the event loop
+    """
+    @functools.wraps(view)
+    async def wrapper(request):
+        await sync_to_async(request.session.keys)()
+
+        return await view(request)
+
+    return wrapper
+
+
+def user_message(request):
+    """
+    Validates the message sent by the user, and adds it to the message history
+    @return
+    the content of the message, None if the message is not valid
     """
     if ('cache' not in request.session
             or 'message_history' not in request.session
             or 'api-key' not in request.session['cache']):
 
-        return ErrorResponse()
+        return None
 
     chat_form = ChatForm(request.POST)
 
     if not chat_form.is_valid():
-        print("Invalid form... ChatForm")
-        return ErrorResponse()
+        logger.info("Invalid ChatForm: %s", chat_form.errors.as_json())
+        return None
 
     user_message_content = chat_form.cleaned_data['text_field']
-    user_message = UserMessage(user_message_content)
+    request.session['message_history'].add(UserMessage(user_message_content))
+
+    return user_message_content
+
+
+def processing_response(request, processing_result):
+    """
+    Adds the bot answer to the message history, and returns it as JSON
+    """
+    if isinstance(processing_result, MessageStream):
+        return streaming_response(request, processing_result)
+
+    if isinstance(processing_result, Message):
+        request.session['message_history'].add(processing_result)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Message processed", extra={'fields': {'language': request.LANGUAGE_CODE,
+                                                            'result': type(processing_result).__name__}})
 
-    request.session['message_history'].add(user_message)
+    return JsonResponse(processing_result.dict(), status=200)
+
+
+def streaming_response(request, stream: MessageStream):
+    """
+    Sends the bot answer in NDJSON lines as its chunks are ready: a message with the first one,
+    and then the ones to append to it. When the stream ends, the whole answer is added to the message history
+    (see save_streamed_answer).
+    Under ASGI, Django 4.1 iterates the chunks of a streaming response in the event loop, so the movements
+    would be fetched there, blocking every other request: the lines are produced in the view thread instead,
+    and sent in one response, with the answer added to the session before the middleware saves it.
+    """
+    language = translation.get_language()
+    streamed = not isinstance(request, ASGIRequest)
+
+    def lines():
+        chunks = []
+
+        def line(chunk):
+            data = {'append': chunk} if chunks else BotMessage(chunk).dict()
+            chunks.append(chunk)
+
+            return json.dumps(data, cls=DjangoJSONEncoder) + "\n"
+
+        try:
+            with translation.override(language):
+                try:
+                    for chunk in stream.chunks():
+                        yield line(chunk)
+                except api.ApiException as e:
+                    yield line(f"Beep-bop! {e.message}")
+                except Exception:
+                    logger.exception("Unexpected error streaming a message")
+                    yield line(str(_("Beep-bop! Something went wrong... Please try again later...")))
+
+                if not chunks:
+                    yield line("")
+        finally:
+            if streamed:
+                save_streamed_answer(request, "\n".join(chunks))
+            else:
+                request.session['message_history'].add(BotMessage("\n".join(chunks)))
+
+    if not streamed:
+        return HttpResponse("".join(lines()), content_type="application/x-ndjson")
+
+    response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    # Proxies must not buffer the chunks
+    response['X-Accel-Buffering'] = "no"
+
+    return response
+
+
+def save_streamed_answer(request, content):
+    """
+    Adds a streamed answer to the message history of the session as it's now in the store,
+    not as it was when the stream started: it was saved before the stream, and other requests may have
+    changed it meanwhile (e.g. a logout, which must not be reverted).
+    The movements fetched for the answer are kept if the user is still in the same provider session.
+    """
+    session = type(request.session)(request.session.session_key)
+    if 'message_history' not in session:
+        logger.info("Session closed while streaming a message")
+        return
+
+    session['message_history'].add(BotMessage(content))
+
+    streamed = request.session['cache'].get('provider_session') or {}
+    current = session['cache'].get('provider_session') or {}
+
+    if streamed.get('key') is not None and current.get('key') == streamed.get('key'):
+        stores = current.setdefault('movements', {})
+        for key, store in streamed.get('movements', {}).items():
+            if store.changed or key not in stores:
+                stores[key] = store
+
+    try:
+        session.save()
+    except UpdateError:
+        logger.info("Session closed while streaming a message")
+
+
+@require_ajax
+@require_POST
+def process_message(request):
+    """
+    Processes the message from the user (sent via AJAX) and returns the bot response.
+    """
+    user_message_content = user_message(request)
+    if user_message_content is None:
+        return ErrorResponse()
 
     try:
         processing_result = MessageProcessor(request.session['cache'], request).process_message(user_message_content)
@@ -116,47 +275,66 @@ def process_message(request):
         processing_result = BotMessage(e.message)
     except api.ApiException as e:
         return ErrorResponse(f"Beep-bop! {e.message}", status=e.status)
-    except Exception as e:
-        print("Exception: ", e)
-        print(traceback.format_exc())
+    except Exception:
+        logger.exception("Unexpected error processing a message")
 
         return ErrorResponse()
 
-    if isinstance(processing_result, Message):
-        request.session['message_history'].add(processing_result)
+    return processing_response(request, processing_result)
 
-    print()
-    print(request.session['cache']['api-key'])
-    print("language", request.LANGUAGE_CODE)
-    print(processing_result)
 
-    return JsonResponse(processing_result.dict(), status=200)
+@require_ajax
+@require_POST_async
+@load_session_async
+async def process_message_async(request):
+    """
+    Same as process_message view, without blocking the worker while waiting for the Prometeo API
+    """
+    user_message_content = user_message(request)
+    if user_message_content is None:
+        return ErrorResponse()
 
+    try:
+        processing_result = await AsyncMessageProcessor(request.session['cache'], request
+                                                        ).process_message(user_message_content)
+    except BotException as e:
+        processing_result = BotMessage(e.message)
+    except api.ApiException as e:
+        return ErrorResponse(f"Beep-bop! {e.message}", status=e.status)
+    except Exception:
+        logger.exception("Unexpected error processing a message")
 
-@require_ajax
-@require_POST
-def provider_login(request):
+        return ErrorResponse()
+
+    return processing_response(request, processing_result)
+
+
+def provider_login_credentials(request):
     """
-    Processes the login request for a provider (sent via AJAX).
+    Validates the login form for the provider
+    @return
+    the credentials to send in the login request, None if the form is not valid
     """
     provider_session = request.session['cache']['provider_session']
     expected_fields = provider_session['expected-fields']
 
     provider_login_form = ProviderLoginForm(request.POST, provider_fields=expected_fields)
     if not provider_login_form.is_valid():
-        print("Invalid form... ProviderLoginForm")
-        return ErrorResponse()
+        logger.info("Invalid ProviderLoginForm: %s", provider_login_form.errors.as_json())
+        return None
 
-    provider = provider_session['provider']
-    credentials = {
-        "provider": provider['name'],
+    return {
+        "provider": provider_session['provider']['name'],
         **provider_login_form.cleaned_data,
         **provider_session.get("credentials", {})
     }
 
-    login = auth.Login(request.session['cache']['api-key'],
-                       key=provider_session.get('key'), data=credentials)
 
+def provider_login_error(login):
+    """
+    @return
+    the response for the expected login errors, None if there was no such error
+    """
     status = login.response_json.get('status')
 
     if status == "error":
@@ -168,13 +346,25 @@ def provider_login(request):
     elif status == "wrong_credentials":
         return JsonResponse({'modal-feedback': _('Wrong credentials!')}, status=400)
 
-    login_response = login.successful_json()
+    return None
+
+
+def provider_login_response(request, credentials, login_response):
+    """
+    Processes the successful response of the provider login request
+    """
+    provider_session = request.session['cache']['provider_session']
+    provider = provider_session['provider']
+
+    status = login_response.get('status')
 
     provider_session['key'] = login_response['key']
 
     if status == "logged_in":
         del provider_session['expected-fields']
 
+        MessageProcessor(request.session['cache'], request).prefetch()
+
         message = BotMessage(_('Successfully logged in!\n'
                                'To log out from this provider type <a class="message-link">logout</a>.\n'
                                'You can try also:\n'
@@ -212,6 +402,70 @@ def provider_login(request):
     return ErrorResponse()
 
 
+@require_ajax
+@require_POST
+def provider_login(request):
+    """
+    Processes the login request for a provider (sent via AJAX).
+    """
+    credentials = provider_login_credentials(request)
+    if credentials is None:
+        return ErrorResponse()
+
+    login = auth.Login(request.session['cache']['api-key'],
+                       key=request.session['cache']['provider_session'].get('key'), data=credentials)
+
+    try:
+        error_response = provider_login_error(login)
+        if error_response is not None:
+            return error_response
+
+        login_response = login.successful_json()
+    except api.ApiException as e:
+        return ErrorResponse(f"Beep-bop! {e.message}", status=e.status)
+
+    return provider_login_response(request, credentials, login_response)
+
+
+@require_ajax
+@require_POST_async
+@load_session_async
+async def provider_login_async(request):
+    """
+    Same as provider_login view, without blocking the worker while waiting for the Prometeo API
+    """
+    credentials = provider_login_credentials(request)
+    if credentials is None:
+        return ErrorResponse()
+
+    login = auth.AsyncLogin(request.session['cache']['api-key'],
+                            key=request.session['cache']['provider_session'].get('key'), data=credentials)
+
+    try:
+        await login.fetch()
+
+        error_response = provider_login_error(login)
+        if error_response is not None:
+            return error_response
+
+        login_response = await login.successful_json()
+    except api.ApiException as e:
+        return ErrorResponse(f"Beep-bop! {e.message}", status=e.status)
+
+    return provider_login_response(request, credentials, login_response)
+
+
+def metrics_view(request):
+    """
+    Metrics of the process in the Prometheus text format, only for the allowed client addresses
+    """
+    if not metrics.allowed(request.META.get('REMOTE_ADDR')):
+        logger.info("Metrics request from %s not allowed", request.META.get('REMOTE_ADDR'))
+        raise PermissionDenied
+
+    return HttpResponse(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 def chat(request):
     """
     Main view for chat window.
@@ -231,10 +485,32 @@ def chat(request):
         request.session['message_history'] = messages
 
     form = ChatForm()
+    # Only the last page is rendered, the previous ones are loaded by the history view on scroll
+    messages, cursor = request.session['message_history'].page()
 
     context = {
         'form': form,
-        'message_history': request.session['message_history']
+        'messages': messages,
+        'cursor': cursor,
     }
 
     return render(request, 'chatbot/chat.html', context)
+
+
+@require_ajax
+def history(request):
+    """
+    A page of the message history (sent via AJAX), the messages before the `before` cursor
+    """
+    if 'message_history' not in request.session:
+        return ErrorResponse(status=404)
+
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        logger.info("Invalid history cursor: %s", request.GET.get('before'))
+        raise BadRequest
+
+    messages, cursor = request.session['message_history'].page(before)
+
+    return JsonResponse({'messages': messages, 'cursor': cursor})
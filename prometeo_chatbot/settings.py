@@ -136,10 +136,46 @@ STATIC_URL = 'static/'
 # DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-# Cached session
-SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+# Sessions in a SQLite database shared by the worker processes, configured in chatbot/settings.yml
+SESSION_ENGINE = 'chatbot.sessions'
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
 # After 10 minutes of inactivity, closes session automatically
 SESSION_COOKIE_AGE = 600
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessions are saved only when modified, the expiry of the others is refreshed by the session engine
+SESSION_SAVE_EVERY_REQUEST = False
+
+
+# Structured logs of the chatbot, written by a background thread.
+# Set the chatbot level to DEBUG to trace the requests to the Prometeo API,
+# with the sampling rate of the traces in the sampling filter
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            '()': 'chatbot.logs.StructuredFormatter',
+            'max_length': 2000,
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'chatbot.logs.SamplingFilter',
+            'rate': 1.0,
+        },
+    },
+    'handlers': {
+        'chatbot': {
+            '()': 'chatbot.logs.QueueStreamHandler',
+            'formatter': 'structured',
+            'filters': ['sampling'],
+        },
+    },
+    'loggers': {
+        'chatbot': {
+            'handlers': ['chatbot'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}